@@ -224,6 +224,22 @@ class MockSurvey(object):
             self.theta500Splines.append(tckLog10MToTheta500)
             self.fRelSplines.append(tckLog10MToFRel)
 
+        # The above evaluated on the (z, log10M) grid, for quick look-ups (e.g., completeness calculations)
+        if self.delta == 500 and self.rhoType == "critical":
+            # Here all of the splines share the same knots, so we can evaluate them all in one go
+            knots=self.theta500Splines[0][0]
+            theta500Coeffs=np.array([tck[1] for tck in self.theta500Splines]).transpose()
+            fRelCoeffs=np.array([tck[1] for tck in self.fRelSplines]).transpose()
+            self.theta500Grid=interpolate.BSpline(knots, theta500Coeffs, 3)(self.log10M).transpose()
+            self.fRelGrid=interpolate.BSpline(knots, fRelCoeffs, 3)(self.log10M).transpose()
+        else:
+            self.theta500Grid=np.zeros([len(self.z), len(self.log10M)])
+            self.fRelGrid=np.zeros([len(self.z), len(self.log10M)])
+            for k in range(len(self.z)):
+                log10M500cs=np.log10(self._transToM500c(self.cosmoModel, self.M, self.a[k]))
+                self.theta500Grid[k]=interpolate.splev(log10M500cs, self.theta500Splines[k])
+                self.fRelGrid[k]=interpolate.splev(log10M500cs, self.fRelSplines[k])
+
         # Stuff to enable us to draw mock samples (see drawSample)
         # Interpolators here need to be updated each time we change cosmology
         if self.enableDrawSample == True:
@@ -254,8 +270,10 @@ class MockSurvey(object):
         ngtm=integrate.cumtrapz(dndlnM[::-1], np.log(self.M), initial = 0)[::-1]
         
         MUpper=np.arange(np.log(self.M[-1]), np.log(10**18), np.log(self.M[1])-np.log(self.M[0]))
-        extrapolator=_spline(np.log(self.M), np.log(dndlnM), k=1)
-        MF_extr=extrapolator(MUpper)
+        # Linear extrapolation in log space from the last mass bin (what a k=1 spline gives, but cheaper)
+        lnM=np.log(self.M)
+        lnMF=np.log(dndlnM)
+        MF_extr=lnMF[-1]+(MUpper-lnM[-1])*(lnMF[-1]-lnMF[-2])/(lnM[-1]-lnM[-2])
         intUpper=integrate.simps(np.exp(MF_extr), dx=MUpper[2] - MUpper[1], even='first')
         ngtm=ngtm+intUpper
     
@@ -354,69 +372,20 @@ class MockSurvey(object):
         return PLog10M
 
 
-    def drawSample(self, y0Noise, scalingRelationDict, QFit = None, wcs = None, photFilterLabel = None,\
-                   tileName = None, SNRLimit = None, makeNames = False, z = None, numDraws = None,\
-                   areaDeg2 = None, applySNRCut = False, applyPoissonScatter = True,\
-                   applyIntrinsicScatter = True, applyNoiseScatter = True,\
-                   applyRelativisticCorrection = True, verbose = False, biasModel = None):
-        """Draw a cluster sample from the mass function, generating mock y0~ values (called `fixed_y_c` in
-        Nemo catalogs) by applying the given scaling relation parameters, and then (optionally) applying
-        a survey selection function.
+    def _drawSampleArrays(self, y0Noise, scalingRelationDict, QFit = None, wcs = None, tileName = None,
+                          z = None, numDraws = None, areaDeg2 = None, applyPoissonScatter = True,
+                          applyIntrinsicScatter = True, applyNoiseScatter = True,
+                          applyRelativisticCorrection = True, verbose = False, biasModel = None):
+        """Draws a cluster sample from the mass function, returning plain arrays rather than a catalog.
+        This is the engine behind :meth:`drawSample` (see that routine for a description of the
+        arguments), and avoids the overhead of building an :obj:`astropy.table.Table` when only a few
+        quantities are needed (e.g., for Monte Carlo completeness estimates).
         
-        Args:
-            y0Noise (:obj:`float` or :obj:`np.ndarray`): Either a single number (if using e.g., a survey
-                average), an RMS table (with columns 'areaDeg2' and 'y0RMS'), or a noise map (2d array).
-                A noise map must be provided here if you want the output catalog to contain RA, dec
-                coordinates (in addition, a WCS object must also be provided - see below).
-            scalingRelationDict (:obj:`dict`): A dictionary containing keys 'tenToA0', 'B0', 'Mpivot',
-                'sigma_int' that describes the scaling relation between y0~ and mass (this is the
-                format of `massOptions` in Nemo .yml config files).
-            QFit (:obj:`nemo.signals.QFit`, optional): Object that handles the filter mismatch
-                function, *Q*. If not given, the output catalog will not contain `fixed_y_c` columns,
-                only `true_y_c` columns.
-            wcs (:obj:`astWCS.WCS`, optional): WCS object corresponding to `y0Noise`, if `y0Noise` is
-                as noise map (2d image array). Needed if you want the output catalog to contain RA, dec
-                coordinates.
-            photFilterLabel (:obj:`str`, optional): Name of the reference filter (as defined in the
-                Nemo .yml config file) that is used to define y0~ (`fixed_y_c`) and the filter mismatch 
-                function, Q.
-            tileName (:obj:`str`, optional): Name of the tile for which the sample will be generated.
-            SNRLimit (:obj:`float`, optional): Signal-to-noise detection threshold used for the
-                output catalog (corresponding to a cut on `fixed_SNR` in Nemo catalogs). Only applied
-                if `applySNRCut` is also True (yes, this can be cleaned up).
-            makeNames (:obj:`bool`, optional): If True, add names of the form MOCK CL JHHMM.m+/-DDMM
-                to the output catalog.
-            z (:obj:`float`, optional): If given produce a sample at the nearest z in the MockSurvey
-                z grid. The default behaviour is to use the full redshift grid specified by `self.z`.
-            numDraws (:obj:`int`, optional): If given, the number of draws to perform from the mass
-                function, divided equally among the redshift bins. The default is to use the values
-                contained in `self.numClustersByRedshift`.
-            areaDeg2 (:obj:`float`, optional): If given, the cluster counts will be scaled to this
-                area. Otherwise, they correspond to `self.areaDeg2`. This parameter will be ignored
-                if `numDraws` is also given.
-            applySNRCut (:obj:`bool`, optional): If True, cut the output catalog according to the
-                `fixed_SNR` threshold set by `SNRLimit`.
-            applyPoissonScatter (:obj:`bool`, optional): If True, add Poisson noise to the cluster
-                counts (implemented by modifiying the number of draws from the mass function).
-            applyIntrinsicScatter (:obj:`bool`, optional): If True, apply intrinsic scatter to the
-                SZ measurements (`fixed_y_c`), as set by the `sigma_int` parameter in 
-                `scalingRelationDict`.
-            applyNoiseScatter (:obj:`bool`, optional): If True, apply measurement noise, generated
-                from the given noise level or noise map (`y0Noise`), to the output SZ measurements
-                (`fixed_y_c`).
-            applyRelativisticCorrection (:obj:`bool`, optional): If True, apply the relativistic
-                correction.
-                
         Returns:
-            A catalog as an :obj:`astropy.table.Table` object, in the same format as produced by
-            the main `nemo` script.
+            A dictionary of :obj:`np.ndarray` objects, with keys 'RADeg', 'decDeg', 'y0Noise', 'log10M'
+            (in the mass definition of this MockSurvey), 'log10M500c', 'z', 'zErr', 'Q', 'true_y0'
+            and 'measured_y0' (the latter including scatter and, if QFit is given, optimization bias).
         
-        Notes:
-            If both `applyIntrinsicScatter`, `applyNoiseScatter` are set to False, then the output
-            catalog `fixed_y_c` values will be exactly the same as `true_y_c`, although each object
-            will still have an error bar listed in the output catalog, corresponding to its location
-            in the noise map (if given).
-                
         """
 
         t0=time.time()
@@ -456,11 +425,13 @@ class MockSurvey(object):
             # Consequently, this is inefficient if fed individual tiles rather than a full sky noise map
             assert(wcs is not None)
             RMSMap=y0Noise
-            xsList=[]
-            ysList=[]
+            # Fill preallocated arrays, rather than growing lists of coords
+            xsAll=np.empty(numClusters, dtype = int)
+            ysAll=np.empty(numClusters, dtype = int)
+            numFound=0
             maxCount=10000
             count=0
-            while(len(xsList) < numClusters):
+            while(numFound < numClusters):
                 count=count+1
                 if count > maxCount:
                     raise Exception("Failed to generate enough random coords in %d iterations" % (maxCount))
@@ -473,11 +444,12 @@ class MockSurvey(object):
                 xs=xs[mask]
                 ys=ys[mask]
                 mask=RMSMap[ys, xs] > 0
-                xsList=xsList+xs[mask].tolist()
-                ysList=ysList+ys[mask].tolist()
-            xs=np.array(xsList)[:numClusters]
-            ys=np.array(ysList)[:numClusters]
-            del xsList, ysList
+                numToAdd=min(mask.sum(), numClusters-numFound)
+                xsAll[numFound:numFound+numToAdd]=xs[mask][:numToAdd]
+                ysAll[numFound:numFound+numToAdd]=ys[mask][:numToAdd]
+                numFound=numFound+numToAdd
+            xs=xsAll
+            ys=ysAll
             RADecCoords=wcs.pix2wcs(xs, ys)
             RADecCoords=np.array(RADecCoords)
             RAs=RADecCoords[:, 0]
@@ -497,14 +469,6 @@ class MockSurvey(object):
             RAs=np.zeros(numClusters)
             decs=np.zeros(numClusters)
         
-        # Fancy names or not?
-        if makeNames == True:
-            names=[]
-            for RADeg, decDeg in zip(RAs, decs):
-                names.append(catalogs.makeName(RADeg, decDeg, prefix = 'MOCK-CL'))
-        else:
-            names=np.arange(numClusters)+1
-                
         # New way - on the redshift grid
         t0=time.time()
         currentIndex=0
@@ -570,7 +534,8 @@ class MockSurvey(object):
         fRels[fRels <= 0]=0.1
         fRels[fRels > 1]=1.0
         try:
-            true_y0s=tenToA0*Ez2s*np.power(np.power(10, log10Ms)/Mpivot, 1+B0)*Qs
+            # (M/Mpivot)^(1+B0) evaluated in log space - one power call rather than two
+            true_y0s=tenToA0*Ez2s*np.power(10, (1+B0)*(log10Ms-np.log10(Mpivot)))*Qs
         except:
             raise Exception("Negative y0 values (probably spline related) for H0 = %.6f Om0 = %.6f sigma8 = %.6f at z = %.3f" % (self.H0, self.Om0, self.sigma8, zk))
         if applyRelativisticCorrection == True:
@@ -585,7 +550,103 @@ class MockSurvey(object):
             measured_y0s=np.random.normal(scattered_y0s, y0Noise)
         else:
             measured_y0s=scattered_y0s
+
+        # Apply optimization bias first, then it'll feed through to SNR automatically
+        # (as in the catalog made by drawSample, this only applies to y0~, i.e., when QFit is given)
+        if QFit is not None and biasModel is not None:
+            corrFactors=biasModel['func'](true_y0s/y0Noise, biasModel['params'][0], biasModel['params'][1], biasModel['params'][2])
+            measured_y0s=measured_y0s*corrFactors
+
+        return {'RADeg': RAs, 'decDeg': decs, 'y0Noise': y0Noise, 'log10M': log10Ms, 'log10M500c': log10M500cs,
+                'z': zs, 'zErr': zErrs, 'Q': Qs, 'true_y0': true_y0s, 'measured_y0': measured_y0s}
+
+
+    def drawSample(self, y0Noise, scalingRelationDict, QFit = None, wcs = None, photFilterLabel = None,\
+                   tileName = None, SNRLimit = None, makeNames = False, z = None, numDraws = None,\
+                   areaDeg2 = None, applySNRCut = False, applyPoissonScatter = True,\
+                   applyIntrinsicScatter = True, applyNoiseScatter = True,\
+                   applyRelativisticCorrection = True, verbose = False, biasModel = None):
+        """Draw a cluster sample from the mass function, generating mock y0~ values (called `fixed_y_c` in
+        Nemo catalogs) by applying the given scaling relation parameters, and then (optionally) applying
+        a survey selection function.
         
+        Args:
+            y0Noise (:obj:`float` or :obj:`np.ndarray`): Either a single number (if using e.g., a survey
+                average), an RMS table (with columns 'areaDeg2' and 'y0RMS'), or a noise map (2d array).
+                A noise map must be provided here if you want the output catalog to contain RA, dec
+                coordinates (in addition, a WCS object must also be provided - see below).
+            scalingRelationDict (:obj:`dict`): A dictionary containing keys 'tenToA0', 'B0', 'Mpivot',
+                'sigma_int' that describes the scaling relation between y0~ and mass (this is the
+                format of `massOptions` in Nemo .yml config files).
+            QFit (:obj:`nemo.signals.QFit`, optional): Object that handles the filter mismatch
+                function, *Q*. If not given, the output catalog will not contain `fixed_y_c` columns,
+                only `true_y_c` columns.
+            wcs (:obj:`astWCS.WCS`, optional): WCS object corresponding to `y0Noise`, if `y0Noise` is
+                as noise map (2d image array). Needed if you want the output catalog to contain RA, dec
+                coordinates.
+            photFilterLabel (:obj:`str`, optional): Name of the reference filter (as defined in the
+                Nemo .yml config file) that is used to define y0~ (`fixed_y_c`) and the filter mismatch 
+                function, Q.
+            tileName (:obj:`str`, optional): Name of the tile for which the sample will be generated.
+            SNRLimit (:obj:`float`, optional): Signal-to-noise detection threshold used for the
+                output catalog (corresponding to a cut on `fixed_SNR` in Nemo catalogs). Only applied
+                if `applySNRCut` is also True (yes, this can be cleaned up).
+            makeNames (:obj:`bool`, optional): If True, add names of the form MOCK CL JHHMM.m+/-DDMM
+                to the output catalog.
+            z (:obj:`float`, optional): If given produce a sample at the nearest z in the MockSurvey
+                z grid. The default behaviour is to use the full redshift grid specified by `self.z`.
+            numDraws (:obj:`int`, optional): If given, the number of draws to perform from the mass
+                function, divided equally among the redshift bins. The default is to use the values
+                contained in `self.numClustersByRedshift`.
+            areaDeg2 (:obj:`float`, optional): If given, the cluster counts will be scaled to this
+                area. Otherwise, they correspond to `self.areaDeg2`. This parameter will be ignored
+                if `numDraws` is also given.
+            applySNRCut (:obj:`bool`, optional): If True, cut the output catalog according to the
+                `fixed_SNR` threshold set by `SNRLimit`.
+            applyPoissonScatter (:obj:`bool`, optional): If True, add Poisson noise to the cluster
+                counts (implemented by modifiying the number of draws from the mass function).
+            applyIntrinsicScatter (:obj:`bool`, optional): If True, apply intrinsic scatter to the
+                SZ measurements (`fixed_y_c`), as set by the `sigma_int` parameter in 
+                `scalingRelationDict`.
+            applyNoiseScatter (:obj:`bool`, optional): If True, apply measurement noise, generated
+                from the given noise level or noise map (`y0Noise`), to the output SZ measurements
+                (`fixed_y_c`).
+            applyRelativisticCorrection (:obj:`bool`, optional): If True, apply the relativistic
+                correction.
+                
+        Returns:
+            A catalog as an :obj:`astropy.table.Table` object, in the same format as produced by
+            the main `nemo` script.
+        
+        Notes:
+            If both `applyIntrinsicScatter`, `applyNoiseScatter` are set to False, then the output
+            catalog `fixed_y_c` values will be exactly the same as `true_y_c`, although each object
+            will still have an error bar listed in the output catalog, corresponding to its location
+            in the noise map (if given).
+                
+        """
+
+        sample=self._drawSampleArrays(y0Noise, scalingRelationDict, QFit = QFit, wcs = wcs, tileName = tileName,
+                                      z = z, numDraws = numDraws, areaDeg2 = areaDeg2,
+                                      applyPoissonScatter = applyPoissonScatter,
+                                      applyIntrinsicScatter = applyIntrinsicScatter,
+                                      applyNoiseScatter = applyNoiseScatter,
+                                      applyRelativisticCorrection = applyRelativisticCorrection,
+                                      verbose = verbose, biasModel = biasModel)
+        RAs, decs, y0Noise=sample['RADeg'], sample['decDeg'], sample['y0Noise']
+        log10Ms, log10M500cs=sample['log10M'], sample['log10M500c']
+        zs, zErrs, Qs=sample['z'], sample['zErr'], sample['Q']
+        true_y0s, measured_y0s=sample['true_y0'], sample['measured_y0']
+        numClusters=len(y0Noise)
+
+        # Fancy names or not?
+        if makeNames == True:
+            names=[]
+            for RADeg, decDeg in zip(RAs, decs):
+                names.append(catalogs.makeName(RADeg, decDeg, prefix = 'MOCK-CL'))
+        else:
+            names=np.arange(numClusters)+1
+                
         # NOTE: We're now allowing user to specify mass definition rather than hardcoding M500c
         # So, label the output true mass column appropriately
         massColLabel="true_M%d%s" % (self.delta, self.rhoType[0])
@@ -593,9 +654,9 @@ class MockSurvey(object):
         tab.add_column(atpy.Column(names, 'name'))
         tab.add_column(atpy.Column(RAs, 'RADeg'))
         tab.add_column(atpy.Column(decs, 'decDeg'))
-        tab.add_column(atpy.Column(np.power(10, log10Ms)/1e14, massColLabel))
+        tab.add_column(atpy.Column(np.power(10, log10Ms-14), massColLabel))
         if 'true_M500c' not in tab.keys():
-            tab.add_column(atpy.Column(np.power(10, log10M500cs)/1e14, 'true_M500c'))
+            tab.add_column(atpy.Column(np.power(10, log10M500cs-14), 'true_M500c'))
         if QFit is None:
             tab.add_column(atpy.Column(true_y0s/1e-4, 'true_y_c'))
         else:
@@ -606,10 +667,7 @@ class MockSurvey(object):
             tab['true_fixed_SNR']=tab['true_fixed_y_c']/tab['fixed_err_y_c']  # True truth, but pre-intrinsic and measurement scatter
             # tab['true_fixed_SNR']=(scattered_y0s/1e-4)/tab['fixed_err_y_c']     # With intrinsic scatter, no measurement scatter
             # tab['true_fixed_SNR']=tab['fixed_y_c']/tab['fixed_err_y_c']         # Like forced photometry case on a real map at true location
-            # Apply optimization bias first, then it'll feed through to SNR automatically
-            if biasModel is not None:
-                corrFactors=biasModel['func'](tab['true_fixed_SNR'], biasModel['params'][0], biasModel['params'][1], biasModel['params'][2])
-                tab['fixed_y_c']=tab['fixed_y_c']*corrFactors
+            # Optimization bias (if any) was already applied to fixed_y_c by _drawSampleArrays
             tab['fixed_SNR']=tab['fixed_y_c']/tab['fixed_err_y_c']
 
         tab.add_column(atpy.Column(zs, 'redshift'))
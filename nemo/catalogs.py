@@ -13,8 +13,11 @@ import time
 import astropy.table as atpy
 from astropy.coordinates import SkyCoord
 from astropy.coordinates import match_coordinates_sky
+from astropy.coordinates import search_around_sky
+import astropy.units as u
 import astropy.io.fits as pyfits
 from scipy import ndimage
+from scipy.spatial import cKDTree
 from . import maps
 
 # For adding meta data to output
@@ -102,6 +105,43 @@ def _posRecFitFunc(snr, snrFold, pedestal, norm):
     """
     return norm*np.exp(-snr/snrFold)+pedestal
     
+#------------------------------------------------------------------------------------------------------------
+def _RADecToXYZ(RADeg, decDeg):
+    """Converts RA, dec (in degrees) to unit vectors on the sphere, with shape (..., 3). Distances between
+    these (chord lengths) are monotonic in angular separation, and are cheaper to compute.
+    
+    """
+    RARad=np.radians(RADeg)
+    decRad=np.radians(decDeg)
+    cosDec=np.cos(decRad)
+    return np.stack([cosDec*np.cos(RARad), cosDec*np.sin(RARad), np.sin(decRad)], axis = -1)
+
+#------------------------------------------------------------------------------------------------------------
+def _chordSquared(radiusDeg):
+    """Returns the squared chord length between two unit vectors separated by the given angle (in degrees),
+    for comparison against distances between the output of :meth:`_RADecToXYZ`.
+    
+    """
+    return np.power(2*np.sin(np.radians(radiusDeg)/2), 2)
+
+#------------------------------------------------------------------------------------------------------------
+def _getNeighbourPairs(RADeg, decDeg, radiusDeg):
+    """Finds all pairs of objects within the given angular radius of each other, using a KD-tree on unit 
+    vectors (see :meth:`_RADecToXYZ`).
+    
+    Returns two arrays of indices (i, j), where each pair is listed in both orders, and each object is
+    also paired with itself.
+    
+    """
+    
+    xyz=_RADecToXYZ(RADeg, decDeg)
+    pairs=cKDTree(xyz).query_pairs(np.sqrt(_chordSquared(radiusDeg)), output_type = 'ndarray')
+    selfIndices=np.arange(len(xyz))
+    iIndices=np.concatenate([pairs[:, 0], pairs[:, 1], selfIndices])
+    jIndices=np.concatenate([pairs[:, 1], pairs[:, 0], selfIndices])
+    
+    return iIndices, jIndices
+
 #------------------------------------------------------------------------------------------------------------
 def checkCrossMatch(distArcmin, fixedSNR, z = None, addRMpc = 0.5, fitSNRFold = 1.164, fitPedestal = 0.685,
                     fitNorm = 38.097):
@@ -168,19 +208,20 @@ def makeOptimalCatalog(catalogDict, constraintsList = []):
     if len(allCatalogs) > 0:
         allCatalogs=atpy.vstack(allCatalogs)
         mergedCatalog=allCatalogs.copy()
-        mergedCatalog.add_column(atpy.Column(np.zeros(len(mergedCatalog)), 'toRemove'))
-        for row in allCatalogs:
-            rDeg=astCoords.calcAngSepDeg(row['RADeg'], row['decDeg'], allCatalogs['RADeg'].data, 
-                                         allCatalogs['decDeg'].data) 
-            xIndices=np.where(rDeg < XMATCH_RADIUS_DEG)[0]
-            if len(xIndices) > 1:
-                xMatches=allCatalogs[xIndices]
-                xMatchIndex=np.argmax(xMatches['SNR'])
-                for index in xIndices:
-                    if index != xIndices[xMatchIndex]:
-                        mergedCatalog['toRemove'][index]=1
-        mergedCatalog=mergedCatalog[mergedCatalog['toRemove'] == 0]
-        mergedCatalog.remove_column('toRemove')
+        # All pairs within the matching radius (including each object with itself) in one KD-tree search
+        cat=SkyCoord(ra = allCatalogs['RADeg'].data, dec = allCatalogs['decDeg'].data, unit = 'deg')
+        xIndices, matchIndices, rDeg, sep3d=search_around_sky(cat, cat, XMATCH_RADIUS_DEG*u.deg)
+        withinMask=rDeg.value < XMATCH_RADIUS_DEG
+        xIndices, matchIndices=xIndices[withinMask], matchIndices[withinMask]
+        # For each object, the highest SNR match (lowest index for ties) is kept - all others are removed
+        SNRs=np.asarray(allCatalogs['SNR'])
+        order=np.lexsort((matchIndices, -SNRs[matchIndices], xIndices))
+        xIndices, matchIndices=xIndices[order], matchIndices[order]
+        groupStarts=np.flatnonzero(np.r_[True, xIndices[1:] != xIndices[:-1]])
+        bestIndices=np.repeat(matchIndices[groupStarts], np.diff(np.r_[groupStarts, len(xIndices)]))
+        toRemove=np.zeros(len(mergedCatalog), dtype = bool)
+        toRemove[matchIndices[matchIndices != bestIndices]]=True
+        mergedCatalog=mergedCatalog[toRemove == False]
         mergedCatalog.sort(['RADeg', 'decDeg'])
         mergedCatalog=selectFromCatalog(mergedCatalog, constraintsList)
     else:
@@ -453,16 +494,11 @@ def catalogListToTab(catalogList, keysToWrite = COLUMN_NAMES):
     
     """
     
-    availKeys=list(catalogList[0].keys())
+    availKeys=catalogList[0].keys()
     tab=atpy.Table()
     for key in keysToWrite:
         if key in availKeys:
-            arr=[]
-            for obj in catalogList:
-                if obj[key] != None:
-                    arr.append(obj[key])
-                else:
-                    arr.append(-99)
+            arr=[obj[key] if obj[key] is not None else -99 for obj in catalogList]
             tab.add_column(atpy.Column(arr, key))
 
     return tab
@@ -482,7 +518,7 @@ def tabToCatalogList(tab):
     catalog=[]
     for row in tab:
         objDict={}
-        for k in list(tab.keys()):
+        for k in tab.keys():
             objDict[k]=row[k]
         catalog.append(objDict)
     
@@ -545,18 +581,17 @@ def removeDuplicates(tab):
     if mask.sum() == 0:
         return tab, 0, []
     
-    # Much faster
+    # For each duplicate, keep the highest SNR object among those within the matching radius of it
+    # (lowest index wins ties)
+    SNRs=np.asarray(dupTab['SNR'])
+    iIndices, jIndices=_getNeighbourPairs(np.asarray(dupTab['RADeg']), np.asarray(dupTab['decDeg']),
+                                          XMATCH_RADIUS_DEG)
+    order=np.lexsort((jIndices, -SNRs[jIndices], iIndices))
+    iIndices, jIndices=iIndices[order], jIndices[order]
+    firstMask=np.ones(len(iIndices), dtype = bool)
+    firstMask[1:]=np.not_equal(iIndices[1:], iIndices[:-1])
     keepMask=np.zeros(len(dupTab), dtype = bool)
-    for i in range(len(dupTab)):
-        # NOTE: astCoords does not like atpy.Columns sometimes...
-        rDeg=astCoords.calcAngSepDeg(dupTab['RADeg'][i], dupTab['decDeg'][i], dupTab['RADeg'].data, dupTab['decDeg'].data)
-        mask=np.less_equal(rDeg, XMATCH_RADIUS_DEG)
-        if mask.sum() == 0:	# This ought not to be possible but catch anyway
-            bestIndex=i
-        else:
-            indices=np.where(mask == True)[0]
-            bestIndex=indices[np.equal(dupTab['SNR'][mask], dupTab['SNR'][mask].max())][0]
-        keepMask[bestIndex]=True
+    keepMask[jIndices[firstMask]]=True
     keepTab=dupTab[keepMask]
     
     keepTab=atpy.vstack([keepTab, noDupTab])
@@ -595,27 +630,21 @@ def flagTileBoundarySplits(tab, xMatchRadiusArcmin = 2.5):
     dupTab=tab[mask]
     noDupTab=tab[noDupMask]
         
-    # Identify pairs split across tile boundaries
+    # Identify pairs split across tile boundaries - every object in the neighbourhood of an object is
+    # flagged if any of them is in a different tile to that object
+    tileNames=np.asarray(dupTab['tileName'])
+    iIndices, jIndices=_getNeighbourPairs(np.asarray(dupTab['RADeg']), np.asarray(dupTab['decDeg']),
+                                          xMatchRadiusDeg)
+    splitMask=np.zeros(len(dupTab), dtype = bool)
+    splitMask[iIndices[np.not_equal(tileNames[iIndices], tileNames[jIndices])]]=True
     tileBoundarySplit=np.zeros(len(dupTab), dtype = bool)
-    for i in range(len(dupTab)):
-        # NOTE: astCoords does not like atpy.Columns sometimes...
-        rDeg=astCoords.calcAngSepDeg(dupTab['RADeg'][i], dupTab['decDeg'][i], dupTab['RADeg'].data, dupTab['decDeg'].data)
-        mask=np.less_equal(rDeg, xMatchRadiusDeg)
-        if mask.sum() == 0:	# This ought not to be possible but catch anyway
-            bestIndex=i
-        else:
-            indices=np.where(mask == True)[0]
-            bestIndex=indices[np.equal(dupTab['SNR'][mask], dupTab['SNR'][mask].max())][0]
-            if np.unique(dupTab['tileName'][indices]).shape[0] > 1:
-                tileBoundarySplit[indices]=True
+    tileBoundarySplit[jIndices[splitMask[iIndices]]]=True
     dupTab['tileBoundarySplit']=tileBoundarySplit
     dupTab=dupTab[tileBoundarySplit]
     
     # Flag in the main table
-    tab['tileBoundarySplit']=np.zeros(len(tab), dtype = bool)
-    for row in dupTab:
-        mask=(tab['name'] == row['name'])
-        tab['tileBoundarySplit'][mask]=True
+    # One hashed membership test rather than a scan of the whole table per flagged object
+    tab['tileBoundarySplit']=np.isin(np.asarray(tab['name']), np.asarray(dupTab['name']))
         
     return tab
 
@@ -715,39 +744,46 @@ def generateTestCatalog(config, numSourcesPerTile, amplitudeColumnName = 'fixed_
         for i in range(maskDilationPix):
             mapData=1-ndimage.binary_dilation(1-mapData)
         ys, xs=np.where(mapData != 0)
-        ys=ys+np.random.uniform(0, 1, len(ys))
-        xs=xs+np.random.uniform(0, 1, len(xs))
+        # Draw the candidate pixels and their sub-pixel offsets in one go, but only convert to sky
+        # coordinates in batches as needed (pix2wcs over every pixel in the tile is slow)
         indices=np.random.randint(0, len(ys), len(ys))
-        coords=wcs.pix2wcs(xs[indices], ys[indices])
-        coords=np.array(coords)
+        offsets=np.random.uniform(0, 1, [2, len(indices)])
+        batchSize=max(1, 10*numSourcesPerTile)
+        minChord2=_chordSquared(avoidanceRadiusArcmin/60.)
         tileRAs=[]
         tileDecs=[]
-        keepIndices=[]
-        for i in indices:
-            rai=coords[i, 0]
-            deci=coords[i, 1]
-            rDeg=astCoords.calcAngSepDeg(rai, deci, tileRAs, tileDecs)
-            keepObj=False
-            if len(rDeg) > 0:
-                if rDeg.min()*60 > avoidanceRadiusArcmin:
+        tileXYZ=np.empty([numSourcesPerTile, 3])
+        for start in range(0, len(indices), batchSize):
+            batch=indices[start:start+batchSize]
+            coords=wcs.pix2wcs(xs[batch]+offsets[0, start:start+batchSize],
+                               ys[batch]+offsets[1, start:start+batchSize])
+            coords=np.array(coords).reshape(-1, 2)
+            coordsXYZ=_RADecToXYZ(coords[:, 0], coords[:, 1])
+            for (rai, deci), xyz in zip(coords, coordsXYZ):
+                numKept=len(tileRAs)
+                keepObj=False
+                if numKept > 0:
+                    if np.sum(np.power(tileXYZ[:numKept]-xyz, 2), axis = 1).min() > minChord2:
+                        keepObj=True
+                else:
                     keepObj=True
-            else:
-                keepObj=True
-            if keepObj == True:
-                tileRAs.append(rai)
-                tileDecs.append(deci)
-                keepIndices.append(i)
-            if len(keepIndices) == numSourcesPerTile:
+                if keepObj == True:
+                    tileXYZ[numKept]=xyz
+                    tileRAs.append(rai)
+                    tileDecs.append(deci)
+                if len(tileRAs) == numSourcesPerTile:
+                    break
+            if len(tileRAs) == numSourcesPerTile:
                 break
         # Edge case where we have tiny but non-zero area and didn't manage to insert anything
-        if len(coords) == 0:
+        if len(tileRAs) == 0:
             continue
-        RAs=RAs+coords[keepIndices, 0].tolist()
-        decs=decs+coords[keepIndices, 1].tolist()
+        RAs=RAs+tileRAs
+        decs=decs+tileDecs
         if amplitudeDistribution == 'linear':
-            amp=np.random.uniform(amplitudeRange[0], amplitudeRange[1], len(keepIndices))
+            amp=np.random.uniform(amplitudeRange[0], amplitudeRange[1], len(tileRAs))
         elif amplitudeDistribution == 'log':
-            amp=np.power(10, np.random.uniform(np.log10(amplitudeRange)[0], np.log10(amplitudeRange)[1], len(keepIndices)))
+            amp=np.power(10, np.random.uniform(np.log10(amplitudeRange)[0], np.log10(amplitudeRange)[1], len(tileRAs)))
         else:
             raise Exception("Must be either 'linear' or 'log'.")
         amps=amps+amp.tolist()
@@ -802,7 +838,10 @@ def removeCrossMatched(refCatalog, matchCatalog, radiusArcmin = 2.5):
     
     Args:
         refCatalog (:obj:`astropy.table.Table`): The reference catalog.
-        matchCatalog (:obj:`astropy.table.Table`): The catalog to match onto the reference catalog.
+        matchCatalog (:obj:`astropy.table.Table` or :obj:`astropy.coordinates.SkyCoord`): The catalog to 
+            match onto the reference catalog. If the same catalog is to be matched against repeatedly, pass 
+            its coordinates as a SkyCoord object instead - the search tree that astropy builds for matching
+            is stored on that object, and so is only constructed once.
         radiusArcmin (:obj:`float`, optional): Cross-match radius in arcmin.
     
     Returns:
@@ -811,12 +850,15 @@ def removeCrossMatched(refCatalog, matchCatalog, radiusArcmin = 2.5):
     """
         
     inTab=refCatalog
-    outTab=matchCatalog
     RAKey1, decKey1=getTableRADecKeys(inTab)
-    RAKey2, decKey2=getTableRADecKeys(outTab)
     cat1=SkyCoord(ra = inTab[RAKey1].data, dec = inTab[decKey1].data, unit = 'deg')
     xMatchRadiusDeg=radiusArcmin/60.
-    cat2=SkyCoord(ra = outTab[RAKey2].data, dec = outTab[decKey2].data, unit = 'deg')
+    if isinstance(matchCatalog, SkyCoord):
+        cat2=matchCatalog
+    else:
+        outTab=matchCatalog
+        RAKey2, decKey2=getTableRADecKeys(outTab)
+        cat2=SkyCoord(ra = outTab[RAKey2].data, dec = outTab[decKey2].data, unit = 'deg')
     xIndices, rDeg, sep3d = match_coordinates_sky(cat1, cat2, nthneighbor = 1)
     mask=np.greater(rDeg.value, xMatchRadiusDeg)  
     inTab=inTab[mask]
@@ -6,15 +6,17 @@ This module contains tools for calculating the completeness of cluster samples a
 
 import os
 import sys
+import math
+import functools
+import threading
 import resource
 import glob
 import numpy as np
-import pylab as plt
 import astropy.table as atpy
-from astLib import *
+from astLib import astWCS
 from scipy import stats
+from scipy import special
 from scipy import interpolate
-from scipy.interpolate import InterpolatedUnivariateSpline as _spline
 from scipy import ndimage
 from scipy import optimize
 import nemo
@@ -25,14 +27,23 @@ from . import plotSettings
 from . import startUp
 from . import catalogs
 from collections import OrderedDict
-import colorcet
 import types
-import pickle
 import astropy.io.fits as pyfits
 import time
 import shutil
 import yaml
 from decimal import Decimal
+from concurrent.futures import ThreadPoolExecutor
+try:
+    import numba
+    _prange=numba.prange
+except ImportError:
+    numba=None
+    _prange=range
+try:
+    from fast_histogram import histogram2d as _fastHistogram2d
+except ImportError:
+    _fastHistogram2d=None
 
 # If want to catch warnings as errors...
 #import warnings
@@ -91,6 +102,9 @@ class SelFn(object):
         QSource (:obj:`str`, optional): The source to use for Q (the filter mismatch function) - either
             'fit' (to use results from the original Q-fitting routine) or 'injection' (to use Q derived
             from source injection simulations).
+        numThreads (:obj:`int`, optional): Number of threads used for completeness calculations by
+            :meth:`update`. If not given, this is set by the `numThreads` parameter in the Nemo config
+            file (default: 1, i.e., no threading).
 
     Attributes:
         SNRCut (:obj:`float`): Completeness will be computed relative to this signal-to-noise selection cut
@@ -135,7 +149,7 @@ class SelFn(object):
                  downsampleRMS = True, applyMFDebiasCorrection = True, applyRelativisticCorrection = True,
                  setUpAreaMask = False, enableCompletenessCalc = True, delta = 500, rhoType = 'critical',
                  massFunction = 'Tinker08', maxTheta500Arcmin = None, method = 'fast',
-                 QSource = 'fit', noiseCut = None, biasModel = None):
+                 QSource = 'fit', noiseCut = None, biasModel = None, numThreads = None):
         
         self.SNRCut=SNRCut
         self.biasModel=biasModel
@@ -157,6 +171,15 @@ class SelFn(object):
                                         selFnDir = self.selFnDir)
         parDict=self._config.parDict
 
+        # Thread pool used by update() - made once here, as update() may be called many times (e.g., by MCMC)
+        if numThreads is None:
+            numThreads=parDict['numThreads']
+        self.numThreads=numThreads
+        if self.numThreads > 1:
+            self._threadPool=ThreadPoolExecutor(max_workers = self.numThreads)
+        else:
+            self._threadPool=None
+
         if tileNames is not None:
             self.tileNames=tileNames
         else:
@@ -211,29 +234,47 @@ class SelFn(object):
             self.RMSTab=self.RMSTab[self.RMSTab['areaDeg2'] > 0]
             if noiseCut is not None:
                 self.RMSTab=self.RMSTab[self.RMSTab['y0RMS'] < noiseCut]
+            # Split into per-tile tables in one go, rather than scanning the whole table for each tile
+            groupedRMSTab=self.RMSTab.group_by('tileName')
+            tileTabsDict={}
+            for key, group in zip(groupedRMSTab.groups.keys, groupedRMSTab.groups):
+                tileTabsDict[key['tileName']]=group
             self.RMSDict={}
             tileNames=[]
+            tileAreas=[]
             totalAreaDeg2=0.0 # Doing it this way so that tileNames can be chosen and fed into selFn
             for tileName in self.tileNames:
-                tileTab=self.RMSTab[self.RMSTab['tileName'] == tileName]
-                if downsampleRMS == True and len(tileTab) > 0:
+                if tileName not in tileTabsDict.keys():    # We may have some blank tiles...
+                    continue
+                tileTab=tileTabsDict[tileName]
+                areaDeg2=tileTab['areaDeg2'].sum()
+                if downsampleRMS == True:
                     tileTab=downsampleRMSTab(tileTab) 
-                if len(tileTab) > 0:    # We may have some blank tiles...
-                    self.RMSDict[tileName]=tileTab
-                    tileNames.append(tileName)
-                    totalAreaDeg2=totalAreaDeg2+tileTab['areaDeg2'].sum()
+                self.RMSDict[tileName]=tileTab
+                tileNames.append(tileName)
+                tileAreas.append(areaDeg2)
+                totalAreaDeg2=totalAreaDeg2+tileTab['areaDeg2'].sum()
             self.tileNames=tileNames
             self.totalAreaDeg2=totalAreaDeg2
             # If want a plot of noise distribution
             # plt.hist(self.RMSTab['y0RMS'], weights = self.RMSTab['areaDeg2'], bins  = 100, density=True)
 
             # For weighting - arrays where entries correspond with tileNames list
-            tileAreas=[]    
-            for tileName in self.tileNames:
-                areaDeg2=self.RMSTab[self.RMSTab['tileName'] == tileName]['areaDeg2'].sum()
-                tileAreas.append(areaDeg2)
             self.tileAreas=np.array(tileAreas)
             self.fracArea=self.tileAreas/self.totalAreaDeg2
+            self._fracAreaWeights=self.fracArea/self.fracArea.sum()
+            self._y0GridCube=None
+
+            # Noise tables for all tiles flattened into single arrays, so that update() can calculate
+            # completeness over all tiles and noise levels at once (weights are fraction of total area)
+            self._RMSTileIndex=np.repeat(np.arange(len(self.tileNames)),
+                                         [len(self.RMSDict[tileName]) for tileName in self.tileNames])
+            self._y0RMS=np.concatenate([np.asarray(self.RMSDict[tileName]['y0RMS']) for tileName in self.tileNames])
+            RMSAreaWeights=[]
+            for tileName, fracArea in zip(self.tileNames, self.fracArea):
+                tileAreaDeg2=np.asarray(self.RMSDict[tileName]['areaDeg2'])
+                RMSAreaWeights.append(fracArea*tileAreaDeg2/tileAreaDeg2.sum())
+            self._RMSAreaWeights=np.concatenate(RMSAreaWeights)/self.fracArea.sum()
 
             # Check of area consistency
             #checkAreaDeg2=0
@@ -311,14 +352,90 @@ class SelFn(object):
                 areaMap, wcs=loadIntersectionMask(row['tileName'], self.selFnDir, self.footprint)
             self.WCSDict[row['tileName']]=wcs.copy()
             self.areaMaskDict[row['tileName']]=areaMap
-            ra0, dec0=self.WCSDict[row['tileName']].pix2wcs(0, 0)
-            ra1, dec1=self.WCSDict[row['tileName']].pix2wcs(wcs.header['NAXIS1'], wcs.header['NAXIS2'])
-            if ra1 > ra0:
-                ra1=-(360-ra1)
-            row['RAMin']=min([ra0, ra1])
-            row['RAMax']=max([ra0, ra1])
-            row['decMin']=min([dec0, dec1])
-            row['decMax']=max([dec0, dec1])
+            row['RAMin'], row['RAMax'], row['decMin'], row['decMax']=self._getTileBBox(wcs, areaMap.shape)
+        # Plain arrays of the above, for quick broadcasting in checkCoordsInAreaMask
+        self._tileBBoxNames=list(self.tileTab['tileName'])
+        self._tileRAMin=np.array(self.tileTab['RAMin'])
+        self._tileRAMax=np.array(self.tileTab['RAMax'])
+        self._tileDecMin=np.array(self.tileTab['decMin'])
+        self._tileDecMax=np.array(self.tileTab['decMax'])
+        self._setUpTileIndex()
+
+
+    def _getTileBBox(self, wcs, shape, numEdgePoints = 200):
+        """Returns a (RAMin, RAMax, decMin, decMax) box that contains the whole of a tile, i.e., every
+        position that wcs2pix maps onto a pixel in the tile (pixel coords -0.5 to N-0.5). This is found by
+        walking around the outer pixel edges (the RA, dec extremes of a tile not containing a pole lie on
+        its boundary, even for TAN tiles), padded by a pixel to cover the curvature of the edges between
+        the sampled points. RAMin is -ve for tiles that wrap 0h.
+
+        """
+
+        ny, nx=shape
+        xEdge=np.linspace(-0.5, nx-0.5, numEdgePoints)
+        yEdge=np.linspace(-0.5, ny-0.5, numEdgePoints)
+        xs=np.concatenate([xEdge, xEdge, np.full(numEdgePoints, -0.5), np.full(numEdgePoints, nx-0.5)])
+        ys=np.concatenate([np.full(numEdgePoints, -0.5), np.full(numEdgePoints, ny-0.5), yEdge, yEdge])
+        edgeCoords=np.array(wcs.pix2wcs(xs, ys)).reshape(-1, 2)
+        RACentre, decCentre=wcs.pix2wcs((nx-1)/2., (ny-1)/2.)
+        dRAs=np.mod(edgeCoords[:, 0]-RACentre+180, 360)-180
+        decs=edgeCoords[:, 1]
+        padDeg=wcs.getPixelSizeDeg()
+        decMin=max(decs.min()-padDeg, -90.)
+        decMax=min(decs.max()+padDeg, 90.)
+        RAPadDeg=padDeg/max(np.cos(np.radians(max(abs(decMin), abs(decMax)))), 1e-6)
+        RAMin=RACentre+dRAs.min()-RAPadDeg
+        RAMax=RACentre+dRAs.max()+RAPadDeg
+        if RAMax > 360:
+            RAMin, RAMax=RAMin-360, RAMax-360
+
+        return RAMin, RAMax, decMin, decMax
+
+
+    def _setUpTileIndex(self):
+        """Bins the tile bounding boxes onto a coarse grid of cells in (RA, dec), so that
+        checkCoordsInAreaMask only needs to test each coordinate against the tiles overlapping its cell,
+        rather than against every tile. The tiles in each cell are stored in CSR-style arrays.
+        
+        """
+        
+        # Cells around the size of a typical tile keep the number of candidate tiles per cell small
+        RAWidths=self._tileRAMax-self._tileRAMin
+        decHeights=self._tileDecMax-self._tileDecMin
+        self._cellSizeDeg=max(0.5, min(np.median(RAWidths), np.median(decHeights)))
+        self._numRACells=int(np.ceil(360/self._cellSizeDeg))
+        self._numDecCells=int(np.ceil(180/self._cellSizeDeg))
+        cellIndices=[]
+        tileIndices=[]
+        for t in range(len(self._tileBBoxNames)):
+            # Tiles that wrap 0h have -ve RAMin, so cover two RA ranges in 0 <= RA < 360
+            if self._tileRAMin[t] < 0:
+                RARanges=[[self._tileRAMin[t]+360, 360], [0, self._tileRAMax[t]]]
+            else:
+                RARanges=[[self._tileRAMin[t], self._tileRAMax[t]]]
+            decCells=self._getCellRange(self._tileDecMin[t]+90, self._tileDecMax[t]+90, self._numDecCells)
+            for RARange in RARanges:
+                RACells=self._getCellRange(RARange[0], RARange[1], self._numRACells)
+                cells=(decCells[:, np.newaxis]*self._numRACells+RACells).ravel()
+                cellIndices.append(cells)
+                tileIndices.append(np.full(len(cells), t))
+        cellIndices=np.concatenate(cellIndices)
+        tileIndices=np.concatenate(tileIndices)
+        order=np.argsort(cellIndices, kind = 'stable')
+        self._cellTiles=tileIndices[order]
+        self._cellCounts=np.bincount(cellIndices, minlength = self._numRACells*self._numDecCells)
+        self._cellOffsets=np.cumsum(self._cellCounts)-self._cellCounts
+
+
+    def _getCellRange(self, minDeg, maxDeg, numCells):
+        """Returns the indices of the grid cells (see _setUpTileIndex) spanned by the range minDeg, maxDeg.
+        
+        """
+        
+        i0=min(max(int(np.floor(minDeg/self._cellSizeDeg)), 0), numCells-1)
+        i1=min(max(int(np.floor(maxDeg/self._cellSizeDeg)), 0), numCells-1)
+        
+        return np.arange(i0, i1+1)
             
 
     def cutCatalogToSurveyArea(self, catalog):
@@ -346,31 +463,57 @@ class SelFn(object):
             decDeg (:obj:`float` or :obj:`np.ndarray`): Dec in decimal degrees.
         
         Returns:
-            `True` if the coordinates are in the area mask mask, `False` if not.
-            
+            `True` if the coordinates are in the area mask mask, `False` if not. If arrays of coordinates
+            are given, an array of booleans is returned.
+
         """
 
         if self.tileTab is None:
             self._setUpAreaMask()
 
-        RADeg=np.array(RADeg)
-        decDeg=np.array(decDeg)
-        if RADeg.shape == ():
-            RADeg=np.array([RADeg])
-        if decDeg.shape == ():
-            decDeg=np.array([decDeg])
+        isScalar=np.ndim(RADeg) == 0
+        RADeg=np.atleast_1d(np.asarray(RADeg, dtype = float))
+        decDeg=np.atleast_1d(np.asarray(decDeg, dtype = float))
         inMask=np.zeros(len(RADeg), dtype = bool)
-        tabList=[]
-        for tileName in self.tileNames:
+
+        # Candidate tiles for each coord are those overlapping its grid cell (see _setUpTileIndex) - we test
+        # all (coord, candidate tile) pairs against the tile bounding boxes in one go, so that we only need to
+        # call wcs2pix for the coords that could possibly fall in each tile (RAMin may be -ve for tiles that
+        # wrap 0h)
+        RACells=np.clip(np.floor(np.mod(RADeg, 360)/self._cellSizeDeg), 0, self._numRACells-1).astype(int)
+        decCells=np.clip(np.floor((decDeg+90)/self._cellSizeDeg), 0, self._numDecCells-1).astype(int)
+        cells=decCells*self._numRACells+RACells
+        counts=self._cellCounts[cells]
+        pointIndices=np.repeat(np.arange(len(RADeg)), counts)
+        pairOffsets=np.arange(counts.sum())-np.repeat(np.cumsum(counts)-counts, counts)
+        tileIndices=self._cellTiles[np.repeat(self._cellOffsets[cells], counts)+pairOffsets]
+        RAs=RADeg[pointIndices]
+        wrappedRAs=RAs-360
+        decs=decDeg[pointIndices]
+        RAMin, RAMax=self._tileRAMin[tileIndices], self._tileRAMax[tileIndices]
+        inBox=np.logical_or(np.logical_and(RAs >= RAMin, RAs < RAMax),
+                            np.logical_and(wrappedRAs >= RAMin, wrappedRAs < RAMax))
+        inBox=np.logical_and(inBox, np.logical_and(decs >= self._tileDecMin[tileIndices],
+                                                   decs < self._tileDecMax[tileIndices]))
+        pointIndices=pointIndices[inBox]
+        tileIndices=tileIndices[inBox]
+        order=np.argsort(tileIndices, kind = 'stable')
+        pointIndices=pointIndices[order]
+        tileIndices=tileIndices[order]
+        uniqueTiles, splitIndices=np.unique(tileIndices, return_index = True)
+        for t, idx in zip(uniqueTiles, np.split(pointIndices, splitIndices[1:])):
+            tileName=self._tileBBoxNames[t]
             wcs=self.WCSDict[tileName]
             areaMask=self.areaMaskDict[tileName]
-            if areaMask.sum() > 0:
-                coords=wcs.wcs2pix(RADeg, decDeg)
-                coords=np.array(np.round(coords), dtype = int)
-                mask1=np.logical_and(coords[:, 0] >= 0, coords[:, 1] >= 0)
-                mask2=np.logical_and(coords[:, 0] < areaMask.shape[1], coords[:, 1] < areaMask.shape[0])
-                mask=np.logical_and(mask1, mask2)
-                inMask[mask]=inMask[mask]+areaMask[coords[:, 1][mask], coords[:, 0][mask]]
+            coords=np.array(wcs.wcs2pix(RADeg[idx], decDeg[idx])).reshape(-1, 2)
+            coords=np.array(np.round(coords), dtype = int)
+            mask1=np.logical_and(coords[:, 0] >= 0, coords[:, 1] >= 0)
+            mask2=np.logical_and(coords[:, 0] < areaMask.shape[1], coords[:, 1] < areaMask.shape[0])
+            mask=np.logical_and(mask1, mask2)
+            inMask[idx[mask]]|=areaMask[coords[:, 1][mask], coords[:, 0][mask]] > 0
+
+        if isScalar == True:
+            return inMask[0]
 
         return inMask
         
@@ -389,6 +532,7 @@ class SelFn(object):
             self.scalingRelationDict=scalingRelationDict
         
         self.mockSurvey.update(H0, Om0, Ob0, sigma8, ns)
+        self._signalGridsCache=None
         zRange=self.mockSurvey.z
         if self.method == 'injection':
 
@@ -423,73 +567,73 @@ class SelFn(object):
                                                                                   mode = mode, truncate = truncate)
 
         elif self.method == 'fast':
-            y0GridCube=[]
-            compMzCube=[]
-            theta500Cube=[]
-            for tileName in self.RMSDict.keys():
-                y0Grid, theta500Grid=self._makeSignalGrids(tileName = tileName)
-                # Calculate completeness using area-weighted average
-                # NOTE: RMSTab that is fed in here can be downsampled in noise resolution for speed
-                RMSTab=self.RMSDict[tileName]
-                areaWeights=RMSTab['areaDeg2']/RMSTab['areaDeg2'].sum()
-                y0Lim=self.SNRCut*RMSTab['y0RMS']
-                log_y0Lim=np.log(self.SNRCut*RMSTab['y0RMS'])
-                log_y0=np.log(y0Grid)
-                compMz=np.zeros(log_y0.shape)
-                for i in range(len(RMSTab)):
-                    if self.biasModel is not None:
-                        trueSNR=y0Grid/RMSTab['y0RMS'][i]
-                        corrFactors=self.biasModel['func'](trueSNR, self.biasModel['params'][0], self.biasModel['params'][1], self.biasModel['params'][2])
-                    else:
-                        corrFactors=np.ones(y0Grid.shape)
-                    # With intrinsic scatter [may not be quite right, but a good approximation]
-                    totalLogErr=np.sqrt((RMSTab['y0RMS'][i]/y0Grid)**2 + self.scalingRelationDict['sigma_int']**2)
-                    sfi=stats.norm.sf(y0Lim[i], loc = y0Grid*corrFactors, scale = totalLogErr*(y0Grid*corrFactors))
-                    compMz=compMz+sfi*areaWeights[i]
-                    # No intrinsic scatter, Gaussian noise
-                    #sfi=stats.norm.sf(y0Lim[i], loc = y0Grid, scale = RMSTab['y0RMS'][i])
-                    #compMz=compMz+sfi*areaWeights[i]
-                if self.maxTheta500Arcmin is not None:
-                    compMz=compMz*np.array(theta500Grid < self.maxTheta500Arcmin, dtype = float)
-                compMzCube.append(compMz)
-                y0GridCube.append(y0Grid)
-            compMzCube=np.array(compMzCube)
-            y0GridCube=np.array(y0GridCube)
-            self.compMz=np.average(compMzCube, axis = 0, weights = self.fracArea)
-            # self.compMz=np.einsum('ijk,i->jk', np.nan_to_num(compMzCube), self.fracArea) # Equivalent, for noting
-            self.y0TildeGrid=np.average(y0GridCube, axis = 0, weights = self.fracArea)
+            # The y0 grid for each tile is written into a buffer that is re-used between calls
+            gridShape=self.mockSurvey.clusterCount.shape
+            if self._y0GridCube is None or self._y0GridCube.shape[1:] != gridShape:
+                self._y0GridCube=np.zeros((len(self.tileNames),)+gridShape)
+            y0GridCube=self._y0GridCube
+            for i in range(len(self.tileNames)):
+                y0GridCube[i], theta500Grid=self._makeSignalGrids(tileName = self.tileNames[i])
+            # Calculate completeness using area-weighted average over all tiles and noise levels at once
+            # We work through the flattened noise tables in blocks, to keep memory usage sensible - the
+            # blocks are independent, so they can be shared out over threads (see numThreads)
+            # NOTE: RMSTab that is fed in here can be downsampled in noise resolution for speed
+            blockSize=max(1, int(2**20/y0GridCube[0].size))
+            blockStarts=range(0, len(self._y0RMS), blockSize)
+            if len(blockStarts) > 1 and self._threadPool is not None:
+                blockCompMzs=list(self._threadPool.map(lambda start: self._calcBlockCompleteness(y0GridCube, start, blockSize),
+                                                       blockStarts))
+            else:
+                blockCompMzs=[self._calcBlockCompleteness(y0GridCube, start, blockSize) for start in blockStarts]
+            compMz=np.sum(blockCompMzs, axis = 0)
+            if self.maxTheta500Arcmin is not None:
+                compMz=compMz*np.array(theta500Grid < self.maxTheta500Arcmin, dtype = float)
+            self.compMz=compMz
+            self.y0TildeGrid=np.tensordot(self._fracAreaWeights, y0GridCube, axes = 1)
+
+
+    def _calcBlockCompleteness(self, y0GridCube, start, blockSize):
+        """Returns the contribution to the survey-averaged completeness from a block of the flattened noise
+        tables (see :meth:`update`), starting at index `start`.
+
+        """
+        block=slice(start, start+blockSize)
+        y0Grid=y0GridCube[self._RMSTileIndex[block]]
+        y0RMS=self._y0RMS[block][:, np.newaxis, np.newaxis]
+        if self.biasModel is not None:
+            trueSNR=y0Grid/y0RMS
+            corrFactors=self.biasModel['func'](trueSNR, self.biasModel['params'][0], self.biasModel['params'][1], self.biasModel['params'][2])
+        else:
+            corrFactors=1.0
+        # With intrinsic scatter [may not be quite right, but a good approximation]
+        totalLogErr=np.sqrt((y0RMS/y0Grid)**2 + self.scalingRelationDict['sigma_int']**2)
+        sfi=stats.norm.sf(self.SNRCut*y0RMS, loc = y0Grid*corrFactors, scale = totalLogErr*(y0Grid*corrFactors))
+        # No intrinsic scatter, Gaussian noise
+        #sfi=stats.norm.sf(self.SNRCut*y0RMS, loc = y0Grid, scale = y0RMS)
+
+        return np.tensordot(self._RMSAreaWeights[block], sfi, axes = 1)
 
 
     def _makeSignalGrids(self, applyQ = True, tileName = None):
         """Returns y0~ and theta500 grid. tileName here is optional and only used for Q.
 
         """
-        zRange=self.mockSurvey.z
-        tenToA0, B0, Mpivot, sigma_int=[self.scalingRelationDict['tenToA0'], self.scalingRelationDict['B0'],
-                                        self.scalingRelationDict['Mpivot'], self.scalingRelationDict['sigma_int']]
-        y0Grid=np.zeros([zRange.shape[0], self.mockSurvey.clusterCount.shape[1]])
-        theta500Grid=np.zeros([zRange.shape[0], self.mockSurvey.clusterCount.shape[1]])
-        for i in range(len(zRange)):
-            zk=zRange[i]
-            k=np.argmin(abs(self.mockSurvey.z-zk))
-            if self.mockSurvey.delta != 500 or self.mockSurvey.rhoType != "critical":
-                log10M500s=np.log10(self.mockSurvey._transToM500c(self.mockSurvey.cosmoModel,
-                                                                  self.mockSurvey.M,
-                                                                  self.mockSurvey.a[k]))
+        # Everything except Q is the same for all tiles, so only do this once per update
+        if self._signalGridsCache is None:
+            self._signalGridsCache=self._makeTileIndependentSignalGrids()
+        y0Grid, theta500Grid=self._signalGridsCache
+        if applyQ == True:
+            zRange=self.mockSurvey.z
+            if self.Q.zDependent == True:
+                QGrid=np.zeros(theta500Grid.shape)
+                for i in range(len(zRange)):
+                    QGrid[i]=self.Q.getQ(theta500Grid[i], zRange[i], tileName = tileName)
+                    #QGrid[i]=self.compQInterpolator(theta500Grid[i]) # Survey-averaged Q from injection sims
             else:
-                log10M500s=self.mockSurvey.log10M
-            theta500s_zk=interpolate.splev(log10M500s, self.mockSurvey.theta500Splines[k])
-            Qs_zk=self.Q.getQ(theta500s_zk, zk, tileName = tileName)
-            #Qs_zk=self.compQInterpolator(theta500s_zk) # Survey-averaged Q from injection sims
-            true_y0s_zk=tenToA0*np.power(self.mockSurvey.Ez[k], 2)*np.power(np.power(10, self.mockSurvey.log10M)/Mpivot,
-                                                                            1+B0)
-            if applyQ == True:
-                true_y0s_zk=true_y0s_zk*Qs_zk
-            if self.applyRelativisticCorrection == True:
-                fRels_zk=interpolate.splev(log10M500s, self.mockSurvey.fRelSplines[k])
-                true_y0s_zk=true_y0s_zk*fRels_zk
-            y0Grid[i]=true_y0s_zk #*0.95
-            theta500Grid[i]=theta500s_zk
+                QGrid=self.Q.getQ(theta500Grid, tileName = tileName)
+            y0Grid=y0Grid*QGrid
+        else:
+            y0Grid=y0Grid.copy()
 
         # For some cosmological parameters, we can still get the odd -ve y0
         y0Grid[y0Grid <= 0] = 1e-9
@@ -497,6 +641,24 @@ class SelFn(object):
         return y0Grid, theta500Grid
 
 
+    def _makeTileIndependentSignalGrids(self):
+        """Returns true y0 (without Q applied) and theta500 grids. These depend only on the cosmological
+        and scaling relation parameters, and are cached by :meth:`_makeSignalGrids` until the next
+        :meth:`update`.
+
+        """
+        tenToA0, B0, Mpivot, sigma_int=[self.scalingRelationDict['tenToA0'], self.scalingRelationDict['B0'],
+                                        self.scalingRelationDict['Mpivot'], self.scalingRelationDict['sigma_int']]
+        # theta500, fRel on the (z, log10M) grid are cached in MockSurvey (computed using M500c)
+        theta500Grid=self.mockSurvey.theta500Grid
+        y0Grid=tenToA0*self.mockSurvey.Ez2[:, np.newaxis]* \
+               np.power(np.power(10, self.mockSurvey.log10M)/Mpivot, 1+B0)[np.newaxis, :]
+        if self.applyRelativisticCorrection == True:
+            y0Grid=y0Grid*self.mockSurvey.fRelGrid
+
+        return y0Grid, theta500Grid
+
+
     def projectCatalogToMz(self, tab):
         """Project a Nemo cluster catalog (an astropy Table) into the (log\ :sub:`10` mass, z) grid, taking
         into account the uncertainties on y0, and redshift. Note that if the redshift error is non-zero, this
@@ -515,19 +677,18 @@ class SelFn(object):
         tenToA0, B0, Mpivot, sigma_int=self.scalingRelationDict['tenToA0'], self.scalingRelationDict['B0'], \
                                        self.scalingRelationDict['Mpivot'], self.scalingRelationDict['sigma_int']
 
-        for row in tab:
-            tileName=row['tileName']
-            z=row['redshift']
-            zErr=row['redshiftErr']
-            y0=row['fixed_y_c']*1e-4
-            y0Err=row['fixed_err_y_c']*1e-4
-            P=signals.calcPMass(y0, y0Err, z, zErr, self.Q, self.mockSurvey, 
-                                  tenToA0 = tenToA0, B0 = B0, Mpivot = Mpivot, sigma_int = sigma_int, 
-                                  applyMFDebiasCorrection = self.applyMFDebiasCorrection, 
-                                  fRelWeightsDict = self.fRelDict[tileName],
-                                  return2D = True, tileName = tileName)
-            # Paste into (M, z) grid
-            catProjectedMz=catProjectedMz+P # For return2D = True, P is normalised such that 2D array sum is 1
+        # Clusters in the same tile share Q, so are projected together in one batch
+        tileNames=np.array(tab['tileName'])
+        for tileName in np.unique(tileNames):
+            tileTab=tab[tileNames == tileName]
+            y0=np.array(tileTab['fixed_y_c'])*1e-4
+            y0Err=np.array(tileTab['fixed_err_y_c'])*1e-4
+            P=signals.calcPMassBatch(y0, y0Err, np.array(tileTab['redshift']), np.array(tileTab['redshiftErr']),
+                                     self.Q, self.mockSurvey, tenToA0 = tenToA0, B0 = B0, Mpivot = Mpivot,
+                                     sigma_int = sigma_int, applyMFDebiasCorrection = self.applyMFDebiasCorrection,
+                                     tileName = tileName)
+            # Paste into (M, z) grid - each cluster's P is normalised such that its 2D array sum is 1
+            catProjectedMz=catProjectedMz+P.sum(axis = 0)
         
         return catProjectedMz
 
@@ -667,28 +828,35 @@ def _parseSourceInjectionData(injTab, inputTab, SNRCut):
     # We also derive survey-averaged Q here from the injection sim results [for y0 -> y0~ mapping]
     # NOTE: This is a survey-wide average, doesn't respect footprints at the moment
     # NOTE: This will need re-thinking for evolving, non-self-similar models?
-    theta500s=np.unique(inputTab['theta500Arcmin'])
+    # Group rows by theta500 once (rather than scanning both tables for every theta500 value), then
+    # histogram in (theta500 index, flux) space in a single pass per table
+    theta500s, inputThetaIndices=np.unique(inputTab['theta500Arcmin'], return_inverse = True)
     binEdges=np.linspace(inputTab['inFlux'].min(), inputTab['inFlux'].max(), 101)
     binCentres=(binEdges[1:]+binEdges[:-1])/2
+    thetaBinEdges=np.arange(len(theta500s)+1)-0.5
+    injThetas=np.asarray(injTab['theta500Arcmin'])
+    injThetaIndices=np.minimum(np.searchsorted(theta500s, injThetas), len(theta500s)-1)
+    injMask=np.logical_and(theta500s[injThetaIndices] == injThetas, injTab['SNR'] > SNRCut)
+    injThetaIndices=injThetaIndices[injMask]
+    injFlux=np.asarray(injTab['inFlux'][injMask])
+    outFlux=np.asarray(injTab['outFlux'][injMask])
+    recN=np.histogram2d(injThetaIndices, injFlux, bins = [thetaBinEdges, binEdges])[0]
+    inpN=np.histogram2d(inputThetaIndices.ravel(), np.asarray(inputTab['inFlux']), bins = [thetaBinEdges, binEdges])[0]
     compThetaGrid=np.zeros((theta500s.shape[0], binCentres.shape[0]))
+    valid=inpN > 0
+    compThetaGrid[valid]=recN[valid]/inpN[valid]
+    # Median flux ratio for each theta500 - contiguous slices after a single sort
     thetaQ=np.zeros(len(theta500s))
     #thetaQ_05=np.zeros(len(theta500s))
     #thetaQ_95=np.zeros(len(theta500s))
+    sortIndices=np.argsort(injThetaIndices, kind = 'stable')
+    ratios=(outFlux/injFlux)[sortIndices]
+    groupStarts=np.searchsorted(injThetaIndices[sortIndices], np.arange(len(theta500s)+1))
     for i in range(len(theta500s)):
-        t=theta500s[i]
-        injMask=np.logical_and(injTab['theta500Arcmin'] == t, injTab['SNR'] > SNRCut)
-        inputMask=inputTab['theta500Arcmin'] == t
-        injFlux=injTab['inFlux'][injMask]
-        outFlux=injTab['outFlux'][injMask]
-        inputFlux=inputTab['inFlux'][inputMask]
-        recN, binEdges=np.histogram(injFlux, bins = binEdges)
-        inpN, binEdges=np.histogram(inputFlux, bins = binEdges)
-        valid=inpN > 0
-        compThetaGrid[i][valid]=recN[valid]/inpN[valid]
-        if len(outFlux) > 0:
-            thetaQ[i]=np.median(outFlux/injFlux)
-            #thetaQ_05[i]=np.percentile(outFlux/injFlux, 5)
-            #thetaQ_95[i]=np.percentile(outFlux/injFlux, 95)
+        if groupStarts[i+1] > groupStarts[i]:
+            thetaQ[i]=np.median(ratios[groupStarts[i]:groupStarts[i+1]])
+            #thetaQ_05[i]=np.percentile(ratios[groupStarts[i]:groupStarts[i+1]], 5)
+            #thetaQ_95[i]=np.percentile(ratios[groupStarts[i]:groupStarts[i+1]], 95)
 
     return theta500s, binCentres, compThetaGrid, thetaQ
 
@@ -797,8 +965,12 @@ def loadIntersectionMask(tileName, selFnDir, footprint):
 def _loadTile(tileName, baseDir, baseFileName, extension = 'fits'):
     """Generic function to load a tile image from either a multi-extension FITS file, or a file with 
     #tileName.fits type extension, whichever is found.
+    
+    Recently loaded tiles are cached in memory (keyed on the file modification time, so that files that
+    are re-written are re-read), up to a total of TILE_CACHE_MAX_GB. Since the cached arrays are shared
+    between callers, the returned map array is read-only - take a copy if you need to modify it.
         
-    Returns map array, wcs
+    Returns read-only map array, wcs
     
     """
     
@@ -810,6 +982,29 @@ def _loadTile(tileName, baseDir, baseFileName, extension = 'fits'):
         fileName=baseDir+os.path.sep+tileName+os.path.sep+"%s#%s.%s" % (baseFileName, tileName, extension)
     else:
         fileName=baseDir+os.path.sep+"%s.%s" % (baseFileName, extension)
+    data, wcs=_loadTileCached(fileName, tileName, os.path.getmtime(fileName))
+    
+    return data, wcs.copy()
+
+#------------------------------------------------------------------------------------------------------------
+# Memory budget for tiles cached by _loadTile (set to 0 to disable caching)
+TILE_CACHE_MAX_GB=1.0
+_tileCache=OrderedDict()
+_tileCacheLock=threading.Lock()
+def _loadTileCached(fileName, tileName, mtime):
+    """Does the work for _loadTile, keeping the most recently used tiles in memory, up to a total size of
+    TILE_CACHE_MAX_GB. mtime is only used as part of the cache key.
+    
+    Returns read-only map array, wcs
+    
+    """
+    
+    key=(fileName, tileName, mtime)
+    with _tileCacheLock:
+        if key in _tileCache:
+            _tileCache.move_to_end(key)
+            return _tileCache[key]
+
     with pyfits.open(fileName) as img:
         # If we find the tile - great. If not, we use first extension with data as it'll be compressed
         if tileName in img:
@@ -824,6 +1019,15 @@ def _loadTile(tileName, baseDir, baseFileName, extension = 'fits'):
                     break
         data=img[extName].data
         wcs=astWCS.WCS(img[extName].header, mode = 'pyfits')
+    data.flags.writeable=False
+
+    # Least recently used tiles are dropped first, once over budget
+    with _tileCacheLock:
+        _tileCache[key]=(data, wcs)
+        cachedBytes=sum(cachedData.nbytes for cachedData, cachedWCS in _tileCache.values())
+        while cachedBytes > TILE_CACHE_MAX_GB*1e9 and len(_tileCache) > 0:
+            droppedData, droppedWCS=_tileCache.popitem(last = False)[1]
+            cachedBytes=cachedBytes-droppedData.nbytes
     
     return data, wcs
 
@@ -849,12 +1053,16 @@ def getTileTotalAreaDeg2(tileName, selFnDir, masksList = [], footprintLabel = No
     """
     
     areaMap, wcs=loadAreaMask(tileName, selFnDir)
-    areaMapSqDeg=(maps.getPixelAreaArcmin2Map(areaMap.shape, wcs)*areaMap)/(60**2)
-    totalAreaDeg2=areaMapSqDeg.sum()
+    # Pixel area only varies with declination, so we only need it for each row
+    pixAreaDeg2=maps.getPixelAreaArcmin2Column(areaMap.shape[0], wcs)/(60**2)
     
     if footprintLabel is not None:  
+        # Only pixels inside the footprint count - index these rather than multiplying whole maps
         intersectMask=makeIntersectionMask(tileName, selFnDir, footprintLabel, masksList = masksList)
-        totalAreaDeg2=(areaMapSqDeg*intersectMask).sum()        
+        validMask=intersectMask != 0
+        totalAreaDeg2=(pixAreaDeg2[np.nonzero(validMask)[0]]*areaMap[validMask]).sum()
+    else:
+        totalAreaDeg2=(areaMap.sum(axis = 1)*pixAreaDeg2).sum()
         
     return totalAreaDeg2
 
@@ -903,12 +1111,11 @@ def makeIntersectionMask(tileName, selFnDir, label, masksList = []):
         raise Exception("didn't find previously cached intersection mask but makeIntersectionMask called with empty masksList")
     print("... creating %s intersection mask (%s) ..." % (label, tileName))         
     intersectMask=np.zeros(areaMap.shape)
+    # The output WCS is the same for every mask, so we only need these once
     outRACoords=np.array(wcs.pix2wcs(np.arange(intersectMask.shape[1]), [0]*intersectMask.shape[1]))
-    outDecCoords=np.array(wcs.pix2wcs([0]*np.arange(intersectMask.shape[0]), np.arange(intersectMask.shape[0])))
+    outDecCoords=np.array(wcs.pix2wcs([0]*intersectMask.shape[0], np.arange(intersectMask.shape[0])))
     outRA=outRACoords[:, 0]
     outDec=outDecCoords[:, 1]
-    RAToX=interpolate.interp1d(outRA, np.arange(intersectMask.shape[1]), fill_value = 'extrapolate')
-    DecToY=interpolate.interp1d(outDec, np.arange(intersectMask.shape[0]), fill_value = 'extrapolate')
     for fileName in masksList:
         with pyfits.open(fileName) as maskImg:
             for hdu in maskImg:
@@ -926,25 +1133,36 @@ def makeIntersectionMask(tileName, selFnDir, label, masksList = []):
         inDecCoords=np.array(maskWCS.pix2wcs([xc]*len(yIn), yIn))
         inRA=inRACoords[:, 0]
         inDec=inDecCoords[:, 1]
-        RAToX=interpolate.interp1d(inRA, xIn, fill_value = 'extrapolate')
-        DecToY=interpolate.interp1d(inDec, yIn, fill_value = 'extrapolate')
-        outRACoords=np.array(wcs.pix2wcs(np.arange(intersectMask.shape[1]), [0]*intersectMask.shape[1]))
-        outDecCoords=np.array(wcs.pix2wcs([0]*np.arange(intersectMask.shape[0]), np.arange(intersectMask.shape[0])))
-        outRA=outRACoords[:, 0]
-        outDec=outDecCoords[:, 1]
-        xIn=np.array(RAToX(outRA), dtype = int)
-        yIn=np.array(DecToY(outDec), dtype = int)
+        xIn=np.array(_interpExtrapolate(outRA, inRA, xIn), dtype = int)
+        yIn=np.array(_interpExtrapolate(outDec, inDec, yIn), dtype = int)
         xMask=np.logical_and(xIn >= 0, xIn < maskData.shape[1])
         yMask=np.logical_and(yIn >= 0, yIn < maskData.shape[0])
-        xOut=np.arange(intersectMask.shape[1])
-        yOut=np.arange(intersectMask.shape[0])
-        for i in yOut[yMask]:
-            intersectMask[i][xMask]=maskData[yIn[i], xIn[xMask]]
-    intersectMask=np.array(np.greater(intersectMask, 0.5), dtype = int)
+        ys=np.flatnonzero(yMask)
+        xs=np.flatnonzero(xMask)
+        intersectMask[np.ix_(ys, xs)]=maskData[np.ix_(yIn[ys], xIn[xs])]
+    intersectMask=np.array(np.greater(intersectMask, 0.5), dtype = np.uint8)
     maps.saveFITS(intersectFileName, intersectMask*areaMap, wcs, compressionType = 'PLIO_1')
 
     return intersectMask
 
+#------------------------------------------------------------------------------------------------------------
+def _interpExtrapolate(x, xp, fp):
+    """Linear interpolation of fp(xp) at x, with linear extrapolation from the end points. This gives the
+    same results as scipy's interp1d(xp, fp, fill_value = 'extrapolate'), but without the overhead of
+    building an interpolator object. Used for mapping coordinates to pixels.
+    
+    """
+    
+    order=np.argsort(xp, kind = "mergesort")
+    xp=xp[order]
+    fp=fp[order]
+    # Clip end segment indices (as interp1d does), so points outside the range extrapolate the end segments
+    hi=np.clip(np.searchsorted(xp, x), 1, len(xp)-1)
+    lo=hi-1
+    slope=(fp[hi]-fp[lo])/(xp[hi]-xp[lo])
+    
+    return slope*(x-xp[lo])+fp[lo]
+
 #------------------------------------------------------------------------------------------------------------
 def getRMSTab(tileName, photFilterLabel, selFnDir, footprintLabel = None):
     """Makes a table containing map area in the tile refered to by `tileName` against RMS (noise level)
@@ -972,31 +1190,39 @@ def getRMSTab(tileName, photFilterLabel, selFnDir, footprintLabel = None):
     if footprintLabel is not None:
         RMSTabFileName=RMSTabFileName.replace(".fits", "_%s.fits" % (footprintLabel))
     if os.path.exists(RMSTabFileName):
-        tab=atpy.Table().read(RMSTabFileName)
-        return tab[np.where(tab['tileName'] == tileName)]
+        tab, tileSlicesDict=_loadGlobalRMSTab(RMSTabFileName, os.path.getmtime(RMSTabFileName))
+        if tileName in tileSlicesDict.keys():
+            return tab[tileSlicesDict[tileName]].copy()
+        return tab[:0]
 
     # Table doesn't exist, so make it...
     print(("... making RMS table for tile = %s, footprint = %s" % (tileName, footprintLabel)))
     RMSMap, wcs=loadRMSMap(tileName, selFnDir, photFilterLabel)
     areaMap, wcs=loadAreaMask(tileName, selFnDir)
-    areaMapSqDeg=(maps.getPixelAreaArcmin2Map(areaMap.shape, wcs)*areaMap)/(60**2)
+    # Pixel area only varies with declination, so we only need it for each row
+    pixAreaDeg2=maps.getPixelAreaArcmin2Column(areaMap.shape[0], wcs)/(60**2)
 
+    # Only pixels with non-zero RMS (and inside the footprint, if given) count - we index these rather
+    # than multiplying whole maps by the intersection mask
+    validMask=RMSMap != 0
     if footprintLabel != None:  
         intersectMask=makeIntersectionMask(tileName, selFnDir, footprintLabel)
-        areaMapSqDeg=areaMapSqDeg*intersectMask        
-        RMSMap=RMSMap*intersectMask
-
-    RMSValues=np.unique(RMSMap[np.nonzero(RMSMap)])
-    totalAreaDeg2=areaMapSqDeg.sum()
-    tileArea=np.zeros(len(RMSValues))
-    for i in range(len(RMSValues)):
-        tileArea[i]=areaMapSqDeg[np.equal(RMSMap, RMSValues[i])].sum()
+        areaValidMask=intersectMask != 0
+        validMask=np.logical_and(validMask, areaValidMask)
+        totalAreaDeg2=(pixAreaDeg2[np.nonzero(areaValidMask)[0]]*areaMap[areaValidMask]).sum()
+    else:
+        totalAreaDeg2=(areaMap.sum(axis = 1)*pixAreaDeg2).sum()
+
+    # Single pass histogram of area by RMS value
+    areaWeights=pixAreaDeg2[np.nonzero(validMask)[0]]*areaMap[validMask]
+    RMSValues, inverse=np.unique(RMSMap[validMask], return_inverse = True)
+    tileArea=np.bincount(inverse.ravel(), weights = areaWeights, minlength = len(RMSValues))
     RMSTab=atpy.Table()
     RMSTab.add_column(atpy.Column(tileArea, 'areaDeg2'))
     RMSTab.add_column(atpy.Column(RMSValues, 'y0RMS'))
     # Checks - these should be impossible but we have seen (e.g., when messed up masks)
     tol=0.003
-    if abs(RMSTab['areaDeg2'].sum()-areaMapSqDeg.sum()) > tol:
+    if abs(RMSTab['areaDeg2'].sum()-totalAreaDeg2) > tol:
         raise Exception("Mismatch between area map and area in RMSTab for tile '%s'" % (tileName))
     if np.less(RMSTab['areaDeg2'], 0).sum() > 0:
         raise Exception("Negative area in tile '%s' - check your survey mask (and delete/remake tileDir files if necessary)." % (tileName))
@@ -1004,6 +1230,23 @@ def getRMSTab(tileName, photFilterLabel, selFnDir, footprintLabel = None):
 
     return RMSTab
 
+#------------------------------------------------------------------------------------------------------------
+@functools.lru_cache(maxsize = 8)
+def _loadGlobalRMSTab(RMSTabFileName, mtime):
+    """Reads a global RMS table (as written by tidyUp), grouped by tileName, so that getRMSTab can pull out
+    the rows for each tile without re-reading the file. mtime is only used as part of the cache key.
+    
+    Returns grouped table, dictionary of slices into the grouped table indexed by tileName
+    
+    """
+    
+    tab=atpy.Table().read(RMSTabFileName).group_by('tileName')
+    tileSlicesDict={}
+    for key, i0, i1 in zip(tab.groups.keys, tab.groups.indices[:-1], tab.groups.indices[1:]):
+        tileSlicesDict[key['tileName']]=slice(i0, i1)
+    
+    return tab, tileSlicesDict
+
 #------------------------------------------------------------------------------------------------------------
 def downsampleRMSTab(RMSTab, stepSize = 0.001*1e-4):
     """Downsamples `RMSTab` (see :meth:`getRMSTab`) in terms of noise resolution, binning by `stepSize`.
@@ -1018,17 +1261,18 @@ def downsampleRMSTab(RMSTab, stepSize = 0.001*1e-4):
     """
     
     binEdges=np.arange(RMSTab['y0RMS'].min(), RMSTab['y0RMS'].max()+stepSize, stepSize)
-    y0Binned=[]
-    tileAreaBinned=[]
-    binMins=[]
-    binMaxs=[]
-    for i in range(len(binEdges)-1):
-        mask=np.logical_and(RMSTab['y0RMS'] >= binEdges[i], RMSTab['y0RMS'] < binEdges[i+1])
-        if mask.sum() > 0:
-            y0Binned.append(np.average(RMSTab['y0RMS'][mask], weights = RMSTab['areaDeg2'][mask]))
-            tileAreaBinned.append(np.sum(RMSTab['areaDeg2'][mask]))
-            binMins.append(binEdges[i])
-            binMaxs.append(binEdges[i+1])
+    numBins=len(binEdges)-1
+    y0RMS=np.asarray(RMSTab['y0RMS'])
+    areaDeg2=np.asarray(RMSTab['areaDeg2'])
+    binIndices=np.digitize(y0RMS, binEdges)-1
+    valid=np.logical_and(binIndices >= 0, binIndices < numBins)
+    binIndices=binIndices[valid]
+    counts=np.bincount(binIndices, minlength = numBins)
+    tileAreaBinned=np.bincount(binIndices, weights = areaDeg2[valid], minlength = numBins)
+    y0AreaBinned=np.bincount(binIndices, weights = (y0RMS*areaDeg2)[valid], minlength = numBins)
+    nonEmpty=counts > 0
+    y0Binned=y0AreaBinned[nonEmpty]/tileAreaBinned[nonEmpty]
+    tileAreaBinned=tileAreaBinned[nonEmpty]
     newRMSTab=atpy.Table()
     newRMSTab.add_column(atpy.Column(y0Binned, 'y0RMS'))
     newRMSTab.add_column(atpy.Column(tileAreaBinned, 'areaDeg2'))
@@ -1112,7 +1356,9 @@ def completenessByFootprint(config):
 
         massLimit_90Complete=calcMassLimit(0.9, selFn.compMz, selFn.mockSurvey, zBinEdges = zBinEdges)
         outFileName=config.diagnosticsDir+os.path.sep+"MzCompleteness_%s_%s.npz" % (selFn.method, footprintLabel)
-        np.savez(outFileName, z = selFn.mockSurvey.z, log10M = selFn.mockSurvey.log10M, completeness = selFn.compMz)
+        # Completeness is a probability, so float32 is plenty for this diagnostic output
+        np.savez_compressed(outFileName, z = selFn.mockSurvey.z, log10M = selFn.mockSurvey.log10M,
+                            completeness = selFn.compMz.astype(np.float32))
         makeMzCompletenessPlot(selFn.compMz, selFn.mockSurvey.log10M, selFn.mockSurvey.z, footprintLabel, massLabel,
                                config.diagnosticsDir+os.path.sep+"MzCompleteness_%s_%s.pdf" % (selFn.method, footprintLabel))
 
@@ -1143,6 +1389,9 @@ def calcCompletenessContour(compMz, log10M, z, level = 0.90):
         mass values).
     
     """
+
+    import pylab as plt
+
     # Easiest way to get at contour for plotting later
     # The smoothing may only be necessary if compMz is made by montecarlo method
     contours=plt.contour(z, log10M, compMz.transpose(), levels = [level])
@@ -1188,6 +1437,9 @@ def makeMzCompletenessPlot(compMz, log10M, z, title, massLabel, outFileName):
         None
         
     """
+
+    import pylab as plt
+    import colorcet
     
     cont_z, cont_log10M=calcCompletenessContour(compMz, log10M, z, level = 0.90)
     
@@ -1197,30 +1449,29 @@ def makeMzCompletenessPlot(compMz, log10M, z, title, massLabel, outFileName):
 
     plt.imshow((compMz*100).transpose(), cmap = colorcet.m_rainbow, origin = 'lower', aspect = 'auto')
     
-    y_tck=interpolate.splrep(log10M, np.arange(log10M.shape[0]))
+    # Grids are regularly spaced, so mapping values to pixel coords is linear
     plot_log10M=np.linspace(13.8, 15.4, 9)
-    coords_log10M=interpolate.splev(plot_log10M, y_tck)
+    coords_log10M=_interpExtrapolate(plot_log10M, log10M, np.arange(log10M.shape[0]))
     labels_log10M=[]
     for lm in plot_log10M:
         labels_log10M.append("%.2f" % (lm))
-    plt.yticks(interpolate.splev(plot_log10M, y_tck), labels_log10M)
+    plt.yticks(coords_log10M, labels_log10M)
     plt.ylim(coords_log10M.min(), coords_log10M.max())
     if massLabel[0] == "M":
         massLabel=massLabel[1:]
     plt.ylabel("log$_{10}$ ($M_{\\rm %s} / M_{\odot}$)" % (massLabel))
     
-    x_tck=interpolate.splrep(z, np.arange(z.shape[0]))
     plot_z=np.linspace(0.0, 2.0, 11)
-    coords_z=interpolate.splev(plot_z, x_tck)
+    coords_z=_interpExtrapolate(plot_z, z, np.arange(z.shape[0]))
     labels_z=[]
     for lz in plot_z:
         labels_z.append("%.1f" % (lz))
-    plt.xticks(interpolate.splev(plot_z, x_tck), labels_z)
+    plt.xticks(coords_z, labels_z)
     plt.xlim(coords_z.min(), coords_z.max())
     plt.xlabel("$z$")
     
-    coords_cont_z=interpolate.splev(cont_z, x_tck)
-    coords_cont_log10M=interpolate.splev(cont_log10M, y_tck)
+    coords_cont_z=_interpExtrapolate(np.asarray(cont_z), z, np.arange(z.shape[0]))
+    coords_cont_log10M=_interpExtrapolate(np.asarray(cont_log10M), log10M, np.arange(log10M.shape[0]))
     plt.plot(coords_cont_z, coords_cont_log10M, 'k:', lw = 3)
     
     plt.colorbar(pad = 0.03)
@@ -1253,16 +1504,47 @@ def calcMassLimit(completenessFraction, compMz, mockSurvey, zBinEdges = []):
     
     """
     
-    massLimit=np.power(10, mockSurvey.log10M[np.argmin(abs(compMz-completenessFraction), axis = 1)])/1e14
-    
-    if zBinEdges != []:
-        binnedMassLimit=np.zeros(len(zBinEdges)-1)
-        for i in range(len(zBinEdges)-1):
-            binnedMassLimit[i]=np.average(massLimit[np.logical_and(mockSurvey.z > zBinEdges[i], mockSurvey.z <= zBinEdges[i+1])])
+    massLimit=np.power(10, _findMassLimitLog10M(compMz, mockSurvey.log10M, completenessFraction))/1e14
+    
+    if len(zBinEdges) > 0:
+        # Average within bins zBinEdges[i] < z <= zBinEdges[i+1] (empty bins are NaN)
+        numBins=len(zBinEdges)-1
+        binIndices=np.digitize(mockSurvey.z, zBinEdges, right = True)-1
+        valid=np.logical_and(binIndices >= 0, binIndices < numBins)
+        counts=np.bincount(binIndices[valid], minlength = numBins)
+        sums=np.bincount(binIndices[valid], weights = massLimit[valid], minlength = numBins)
+        binnedMassLimit=np.full(numBins, np.nan)
+        binnedMassLimit[counts > 0]=sums[counts > 0]/counts[counts > 0]
         massLimit=binnedMassLimit
     
     return massLimit
     
+#------------------------------------------------------------------------------------------------------------
+def _findMassLimitLog10M(compGrid, log10M, completenessFraction):
+    """For each row of `compGrid` (completeness as a function of log10M, e.g., at each z), returns the
+    log10M value at which the completeness first reaches `completenessFraction`, interpolating linearly
+    between the grid points either side. Rows that never reach `completenessFraction` fall back to the
+    log10M value with the closest completeness.
+    
+    """
+    
+    # Completeness need not be monotonic in mass (e.g., if maxTheta500Arcmin is set), so we look for the
+    # first crossing rather than using a binary search
+    aboveMask=compGrid >= completenessFraction
+    reached=aboveMask.any(axis = 1)
+    idx=np.argmax(aboveMask, axis = 1)
+    closestIdx=np.argmin(abs(compGrid-completenessFraction), axis = 1)
+    rows=np.arange(compGrid.shape[0])
+    lowIdx=np.maximum(idx-1, 0)
+    c0=compGrid[rows, lowIdx]
+    c1=compGrid[rows, idx]
+    with np.errstate(divide = 'ignore', invalid = 'ignore'):
+        frac=np.where(c1 > c0, (completenessFraction-c0)/(c1-c0), 1.0)
+    limitLog10M=log10M[lowIdx]+np.clip(frac, 0, 1)*(log10M[idx]-log10M[lowIdx])
+    limitLog10M[reached == False]=log10M[closestIdx[reached == False]]
+    
+    return limitLog10M
+
 #------------------------------------------------------------------------------------------------------------
 def calcCompleteness(RMSTab, SNRCut, tileName, mockSurvey, massOptions, QFit, plotFileName = None, z = None,
                      method = "fast", numDraws = 2000000, numIterations = 100, verbose = False):
@@ -1306,8 +1588,6 @@ def calcCompleteness(RMSTab, SNRCut, tileName, mockSurvey, massOptions, QFit, pl
     else:
         zRange=mockSurvey.z
 
-    trueMassCol="true_M%d%s" % (mockSurvey.delta, mockSurvey.rhoType[0])
-
     if verbose == True:
         print("... calcuating completeness in tile %s using '%s' method" % (tileName, method))
 
@@ -1325,13 +1605,29 @@ def calcCompleteness(RMSTab, SNRCut, tileName, mockSurvey, massOptions, QFit, pl
             binEdges_z=(zRange-halfBinWidth).tolist()+[np.max(zRange)+halfBinWidth]
             allMz=np.zeros([mockSurvey.clusterCount.shape[1], mockSurvey.clusterCount.shape[0]])
             detMz=np.zeros([mockSurvey.clusterCount.shape[1], mockSurvey.clusterCount.shape[0]])
-            for i in range(numIterations):
-                tab=mockSurvey.drawSample(y0Noise, massOptions, QFit, tileName = tileName,
-                                          SNRLimit = SNRCut, applySNRCut = False, z = z, numDraws = numDraws,
-                                          applyRelativisticCorrection = massOptions['relativisticCorrection'])
-                allMz=allMz+np.histogram2d(np.log10(tab[trueMassCol]*1e14), tab['redshift'], [binEdges_log10M, binEdges_z])[0]
-                detMask=np.greater(tab['fixed_y_c']*1e-4, y0Noise*SNRCut)
-                detMz=detMz+np.histogram2d(np.log10(tab[trueMassCol][detMask]*1e14), tab['redshift'][detMask], [binEdges_log10M, binEdges_z])[0]
+            # Bins are uniform, so fast_histogram (if installed) can compute bin indices directly
+            if _fastHistogram2d is not None:
+                histRange=[[binEdges_log10M[0], binEdges_log10M[-1]], [binEdges_z[0], binEdges_z[-1]]]
+                histBins=[len(binEdges_log10M)-1, len(binEdges_z)-1]
+                histogram2d=lambda x, y: _fastHistogram2d(x, y, range = histRange, bins = histBins)
+            else:
+                histogram2d=lambda x, y: np.histogram2d(x, y, [binEdges_log10M, binEdges_z])[0]
+            # Iterations only ever get summed, so draw several at once (capped to limit memory use)
+            if numDraws is not None:
+                iterationsPerBatch=int(max(1, min(numIterations, 10000000 // numDraws)))
+            else:
+                iterationsPerBatch=1
+            for i in range(0, numIterations, iterationsPerBatch):
+                batchSize=min(iterationsPerBatch, numIterations-i)
+                # Plain arrays - no need to build (and then unpack) a catalog on every iteration
+                sample=mockSurvey._drawSampleArrays(y0Noise, massOptions, QFit, tileName = tileName, z = z,
+                                                    numDraws = numDraws*batchSize if numDraws is not None else None,
+                                                    applyRelativisticCorrection = massOptions['relativisticCorrection'])
+                log10Ms=sample['log10M']
+                redshifts=sample['z']
+                allMz=allMz+histogram2d(log10Ms, redshifts)
+                detMask=np.greater(sample['measured_y0'], y0Noise*SNRCut)
+                detMz=detMz+histogram2d(log10Ms[detMask], redshifts[detMask])
             mask=np.not_equal(allMz, 0)
             compMz=np.ones(detMz.shape)
             compMz[mask]=detMz[mask]/allMz[mask]
@@ -1347,43 +1643,33 @@ def calcCompleteness(RMSTab, SNRCut, tileName, mockSurvey, massOptions, QFit, pl
         # NOTE: removed recMassBias and div parameters
         tenToA0, B0, Mpivot, sigma_int=[massOptions['tenToA0'], massOptions['B0'],
                                         massOptions['Mpivot'], massOptions['sigma_int']]
-        y0Grid=np.zeros([zRange.shape[0], mockSurvey.clusterCount.shape[1]])
-        for i in range(len(zRange)):
-            zk=zRange[i]
-            k=np.argmin(abs(mockSurvey.z-zk))
-            # WARNING: the interpolates for theta500, fRel in MockSurvey work in terms of M500c
-            # mockSurvey.log10M is NOT necessarily M500c any more
-            if massOptions['delta'] == 500 and massOptions['rhoType'] == "critical":
-                log10M500cs=mockSurvey.log10M
-            else:
-                log10M500cs=np.log10(mockSurvey._transToM500c(mockSurvey.cosmoModel,
-                                                              np.power(10, mockSurvey.log10M),
-                                                              1/(1+zk)))
-
-            theta500s_zk=interpolate.splev(log10M500cs, mockSurvey.theta500Splines[k])
-            Qs_zk=QFit.getQ(theta500s_zk, z = zk, tileName = tileName)
-            true_y0s_zk=tenToA0*np.power(mockSurvey.Ez[k], 2)*np.power(np.power(10, mockSurvey.log10M)/Mpivot, 1+B0)*Qs_zk
-            if massOptions['relativisticCorrection'] == True:
-                fRels_zk=interpolate.splev(log10M500cs, mockSurvey.fRelSplines[k])
-                true_y0s_zk=true_y0s_zk*fRels_zk
-            y0Grid[i]=true_y0s_zk
-            
-        # For some cosmological parameters, we can still get the odd -ve y0
-        y0Grid[y0Grid <= 0] = 1e-9
+        # theta500, fRel on the (z, log10M) grid are cached in MockSurvey - these are computed using M500c
+        # (mockSurvey.log10M is NOT necessarily M500c any more)
+        zIndices=np.argmin(abs(mockSurvey.z[np.newaxis, :]-zRange[:, np.newaxis]), axis = 1)
+        theta500Grid=mockSurvey.theta500Grid[zIndices]
+        if QFit.zDependent == True:
+            QGrid=np.zeros(theta500Grid.shape)
+            for i in range(len(zRange)):
+                QGrid[i]=QFit.getQ(theta500Grid[i], z = zRange[i], tileName = tileName)
+        else:
+            QGrid=QFit.getQ(theta500Grid, tileName = tileName)
+        y0Grid=tenToA0*mockSurvey.Ez2[zIndices][:, np.newaxis]* \
+               np.power(np.power(10, mockSurvey.log10M)/Mpivot, 1+B0)[np.newaxis, :]*QGrid
+        if massOptions['relativisticCorrection'] == True:
+            y0Grid=y0Grid*mockSurvey.fRelGrid[zIndices]
+
+        # NOTE: For some cosmological parameters, we can still get the odd -ve y0 - these are given zero
+        # completeness below (log y0 = -inf), rather than being clipped to a small positive value
 
         # Calculate completeness using area-weighted average
         # NOTE: RMSTab that is fed in here can be downsampled in noise resolution for speed
         areaWeights=RMSTab['areaDeg2']/RMSTab['areaDeg2'].sum()
-        log_y0Lim=np.log(SNRCut*RMSTab['y0RMS'])
-        log_y0=np.log(y0Grid)
-        compMz=np.zeros(log_y0.shape)
-        for i in range(len(RMSTab)):
-            SNRGrid=y0Grid/RMSTab['y0RMS'][i]
-            SNRGrid=SNRGrid
-            log_y0Err=1/SNRGrid
-            log_y0Err[SNRGrid < SNRCut]=1/SNRCut
-            log_totalErr=np.sqrt(log_y0Err**2 + sigma_int**2)
-            compMz=compMz+stats.norm.sf(log_y0Lim[i], loc = log_y0, scale = log_totalErr)*areaWeights[i]
+        if numba is not None:
+            compMz=_completenessKernel(y0Grid, np.asarray(RMSTab['y0RMS'], dtype = np.float64),
+                                       np.asarray(areaWeights, dtype = np.float64), float(SNRCut),
+                                       float(sigma_int))
+        else:
+            compMz=_completenessNumpy(y0Grid, RMSTab['y0RMS'], areaWeights, SNRCut, sigma_int)
         
         #t1=time.time()
         
@@ -1418,6 +1704,79 @@ def calcCompleteness(RMSTab, SNRCut, tileName, mockSurvey, massOptions, QFit, pl
             
     return compMz
       
+#------------------------------------------------------------------------------------------------------------
+def _completenessKernel(y0Grid, y0RMS, areaWeights, SNRCut, sigma_int):
+    """Area-weighted sum over noise levels of the detection probability for objects with true signals
+    given in `y0Grid` (this is the inner loop of the 'fast' method in :meth:`calcCompleteness`). If Numba is
+    installed, this is compiled on first use, and the redshift rows are shared out over threads (each
+    thread only writes to its own rows, so there are no races).
+
+    Returns:
+        A 2d array of (z, log\ :sub:`10` mass) completeness.
+
+    """
+
+    compMz=np.zeros(y0Grid.shape)
+    sqrt2=math.sqrt(2.0)
+    for j in _prange(y0Grid.shape[0]):
+        for i in range(y0RMS.shape[0]):
+            log_y0Lim=math.log(SNRCut*y0RMS[i])
+            for k in range(y0Grid.shape[1]):
+                if y0Grid[j, k] <= 0:
+                    continue
+                log_y0Err=min(y0RMS[i]/y0Grid[j, k], 1/SNRCut)
+                log_totalErr=math.sqrt(log_y0Err**2 + sigma_int**2)
+                x=(log_y0Lim-math.log(y0Grid[j, k]))/log_totalErr
+                compMz[j, k]=compMz[j, k]+0.5*math.erfc(x/sqrt2)*areaWeights[i]
+
+    return compMz
+
+if numba is not None:
+    _completenessKernel=numba.njit(cache = True, parallel = True)(_completenessKernel)
+
+#------------------------------------------------------------------------------------------------------------
+def _completenessNumpy(y0Grid, y0RMS, areaWeights, SNRCut, sigma_int):
+    """Numpy equivalent of :meth:`_completenessKernel`, used by :meth:`calcCompleteness` if Numba is not
+    installed.
+
+    Returns:
+        A 2d array of (z, log\ :sub:`10` mass) completeness.
+
+    """
+
+    # Broadcast over (noise level, z, log10M), working in blocks of noise levels to limit memory use
+    # Single precision is ample here (errors ~1e-7 in completeness) and halves the memory traffic;
+    # the area-weighted sum is still accumulated in double precision
+    y0RMS=np.asarray(y0RMS, dtype = np.float32)
+    areaWeights=np.asarray(areaWeights, dtype = np.float32)
+    y0Grid=np.asarray(y0Grid, dtype = np.float32)
+    log_y0=np.full(y0Grid.shape, -np.inf, dtype = np.float32)
+    np.log(y0Grid, out = log_y0, where = y0Grid > 0)
+    compMz=np.zeros(log_y0.shape)
+    # Blocks of ~2^18 float32 values (1 MB per buffer) so that the working set stays in cache
+    blockSize=max(1, int(2**18/y0Grid.size))
+    # Two reusable 3d buffers, updated in place, rather than a fresh temporary for every operation
+    blockShape=(min(blockSize, len(y0RMS)),)+y0Grid.shape
+    totalErrBuffer=np.empty(blockShape, dtype = np.float32)
+    xBuffer=np.empty(blockShape, dtype = np.float32)
+    for start in range(0, len(y0RMS), blockSize):
+        RMSs=y0RMS[start:start+blockSize, np.newaxis, np.newaxis]
+        log_totalErr=totalErrBuffer[:len(RMSs)]
+        x=xBuffer[:len(RMSs)]
+        with np.errstate(divide = 'ignore'):
+            # Where y0 = 0 this is inf, but is capped at 1/SNRCut below
+            np.divide(RMSs, y0Grid, out = log_totalErr)
+        np.minimum(log_totalErr, 1/SNRCut, out = log_totalErr)
+        np.square(log_totalErr, out = log_totalErr)
+        log_totalErr+=sigma_int**2
+        np.sqrt(log_totalErr, out = log_totalErr)
+        np.subtract(log_y0, np.log(SNRCut*RMSs), out = x)
+        np.divide(x, log_totalErr, out = x)
+        special.ndtr(x, out = x)
+        compMz+=np.tensordot(areaWeights[start:start+blockSize], x, axes = 1)
+
+    return compMz
+
 #------------------------------------------------------------------------------------------------------------
 def makeMassLimitMapsAndPlots(config):
     """Makes maps of mass completeness and associated plots. Output is written to the the `diagnosticsDir`
@@ -1432,6 +1791,10 @@ def makeMassLimitMapsAndPlots(config):
     
     """
 
+    import pylab as plt
+    import colorcet
+    from astLib import astPlots
+
     selFn=SelFn(config.selFnDir, config.parDict['selFnOptions']['fixedSNRCut'],
                 footprint = None, zStep = 0.1, setUpAreaMask = True,
                 enableDrawSample = False, downsampleRMS = False,
@@ -1473,20 +1836,23 @@ def makeMassLimitMapsAndPlots(config):
             print("... already made mass limit map %s" % (outFileName))
             massLimMap, wcs=maps.chunkLoadMask(outFileName, dtype = np.float32)
         else:
-            massLimMap=np.zeros(d.shape)
-            count=0
             t0=time.time()
-            for i in range(len(binEdges)-1):
-                binMin=binEdges[i]
-                binMax=binEdges[i+1]
-                mask=np.logical_and(d > binMin, d <= binMax)
-                print("... %d/%d" % (i+1, len(binCentres)))
-                # No intrinsic scatter
-                #sfi=stats.norm.sf(selFn.SNRCut*binCentres[i], loc = y0Grid, scale = binCentres[i])
-                # With intrinsic scatter [see fast method in selFn.update]
-                totalLogErr=np.sqrt((binCentres[i]/y0Grid)**2 + selFn.scalingRelationDict['sigma_int']**2)
-                sfi=stats.norm.sf(selFn.SNRCut*binCentres[i], loc = y0Grid, scale = totalLogErr*y0Grid)
-                massLimMap[mask]=selFn.mockSurvey.log10M[np.argmin(abs(sfi[zIndex]-0.9))]
+            # Only the row of the signal grid at the requested z is needed - we evaluate this for all
+            # noise bins at once, and then fill in the map in a single pass over the bin indices
+            RMSs=binCentres[:, np.newaxis]
+            y0s=y0Grid[zIndex][np.newaxis, :]
+            # No intrinsic scatter
+            #sfi=stats.norm.sf(selFn.SNRCut*RMSs, loc = y0s, scale = RMSs)
+            # With intrinsic scatter [see fast method in selFn.update]
+            totalLogErr=np.sqrt((RMSs/y0s)**2 + selFn.scalingRelationDict['sigma_int']**2)
+            sfi=stats.norm.sf(selFn.SNRCut*RMSs, loc = y0s, scale = totalLogErr*y0s)
+            binLimits=_findMassLimitLog10M(sfi, selFn.mockSurvey.log10M, completenessFraction)
+            # Bins are binEdges[i] < d <= binEdges[i+1]; pixels outside all bins are left as zero
+            binIndices=np.digitize(d, binEdges, right = True)-1
+            validMask=np.logical_and(binIndices >= 0, binIndices < len(binCentres))
+            massLimMap=np.zeros(d.shape)
+            massLimMap[validMask]=binLimits[binIndices[validMask]]
+            del binIndices, validMask
             t1=time.time()
             mask=np.not_equal(massLimMap, 0)
             massLimMap[mask]=np.power(10, massLimMap[mask])/1e14
@@ -1527,12 +1893,11 @@ def makeMassLimitMapsAndPlots(config):
         limits=limits[limits > 0]
         binEdges=np.linspace(limits.min(), limits.max(), 50)
         binCentres=(binEdges[1:]+binEdges[:-1])/2
-        areas=[]
-        for i in range(len(binEdges)-1):
-            binMin=binEdges[i]
-            binMax=binEdges[i+1]
-            mask=np.logical_and(massLimMap > binMin, massLimMap <= binMax)
-            areas.append(pixAreaMap[mask].sum())
+        # Bins are binEdges[i] < MLim <= binEdges[i+1] - sum the pixel areas in each with a single pass
+        binIndices=np.digitize(np.ma.filled(massLimMap, 0), binEdges, right = True)-1
+        validMask=np.logical_and(binIndices >= 0, binIndices < len(binCentres))
+        areas=np.bincount(binIndices[validMask], weights = pixAreaMap[validMask], minlength = len(binCentres))
+        del binIndices, validMask
         tab=atpy.Table()
         tab['MLim']=binCentres
         tab['areaDeg2']=areas
@@ -1551,24 +1916,18 @@ def makeMassLimitMapsAndPlots(config):
         labelStr="total survey area = %.0f deg$^2$" % (np.cumsum(tab['areaDeg2']).max())
         plt.ylim(0.0, 1.2*np.cumsum(tab['areaDeg2']).max())
         plt.xlim(tab['MLim'].min(), tab['MLim'].max())
-        plt.figtext(0.2, 0.9, labelStr, ha="left", va="center")
+        labelText=plt.figtext(0.2, 0.9, labelStr, ha="left", va="center")
         plt.savefig(config.diagnosticsDir+os.path.sep+"cumulativeArea_massLimit_z%.2f_comp%.2f.pdf" % (z, completenessFraction))
         plt.savefig(config.diagnosticsDir+os.path.sep+"cumulativeArea_massLimit_z%.2f_comp%.2f.png" % (z, completenessFraction))
-        plt.close()
 
         # Deepest 20% cumulative area plot - we show a bit beyond this
+        # Same curve as above, so we re-use the figure and only change the limits and label
         totalAreaDeg2=tab['areaDeg2'].sum()
         deepTab=tab[np.where(np.cumsum(tab['areaDeg2']) < 0.25 * totalAreaDeg2)]
-        plt.figure(figsize=(9,6.5))
-        ax=plt.axes([0.155, 0.12, 0.82, 0.86])
-        plt.minorticks_on()
-        plt.plot(tab['MLim'], np.cumsum(tab['areaDeg2']), 'k-')
-        plt.ylabel("survey area < $M_{\\rm %d%s}$ limit (deg$^2$)" % (selFn.mockSurvey.delta, selFn.mockSurvey.rhoType[0]))
-        plt.xlabel("$M_{\\rm %d%s}$ (10$^{14}$ M$_{\odot}$) [%d%% complete]" % (selFn.mockSurvey.delta, selFn.mockSurvey.rhoType[0], int(100*completenessFraction)))
         labelStr="area of deepest 20%% = %.0f deg$^2$" % (0.2 * totalAreaDeg2)
         plt.ylim(0.0, 1.2*np.cumsum(deepTab['areaDeg2']).max())
         plt.xlim(deepTab['MLim'].min(), deepTab['MLim'].max())
-        plt.figtext(0.2, 0.9, labelStr, ha="left", va="center")
+        labelText.set_text(labelStr)
         plt.savefig(config.diagnosticsDir+os.path.sep+"cumulativeArea_massLimit_z%.2f_comp%.2f_deepest20percent.pdf" % (z, completenessFraction))
         plt.savefig(config.diagnosticsDir+os.path.sep+"cumulativeArea_massLimit_z%.2f_comp%.2f_deepest20percent.png" % (z, completenessFraction))
         plt.close()
@@ -1589,15 +1948,20 @@ def makeMassLimitVRedshiftPlot(massLimit_90Complete, zRange, outFileName, title
         None
     
     """
+
+    import pylab as plt
     
     plotSettings.update_rcParams()
     plt.figure(figsize=(9,6.5))
     ax=plt.axes([0.10, 0.11, 0.87, 0.86])
     if title is not None:
         plt.figtext(0.15, 0.2, title, ha="left", va="center")
-    tck=interpolate.splrep(zRange, massLimit_90Complete)
+    # Not-a-knot cubic interpolating spline (same curve as splrep with s = 0), skipping any empty z bins
+    validMask=np.isfinite(massLimit_90Complete)
+    massLimitSpline=interpolate.make_interp_spline(np.asarray(zRange)[validMask],
+                                                   np.asarray(massLimit_90Complete)[validMask], k = 3)
     plotRange=np.linspace(0, 2, 100)
-    plt.plot(plotRange, interpolate.splev(plotRange, tck), 'k-')
+    plt.plot(plotRange, massLimitSpline(plotRange), 'k-')
     plt.plot(zRange, massLimit_90Complete, 'D', ms = 8)
     plt.xlabel("$z$")
     plt.ylim(0.5, 8)
@@ -1627,6 +1991,10 @@ def makeFullSurveyMassLimitMapPlot(z, config):
         None
     
     """
+
+    import pylab as plt
+    import colorcet
+    from astLib import astPlots
     
     if 'makeQuickLookMaps' not in config.parDict.keys():
         config.quicklookScale=0.25
@@ -1667,6 +2035,22 @@ def makeFullSurveyMassLimitMapPlot(z, config):
             plt.savefig(outFileName.replace(".fits", ".png"), dpi = 300)
             plt.close()
 
+#------------------------------------------------------------------------------------------------------------
+def _makeTileCompImageHDU(fileName, tileName, dtype, compressionType):
+    """Reads the first image extension containing data from the given per-tile file, and returns it as a
+    compressed image HDU named after the tile (used by :meth:`tidyUp` to assemble MEFs).
+    
+    """
+    
+    with pyfits.open(fileName) as img:
+        for extName in img:
+            if img[extName].data is not None:
+                break
+        hdu=pyfits.CompImageHDU(np.array(img[extName].data, dtype = dtype), img[extName].header, 
+                                name = tileName, compression_type = compressionType)
+
+    return hdu
+
 #------------------------------------------------------------------------------------------------------------
 def tidyUp(config):
     """Tidies up the `selFn` directory, constructing multi-extension FITS files from individual tile images
@@ -1699,17 +2083,22 @@ def tidyUp(config):
         outFileName=config.selFnDir+os.path.sep+MEFBaseName+".fits"
         newImg=pyfits.HDUList()
         filesToRemove=[]
+        tileNames=[]
         for tileName in config.allTileNames:
             fileName=config.selFnDir+os.path.sep+tileName+os.path.sep+MEFBaseName+"#"+tileName+".fits"
             if os.path.exists(fileName):
-                with pyfits.open(fileName) as img:
-                    for extName in img:
-                        if img[extName].data is not None:
-                            break
-                    hdu=pyfits.CompImageHDU(np.array(img[extName].data, dtype = dtype), img[extName].header, 
-                                            name = tileName, compression_type = compressionType)
                 filesToRemove.append(fileName)
-                newImg.append(hdu)
+                tileNames.append(tileName)
+        # Tiles are independent (and FITS I/O, decompression release the GIL), so can be read over threads
+        # (see numThreads); results come back in tile order
+        loadHDU=lambda args: _makeTileCompImageHDU(args[0], args[1], dtype, compressionType)
+        if len(filesToRemove) > 1 and config.parDict['numThreads'] > 1:
+            with ThreadPoolExecutor(max_workers = config.parDict['numThreads']) as pool:
+                hdus=list(pool.map(loadHDU, zip(filesToRemove, tileNames)))
+        else:
+            hdus=list(map(loadHDU, zip(filesToRemove, tileNames)))
+        for hdu in hdus:
+            newImg.append(hdu)
         if len(newImg) > 0:
             newImg.writeto(outFileName, overwrite = True)
             for f in filesToRemove:
@@ -1724,8 +2113,7 @@ def tidyUp(config):
 
     # Clean out any per-tile directories
     for tileName in config.allTileNames:
-        if os.path.exists(config.selFnDir+os.path.sep+tileName) == True:
-            shutil.rmtree(config.selFnDir+os.path.sep+tileName)
+        shutil.rmtree(config.selFnDir+os.path.sep+tileName, ignore_errors = True)
 
 
     
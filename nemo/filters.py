@@ -33,6 +33,7 @@ import pylab as plt
 import os
 from scipy import interpolate
 from scipy import ndimage
+from scipy import signal
 import astropy.io.fits as pyfits
 import astropy.stats as apyStats
 import copy
@@ -273,8 +274,7 @@ class MapFilter(object):
         tab=atpy.Table().read(nemo.__path__[0]+os.path.sep+"data"+os.path.sep+"planck_lensedCls.dat", format = 'ascii')
         tab['TT']=(tab['TT']*2*np.pi)/(tab['L']*(tab['L']+1))
         lmap=enmap.modlmap(self.unfilteredMapsDictList[0]['data'].shape, self.enwcs)
-        l2p=interpolate.interp1d(tab['L'], tab['TT'], bounds_error=False, fill_value=0.0)
-        fgPower=l2p(lmap)*lmap.shape[0]*lmap.shape[1]
+        fgPower=np.interp(lmap, tab['L'], tab['TT'], left = 0.0, right = 0.0)*lmap.shape[0]*lmap.shape[1]
 
         return fgPower
 
@@ -395,9 +395,14 @@ class MapFilter(object):
                         chunkMean=np.mean(chunkValues[goodAreaMask])
                         chunkRMS=np.std(chunkValues[goodAreaMask])
                         sigmaClip=3.0
+                        lastMask=None
                         for c in range(10):
                             mask=np.less(abs(chunkValues), abs(chunkMean+sigmaClip*chunkRMS))
                             mask=np.logical_and(goodAreaMask, mask)
+                            # Once the clipped set stops changing, further iterations change nothing
+                            if lastMask is not None and np.array_equal(mask, lastMask):
+                                break
+                            lastMask=mask
                             if mask.sum() > 0:
                                 chunkMean=np.mean(chunkValues[mask])
                                 chunkRMS=np.std(chunkValues[mask])
@@ -470,8 +475,13 @@ class MapFilter(object):
                                 chunkMean=np.mean(binValues)
                                 chunkRMS=np.std(binValues)
                                 sigmaClip=3.0
+                                lastMask=None
                                 for c in range(10):
                                     mask=np.less(abs(binValues), abs(chunkMean+sigmaClip*chunkRMS))
+                                    # Once the clipped set stops changing, further iterations change nothing
+                                    if lastMask is not None and np.array_equal(mask, lastMask):
+                                        break
+                                    lastMask=mask
                                     if mask.sum() > 0:
                                         chunkMean=np.mean(binValues[mask])
                                         chunkRMS=np.std(binValues[mask])
@@ -768,7 +778,7 @@ class MatchedFilter(MapFilter):
             img=pyfits.PrimaryHDU()
             img.header['SIGNORM']=self.signalNorm
             count=0
-            for key in list(self.fRelWeights.keys()):
+            for key in self.fRelWeights.keys():
                 count=count+1
                 img.header['RW%d_GHZ' % (count)]=key
                 img.header['RW%d' % (count)]=self.fRelWeights[key]
@@ -954,18 +964,17 @@ class RealSpaceMatchedFilter(MapFilter):
             rRadians=np.radians(arcminRange/60.)
             profile2d=[]
             for i in range(prof.shape[0]):
-                r2p=interpolate.interp1d(rRadians[mask], prof[i, mask], bounds_error=False, fill_value=0.0)
-                profile2d.append(r2p(matchedFilter.radiansMap))
+                profile2d.append(np.interp(matchedFilter.radiansMap, rRadians[mask], prof[i, mask],
+                                           left = 0.0, right = 0.0))
             profile2d=np.array(profile2d)
         else:
             profile2d=fft.ifft2(matchedFilter.filt).real
             profile2d=fft.fftshift(profile2d)
 
         # z is not needed here - just because we switched to multi-freq throughout
-        z, y, x=np.where(abs(profile2d) == abs(profile2d).max())
+        # (first occurrence of the peak, in a single pass)
+        z, y, x=np.unravel_index(np.argmax(abs(profile2d)), profile2d.shape)
         #y, x=np.where(profile2d[0] == profile2d[0].max())
-        y=y[0]
-        x=x[0]
         yMin=y-rIndex
         yMax=y+rIndex
         xMin=x-rIndex
@@ -1033,7 +1042,7 @@ class RealSpaceMatchedFilter(MapFilter):
         kernWCS.header['APP_RA']=self.applyRACentre
         kernWCS.header['APP_DEC']=self.applyDecCentre
         count=0
-        for key in list(self.fRelWeights.keys()):
+        for key in self.fRelWeights.keys():
             count=count+1
             kernWCS.header['RW%d_GHZ' % (count)]=key
             kernWCS.header['RW%d' % (count)]=self.fRelWeights[key]
@@ -1197,8 +1206,14 @@ class RealSpaceMatchedFilter(MapFilter):
             filteredMap=filteredMap+mapDataToFilter
 
         # Apply the kernel
+        # FFT convolution of the map padded by reflection, matching the edge behaviour of ndimage.convolve
         for i in range(filteredMap.shape[0]):
-            filteredMap[i]=ndimage.convolve(filteredMap[i], self.kern2d[i])
+            kernShape=self.kern2d[i].shape
+            padY=(kernShape[0]-1)//2
+            padX=(kernShape[1]-1)//2
+            paddedMap=np.pad(filteredMap[i], ((padY, kernShape[0]-1-padY), (padX, kernShape[1]-1-padX)),
+                             mode = 'symmetric')
+            filteredMap[i]=signal.fftconvolve(paddedMap, self.kern2d[i], mode = 'valid')
 
         # For relativistic corrections (see signals module)
         if calcFRelWeights == True:
@@ -111,6 +111,56 @@ def integrated(b, params = _default_params):
     I2 = x_lo**(1-G)/(1-G) + x_hi**(1-B)/(1-B)
     return I1 + I2
 
+def integratedArray(bs, params = _default_params):
+    """Returns the line of sight integral of the GNFW profile at each of the impact parameters in `bs`.
+    This does the same calculation as :meth:`integrated`, but for all impact parameters at once (rather
+    than running the optimizer and summing for each impact parameter in turn).
+    
+    Args:
+        bs (:obj:`np.ndarray`): Impact parameters.
+        params (:obj:`dict`): Dictionary with keys `alpha`, `beta`, `gamma`, `c500`, and `P0` that defines
+            the GNFW profile shape.
+    
+    Returns:
+        Line of sight integrals at the given impact parameters (1d :obj:`np.ndarray`).
+        
+    """
+    bs = np.asarray(bs, dtype = float)
+    G, A, B = params['gamma'], params['alpha'], params['beta']
+    TH, N = params.get('tol',1e-6), params.get('npts', 200)
+    # The function ( x * y(r) ) has a single maximum around b or so - find it for all b together, in
+    # terms of u = ln x: first on a coarse grid, then refine by golden section search
+    b2D = bs[:, np.newaxis]
+    uGrid = np.linspace(np.log(1e-3*np.min(bs[bs > 0], initial = 1.0)), np.log(1e3*max(bs.max(), 1.0)), 400)
+    yGrid = xfunc(np.exp(uGrid)[np.newaxis, :]*np.ones(b2D.shape), b2D, params)
+    iMax = np.argmax(yGrid, axis = 1)
+    u_a = uGrid[np.maximum(iMax-1, 0)]
+    u_b = uGrid[np.minimum(iMax+1, len(uGrid)-1)]
+    invPhi = (5**.5-1)/2
+    for i in range(60):
+        u_c = u_b-invPhi*(u_b-u_a)
+        u_d = u_a+invPhi*(u_b-u_a)
+        leftMask = xfunc(np.exp(u_c), bs, params) > xfunc(np.exp(u_d), bs, params)
+        u_b = np.where(leftMask, u_d, u_b)
+        u_a = np.where(leftMask, u_a, u_c)
+    y_max = xfunc(np.exp((u_a+u_b)/2), bs, params)
+    # The wings of x * y(r) fall off exponentially (in log x).  This makes
+    # the truncation error easy to estimate (or even to include)
+    x_lo = (y_max * TH)**(1/(1-G))
+    x_hi = (y_max * TH)**(1/(1-B))
+    # Take log-spaced bins - same points as np.arange(u_lo, u_hi, du) for each b
+    u_lo, u_hi = np.log(x_lo), np.log(x_hi)
+    du = (u_hi-u_lo) / N
+    numBins = np.ceil((u_hi-u_lo)/du).astype(int)
+    j = np.arange(numBins.max())[np.newaxis, :]
+    x = np.exp(u_lo[:, np.newaxis] + j*du[:, np.newaxis])
+    # Sum
+    I1 = du*np.sum(xfunc(x, b2D*np.ones(x.shape), params)*np.less(j, numBins[:, np.newaxis]), axis = 1)
+    # Wing (under-)estimate
+    x_hi = np.exp(u_hi)
+    I2 = x_lo**(1-G)/(1-G) + x_hi**(1-B)/(1-B)
+    return I1 + I2
+
 # Test
 #if __name__ == '__main__':
     #from pylab import semilogy, show, plot, subplot
@@ -12,11 +12,13 @@ from scipy import optimize
 import astropy.io.fits as pyfits
 import astropy.table as atpy
 import astropy.stats as apyStats
+from astropy.coordinates import SkyCoord
 import mahotas
 import colorcet
 import numpy as np
 import pylab as plt
 import glob
+import fnmatch
 import os
 import sys
 import math
@@ -33,7 +35,7 @@ powspec = None
 import nemo
 try:
     import reproject
-except:
+except ImportError:
     pass
 from . import catalogs
 from . import signals
@@ -122,19 +124,18 @@ class MapDict(dict):
             raise Exception("Expected a path but got an array instead (image already loaded).")
         else:
             # On-the-fly tile clipping
-            with pyfits.open(pathToTileImages) as img:
-                for ext in img:
-                    if img[ext].data is not None:
-                        break
-                if returnWCS == True or self['reprojectToTan'] == True:
-                    wcs=astWCS.WCS(self.tileCoordsDict[tileName]['header'], mode = 'pyfits')
-                minX, maxX, minY, maxY=self.tileCoordsDict[tileName]['clippedSection']
-                if img[ext].data.ndim == 3:
-                    data=img[ext].data[0, minY:maxY, minX:maxX]
-                elif img[ext].data.ndim == 2:
-                    data=img[ext].data[minY:maxY, minX:maxX]
-                else:
-                    raise Exception("Map data has %d dimensions - only ndim = 2 or ndim = 3 are currently handled." % (img[ext].data.ndim))
+            if returnWCS == True or self['reprojectToTan'] == True:
+                wcs=astWCS.WCS(self.tileCoordsDict[tileName]['header'], mode = 'pyfits')
+            # Repeated runs on the same maps (source injection, sky sims) can keep tiles in memory
+            tileCache=self.get('tileCache')
+            cacheKey=(pathToTileImages, tileName)
+            if tileCache is not None and cacheKey in tileCache:
+                data=tileCache[cacheKey].copy()
+            else:
+                data=_clipTileFromMap(pathToTileImages, self.tileCoordsDict[tileName]['clippedSection'])
+                if tileCache is not None:
+                    tileCache[cacheKey]=data
+                    data=data.copy()
 
         # Convert any mask to 8-bit unsigned ints to save memory
         if mapKey in self._maskKeys:
@@ -225,7 +226,7 @@ class MapDict(dict):
                         % (self['obsFreqGHz']))
 
         # Load weight map if given
-        if 'weightsFileName' in list(self.keys()) and self['weightsFileName'] is not None:
+        if 'weightsFileName' in self.keys() and self['weightsFileName'] is not None:
             weights=self.loadTile('weightsFileName', tileName)
             # For Enki maps... take only I (temperature) for now, add options for this later
             if weights.ndim == 3:       # I, Q, U
@@ -240,7 +241,7 @@ class MapDict(dict):
         data[weights == 0]=0
 
         # Load survey and point source masks, if given
-        if 'surveyMask' in list(self.keys()) and self['surveyMask'] is not None:
+        if 'surveyMask' in self.keys() and self['surveyMask'] is not None:
             surveyMask=self.loadTile('surveyMask', tileName)
         else:
             surveyMask=np.ones(data.shape, dtype = np.uint8)
@@ -248,7 +249,7 @@ class MapDict(dict):
 
         # Some apodisation of the data outside the survey mask
         # NOTE: should add adjustable parameter for this somewhere later
-        if 'apodizeUsingSurveyMask' in list(self.keys()) and self['apodizeUsingSurveyMask'] == True:
+        if 'apodizeUsingSurveyMask' in self.keys() and self['apodizeUsingSurveyMask'] == True:
             # We need to remain unapodized to at least noiseGridArcmin beyond the edge of the survey mask
             # We'll need to make these adjustable parameters
             apodMask=np.array(surveyMask, dtype = bool)
@@ -258,7 +259,7 @@ class MapDict(dict):
             data=data*apodMask
             del apodMask
 
-        if 'pointSourceMask' in list(self.keys()) and self['pointSourceMask'] is not None:
+        if 'pointSourceMask' in self.keys() and self['pointSourceMask'] is not None:
             psMask=self.loadTile('pointSourceMask', tileName)
         else:
             psMask=np.ones(data.shape, dtype = np.uint8)
@@ -266,13 +267,13 @@ class MapDict(dict):
         # Use for tracking regions where subtraction/in-painting took place to make flags in catalog
         # We can also supply a flag mask at the start, e.g., for marking dusty regions without zapping them
         # NOTE: flag masks for each frequency map get combined within filter objects
-        if 'flagMask' in list(self.keys()) and self['flagMask'] is not None:
+        if 'flagMask' in self.keys() and self['flagMask'] is not None:
             flagMask=self.loadTile('flagMask', tileName)*surveyMask
         else:
             flagMask=np.zeros(data.shape, dtype = np.uint8)
 
         # Optional map clipping
-        if 'RADecSection' in list(self.keys()) and self['RADecSection'] is not None:
+        if 'RADecSection' in self.keys() and self['RADecSection'] is not None:
             RAMin, RAMax, decMin, decMax=self['RADecSection']
             clip=astImages.clipUsingRADecCoords(data, wcs, RAMin, RAMax, decMin, decMax)
             data=clip['data']
@@ -289,7 +290,7 @@ class MapDict(dict):
                 raise Exception("Clipping using RADecSection returned empty array - check RADecSection in config .yml file is in map")
 
         # For source-free simulations (contamination tests)
-        if 'CMBSimSeed' in list(self.keys()):
+        if 'CMBSimSeed' in self.keys():
             randMap=simCMBMap(data.shape, wcs, noiseLevel = 0, beam = self['beamFileName'],
                               seed = self['CMBSimSeed'])
             randMap[np.equal(weights, 0)]=0
@@ -320,7 +321,7 @@ class MapDict(dict):
             saveFITS(outFileName, data, wcs)
 
         # For position recovery tests, completeness calculations
-        if 'injectSources' in list(self.keys()):
+        if 'injectSources' in self.keys():
             # NOTE: Need to add varying GNFWParams here
             if 'GNFWParams' in self['injectSources'].keys():
                 GNFWParams=self['injectSources']['GNFWParams']
@@ -357,14 +358,14 @@ class MapDict(dict):
         holeFillingKeys=['maskPointSourcesFromCatalog', 'maskAndFillFromCatalog', 'extendedMask']
         holeFilling=False
         for h in holeFillingKeys:
-            if h in list(self.keys()):
+            if h in self.keys():
                 holeFilling=True
                 break
         if holeFilling == True:
             pixRad=(10.0/60.0)/wcs.getPixelSizeDeg()
             bckData=ndimage.median_filter(data, int(pixRad))
 
-        if 'extendedMask' in list(self.keys()):
+        if 'extendedMask' in self.keys():
             # Filling with white noise + smooth large scale image
             # WARNING: Assumes weights are ivar maps [true for Sigurd's maps]
             extendedMask=self.loadTile('extendedMask', tileName = tileName)
@@ -377,7 +378,7 @@ class MapDict(dict):
 
         # Optional masking of point sources from external catalog
         # Especially needed if using Fourier-space matched filter (and maps not already point source subtracted)
-        if 'maskPointSourcesFromCatalog' in list(self.keys()) and self['maskPointSourcesFromCatalog'] is not None:
+        if 'maskPointSourcesFromCatalog' in self.keys() and self['maskPointSourcesFromCatalog'] is not None:
             # This is fast enough if using small tiles and running in parallel...
             # If our masking/filling is effective enough, we may not need to mask so much here...
             if type(self['maskPointSourcesFromCatalog']) is not list:
@@ -420,7 +421,7 @@ class MapDict(dict):
                     psMask[rDegMap < maskRadiusArcmin/60.0]=0
                     data[rDegMap < maskRadiusArcmin/60.0]=bckData[rDegMap < maskRadiusArcmin/60.0]
 
-        if 'subtractModelFromCatalog' in list(self.keys()) and self['subtractModelFromCatalog'] is not None:
+        if 'subtractModelFromCatalog' in self.keys() and self['subtractModelFromCatalog'] is not None:
             if type(self['subtractModelFromCatalog']) is not list:
                 self['subtractModelFromCatalog']=[self['subtractModelFromCatalog']]
             for tab in self['subtractModelFromCatalog']:
@@ -433,7 +434,7 @@ class MapDict(dict):
                     # Threshold of > 1 uK here should be made adjustable in config
                     flagMask=flagMask+np.greater(model, 1)
 
-        if 'maskAndFillFromCatalog' in list(self.keys()) and self['maskAndFillFromCatalog'] is not None:
+        if 'maskAndFillFromCatalog' in self.keys() and self['maskAndFillFromCatalog'] is not None:
             if type(self['maskAndFillFromCatalog']) is not list:
                 self['maskAndFillFromCatalog']=[self['maskAndFillFromCatalog']]
             for tab in self['maskAndFillFromCatalog']:
@@ -474,6 +475,60 @@ class MapDict(dict):
             raise Exception("Map and survey mask dimensions are not the same (they should also have same WCS)")
 
 
+#------------------------------------------------------------------------------------------------------------
+def _clipTileFromMap(pathToMap, clippedSection):
+    """Reads the section [minX, maxX, minY, maxY] of the map at the given path (used for on-the-fly tile
+    clipping by :meth:`MapDict.loadTile`).
+
+    The map is memory-mapped, so only the pixels in the tile are read from disk - the clipped section is
+    copied so that it does not keep the whole-map mapping alive after the file is closed.
+
+    Returns map array
+
+    """
+
+    with pyfits.open(pathToMap, memmap = True) as img:
+        for ext in img:
+            # Check the header rather than .data, so we don't load (or decompress) every extension
+            if img[ext].header.get('NAXIS', 0) > 0:
+                break
+        minX, maxX, minY, maxY=clippedSection
+        mapData=img[ext].data
+        if mapData.ndim == 3:
+            data=np.array(mapData[0, minY:maxY, minX:maxX])
+        elif mapData.ndim == 2:
+            data=np.array(mapData[minY:maxY, minX:maxX])
+        else:
+            raise Exception("Map data has %d dimensions - only ndim = 2 or ndim = 3 are currently handled." % (mapData.ndim))
+        del mapData
+
+    return data
+
+#------------------------------------------------------------------------------------------------------------
+def _setUpTileCache(config):
+    """Adds a shared (initially empty) `tileCache` dictionary to each map dictionary in the config, so that
+    :meth:`MapDict.loadTile` only reads each input tile from disk once over repeated runs of the pipeline.
+    This is only done if the input tiles handled by this process are estimated to fit within the memory
+    budget set by the `simTileCacheGB` config parameter. The cache is discarded by
+    :meth:`startUp.NemoConfig.restoreConfig`.
+
+    """
+
+    numPix=0
+    for tileName in config.tileNames:
+        minX, maxX, minY, maxY=config.tileCoordsDict[tileName]['clippedSection']
+        numPix=numPix+(maxX-minX)*(maxY-minY)
+    numMaps=0
+    for mapDict in config.unfilteredMapsDictList:
+        for key in mapDict.validMapKeys:
+            if type(mapDict.get(key)) == str and os.path.isdir(mapDict[key]) == False:
+                numMaps=numMaps+1
+    if numPix*numMaps*8 > config.parDict['simTileCacheGB']*1e9:
+        return None
+    tileCache={}
+    for mapDict in config.unfilteredMapsDictList:
+        mapDict['tileCache']=tileCache
+
 #------------------------------------------------------------------------------------------------------------
 class MapDictList(object):
     """Blah. We want this to iterate over the mapDictList and be indexable.
@@ -1101,12 +1156,18 @@ def maskOutSources(mapData, wcs, catalog, radiusArcmin = 7.0, mask = 0.0, growMa
                                                 np.arange(mapData.shape[1]),
                                                 bckSubbed, kx = 1, ky = 1)
 
-    for obj in catalog:
-        if wcs.coordsAreInImage(obj['RADeg'], obj['decDeg']) == True:
+    # Find which objects fall inside the map (and their local pixel scales) with two WCS calls in total,
+    # rather than several calls per object
+    pixScalesList=getLocalPixelScales(wcs, catalog['RADeg'], catalog['decDeg'])
+    inImageMask=np.logical_and(np.logical_and(pixScalesList[:, 0] >= 0, pixScalesList[:, 0] < mapData.shape[1]),
+                               np.logical_and(pixScalesList[:, 1] >= 0, pixScalesList[:, 1] < mapData.shape[0]))
+
+    for obj, inImage, pixScales in zip(catalog, inImageMask, pixScalesList):
+        if inImage == True:
             degreesMap=np.ones(mapData.shape, dtype = float)*1e6
             rRange, xBounds, yBounds=makeDegreesDistanceMap(degreesMap, wcs,
                                                             obj['RADeg'], obj['decDeg'],
-                                                            20.0/60.0)
+                                                            20.0/60.0, pixScales = pixScales)
             circleMask=np.less(rRange, radiusArcmin/60.0)
             grownCircleMask=np.less(rRange, (radiusArcmin*growMaskedArea)/60.0)
             maskMap[grownCircleMask]=1.0
@@ -1124,12 +1185,10 @@ def maskOutSources(mapData, wcs, catalog, radiusArcmin = 7.0, mask = 0.0, growMa
             elif mask == 'subtract':
                 peakValue=mapData[int(round(obj['y'])), int(round(obj['x']))]
                 sigmaDeg=(1.4/60.0)/np.sqrt(8.0*np.log(2.0))
-                profRDeg=np.linspace(0.0, 30.0/60.0, 5000)
-                profile1d=peakValue*np.exp(-((profRDeg**2)/(2*sigmaDeg**2)))
-                r2p=interpolate.interp1d(profRDeg, profile1d, bounds_error=False, fill_value=0.0)
+                # Gaussian evaluated directly - no need to tabulate and interpolate a closed-form profile
                 profile2d=np.zeros(rRange.shape)
                 profMask=np.less(rRange, 1.0)
-                profile2d[profMask]=r2p(rRange[profMask])
+                profile2d[profMask]=peakValue*np.exp(-((rRange[profMask]**2)/(2*sigmaDeg**2)))
                 maskedMapData[profMask]=maskedMapData[profMask]-profile2d[profMask]
 
                 # NOTE: below old, replaced Jul 2015 but not deleted as yet...
@@ -1249,7 +1308,7 @@ def simCMBMap(shape, wcs, noiseLevel = None, beam = None, seed = None):
 
     if beam is not None:
         if type(beam) == str:
-            beam=signals.BeamProfile(beamFileName = beam)
+            beam=signals.loadBeamProfile(beam)
         assert(type(beam) == signals.BeamProfile)
         lbeam=np.interp(lps, beam.ell, beam.Bell)
         ps*=lbeam
@@ -1389,7 +1448,7 @@ def convolveMapWithBeam(data, wcs, beam, maxDistDegrees = 1.0):
     """
 
     if type(beam) == str:
-        beam=signals.BeamProfile(beamFileName = beam)
+        beam=signals.loadBeamProfile(beam)
 
     # Pad the beam kernel to odd number of pixels (so we know shift to apply)
     # We're only really using WCS info here for the pixel scale at the centre of the map
@@ -1463,23 +1522,34 @@ def getPixelAreaArcmin2Map(shape, wcs):
 
     """
 
-    # Get pixel size as function of position
-    pixAreasDeg2=[]
+    pixAreasArcmin2=getPixelAreaArcmin2Column(shape[0], wcs)
+    pixAreasArcmin2Map=np.array([pixAreasArcmin2]*shape[1]).transpose()
+
+    return pixAreasArcmin2Map
+
+#-------------------------------------------------------------------------------------------------------------
+def getPixelAreaArcmin2Column(numRows, wcs):
+    """Returns pixel area in arcmin2 for each row of a map (the pixel area is assumed to vary only with the
+    row, i.e., declination, as for the projections used in Nemo). Multiply by a map as a column, e.g.,
+    ``getPixelAreaArcmin2Column(mapData.shape[0], wcs)[:, np.newaxis]*mapData``, to avoid making the full
+    map returned by getPixelAreaArcmin2Map.
+
+    """
+
+    # Get pixel size as function of position - all rows at once, rather than two WCS calls per row
     RACentre, decCentre=wcs.getCentreWCSCoords()
     x0, y0=wcs.wcs2pix(RACentre, decCentre)
-    x1=x0+1
-    for y0 in range(shape[0]):
-        y1=y0+1
-        ra0, dec0=wcs.pix2wcs(x0, y0)
-        ra1, dec1=wcs.pix2wcs(x1, y1)
-        xPixScale=astCoords.calcAngSepDeg(ra0, dec0, ra1, dec0)
-        yPixScale=astCoords.calcAngSepDeg(ra0, dec0, ra0, dec1)
-        pixAreasDeg2.append(xPixScale*yPixScale)
-    pixAreasDeg2=np.array(pixAreasDeg2)
+    ys=np.arange(numRows, dtype = float)
+    coords0=np.array(wcs.pix2wcs(np.full(numRows, x0), ys)).reshape(-1, 2)
+    coords1=np.array(wcs.pix2wcs(np.full(numRows, x0+1), ys+1)).reshape(-1, 2)
+    ra0, dec0=coords0[:, 0], coords0[:, 1]
+    ra1, dec1=coords1[:, 0], coords1[:, 1]
+    xPixScale=astCoords.calcAngSepDeg(ra0, dec0, ra1, dec0)
+    yPixScale=astCoords.calcAngSepDeg(ra0, dec0, ra0, dec1)
+    pixAreasDeg2=xPixScale*yPixScale
     pixAreasArcmin2=pixAreasDeg2*(60**2)
-    pixAreasArcmin2Map=np.array([pixAreasArcmin2]*shape[1]).transpose()
 
-    return pixAreasArcmin2Map
+    return pixAreasArcmin2
 
 #-------------------------------------------------------------------------------------------------------------
 def estimateContaminationFromSkySim(config, imageDict):
@@ -1508,41 +1578,55 @@ def estimateContaminationFromSkySim(config, imageDict):
     SNRKeys=['fixed_SNR']
     numSkySims=config.parDict['numSkySims']
     resultsList=[]
+    _setUpTileCache(config)
+
+    # We don't copy this, because it's complicated due to containing MPI-related things (comm)
+    # So... we modify the config parameters in-place, and restore them before exiting this method
+    # The settings below are the same for every sim, so are only done once
+    simConfig=config
+
+    # NOTE: This block below should be handled when parsing the config file - fix/remove
+    # Optional override of default GNFW parameters (used by Arnaud model), if used in filters given
+    if 'GNFWParams' not in simConfig.parDict.keys():
+        simConfig.parDict['GNFWParams']='default'
+    for filtDict in simConfig.parDict['mapFilters']:
+        filtDict['params']['GNFWParams']=simConfig.parDict['GNFWParams']
+
+    # Optionally skip writing filtered maps, plots, and region files for every sim
+    # (the contamination estimate only uses the catalogs held in memory)
+    if simConfig.parDict['saveSkySimOutput'] == False:
+        for filtDict in simConfig.parDict['mapFilters']:
+            keysToFalsify=['saveFilteredMaps', 'savePlots', 'saveDS9Regions']
+            for key in keysToFalsify:
+                filtDict['params'][key]=False
+
+    # Delete all non-reference scale filters (otherwise we'd want to cache all filters for speed)
+    for filtDict in simConfig.parDict['mapFilters']:
+        if filtDict['label'] == simConfig.parDict['photFilter']:
+            break
+    simConfig.parDict['mapFilters']=[filtDict]
+
     for i in range(numSkySims):
 
         # NOTE: we throw the first sim away on figuring out noiseBoostFactors
         print(">>> Sky sim %d/%d [rank = %d] ..." % (i+1, numSkySims, config.rank))
         t0=time.time()
 
-        # We don't copy this, because it's complicated due to containing MPI-related things (comm)
-        # So... we modify the config parameters in-place, and restore them before exiting this method
-        simConfig=config
-
         # We use the seed here to keep the CMB sky the same across frequencies...
         CMBSimSeed=np.random.randint(16777216)
 
-        # NOTE: This block below should be handled when parsing the config file - fix/remove
-        # Optional override of default GNFW parameters (used by Arnaud model), if used in filters given
-        if 'GNFWParams' not in list(simConfig.parDict.keys()):
-            simConfig.parDict['GNFWParams']='default'
-        for filtDict in simConfig.parDict['mapFilters']:
-            filtDict['params']['GNFWParams']=simConfig.parDict['GNFWParams']
-
-        # Delete all non-reference scale filters (otherwise we'd want to cache all filters for speed)
-        for filtDict in simConfig.parDict['mapFilters']:
-            if filtDict['label'] == simConfig.parDict['photFilter']:
-                break
-        simConfig.parDict['mapFilters']=[filtDict]
-
         # Filling in with sim will be done when maps.preprocessMapDict is called by the filter object
         for mapDict in simConfig.unfilteredMapsDictList:
             mapDict['CMBSimSeed']=CMBSimSeed
 
         # NOTE: we need to zap ONLY specific maps for when we are running in parallel
-        for tileName in simConfig.tileNames:
-            mapFileNames=glob.glob(simRootOutDir+os.path.sep+"filteredMaps"+os.path.sep+"*#%s_*.fits" % (tileName))
-            for m in mapFileNames:
-                os.remove(m)
+        # List the directory once (if it exists yet), rather than globbing it once per tile
+        filteredMapsDir=simRootOutDir+os.path.sep+"filteredMaps"
+        if os.path.isdir(filteredMapsDir) == True:
+            dirFileNames=os.listdir(filteredMapsDir)
+            for tileName in simConfig.tileNames:
+                for m in fnmatch.filter(dirFileNames, "*#%s_*.fits" % (tileName)):
+                    os.remove(filteredMapsDir+os.path.sep+m)
 
         simImageDict=pipelines.filterMapsAndMakeCatalogs(simConfig,
                                                          rootOutDir = simRootOutDir,
@@ -1561,20 +1645,18 @@ def estimateContaminationFromSkySim(config, imageDict):
         t1=time.time()
         print("... time taken for sky sim run = %.3f sec" % (t1-t0))
 
-    # Average results
+    # Average results - stack each column over all sims and take the mean in one step
     avContaminTabDict={}
-    for k in list(resultsList[0].keys()):
+    for k in resultsList[0].keys():
         avContaminTabDict[k]=atpy.Table()
-        for kk in list(resultsList[0][k].keys()):
-            avContaminTabDict[k].add_column(atpy.Column(np.zeros(len(resultsList[0][k])), kk))
-            for i in range(len(resultsList)):
-                avContaminTabDict[k][kk]=avContaminTabDict[k][kk]+resultsList[i][k][kk]
-            avContaminTabDict[k][kk]=avContaminTabDict[k][kk]/float(len(resultsList))
+        for kk in resultsList[0][k].keys():
+            stacked=np.array([results[k][kk] for results in resultsList], dtype = float)
+            avContaminTabDict[k].add_column(atpy.Column(stacked.mean(axis = 0), kk))
 
     # For writing separate contamination .fits tables if running in parallel
     # (if we're running in serial, then we'll get a giant file name with full tileNames list... fix later)
     tileNamesLabel="#"+str(config.tileNames).replace("[", "").replace("]", "").replace("'", "").replace(", ", "#")
-    for k in list(avContaminTabDict.keys()):
+    for k in avContaminTabDict.keys():
         fitsOutFileName=config.diagnosticsDir+os.path.sep+"%s_contaminationEstimate_%s.fits" % (k, tileNamesLabel)
         contaminTab=avContaminTabDict[k]
         contaminTab.meta['NEMOVER']=nemo.__version__
@@ -1611,7 +1693,7 @@ def estimateContaminationFromInvertedMaps(config, imageDict):
     SNRKeys=['SNR', 'fixed_SNR']
     contaminTabDict=estimateContamination(invertedDict, imageDict, SNRKeys, 'invertedMap', config.diagnosticsDir)
 
-    for k in list(contaminTabDict.keys()):
+    for k in contaminTabDict.keys():
         fitsOutFileName=config.diagnosticsDir+os.path.sep+"%s_contaminationEstimate.fits" % (k)
         contaminTab=contaminTabDict[k]
         contaminTab.write(fitsOutFileName, overwrite = True)
@@ -1629,7 +1711,7 @@ def plotContamination(contaminTabDict, diagnosticsDir):
 
     plotSettings.update_rcParams()
 
-    for k in list(contaminTabDict.keys()):
+    for k in contaminTabDict.keys():
         if k.find('fixed') != -1:
             SNRKey="fixed_SNR"
             SNRLabel="SNR$_{\\rm 2.4}$"
@@ -1653,9 +1735,9 @@ def plotContamination(contaminTabDict, diagnosticsDir):
         plt.savefig(diagnosticsDir+os.path.sep+"%s_contaminationEstimate.pdf" % (k))
         plt.close()
 
-        tck=interpolate.splrep(binEdges, contaminTabDict[k]['cumContamination'])
+        # Linear lookup is all that's needed here (fineSNRs never leave the binEdges range)
         fineSNRs=np.linspace(binEdges.min(), binEdges.max(), 1000)
-        fineContamination=interpolate.splev(fineSNRs, tck, ext = 1)
+        fineContamination=np.interp(fineSNRs, binEdges, cumContamination, left = cumContamination[0], right = 0.0)
         with open(diagnosticsDir+os.path.sep+"%s_contaminationEstimate_usefulFractions.txt" % (k), "w") as outFile:
             fracs=[0.4, 0.3, 0.2, 0.1, 0.05, 0.01]
             for f in fracs:
@@ -1678,35 +1760,26 @@ def estimateContamination(contamSimDict, imageDict, SNRKeys, label, diagnosticsD
         #catalogs.catalog2DS9(invertedDict['optimalCatalog'], rootOutDir+os.path.sep+"skySimCatalog_%s_gtr_5.reg" % (SNRKey),
                                  #constraintsList = ['%s > 5' % (SNRKey)])
 
-        invertedSNRs=[]
-        for obj in invertedDict['optimalCatalog']:
-            invertedSNRs.append(obj[SNRKey])
-        invertedSNRs=np.array(invertedSNRs)
-        invertedSNRs.sort()
-        numInverted=np.arange(len(invertedSNRs))+1
-
-        candidateSNRs=[]
-        for obj in imageDict['optimalCatalog']:
-            candidateSNRs.append(obj[SNRKey])
-        candidateSNRs=np.array(candidateSNRs)
-        candidateSNRs.sort()
-        numCandidates=np.arange(len(candidateSNRs))+1
+        # Read whole columns (rather than a row at a time) - histogramming below doesn't need them sorted
+        if len(invertedDict['optimalCatalog']) > 0:
+            invertedSNRs=np.asarray(invertedDict['optimalCatalog'][SNRKey], dtype = float)
+        else:
+            invertedSNRs=np.zeros(0)
+        if len(imageDict['optimalCatalog']) > 0:
+            candidateSNRs=np.asarray(imageDict['optimalCatalog'][SNRKey], dtype = float)
+        else:
+            candidateSNRs=np.zeros(0)
 
         binMin=4.0
         binMax=20.0
         binStep=0.2
         binEdges=np.linspace(binMin, binMax, int((binMax-binMin)/binStep+1))
-        binCentres=(binEdges+binStep/2.0)[:-1]
         candidateSNRHist=np.histogram(candidateSNRs, bins = binEdges)
         invertedSNRHist=np.histogram(invertedSNRs, bins = binEdges)
 
-        cumSumCandidates=[]
-        cumSumInverted=[]
-        for i in range(binCentres.shape[0]):
-            cumSumCandidates.append(candidateSNRHist[0][i:].sum())
-            cumSumInverted.append(invertedSNRHist[0][i:].sum())
-        cumSumCandidates=np.array(cumSumCandidates, dtype = float)
-        cumSumInverted=np.array(cumSumInverted, dtype = float)
+        # Number of objects in and above each bin, i.e., reversed cumulative sums
+        cumSumCandidates=np.array(np.cumsum(candidateSNRHist[0][::-1])[::-1], dtype = float)
+        cumSumInverted=np.array(np.cumsum(invertedSNRHist[0][::-1])[::-1], dtype = float)
 
         # Plot cumulative contamination estimate (this makes more sense than plotting purity, since we don't know
         # that from what we're doing here, strictly speaking)
@@ -1723,7 +1796,7 @@ def estimateContamination(contamSimDict, imageDict, SNRKeys, label, diagnosticsD
 
         # Convert to .fits table
         contaminTab=atpy.Table()
-        for key in list(contaminDict.keys()):
+        for key in contaminDict.keys():
             contaminTab.add_column(atpy.Column(contaminDict[key], key))
 
         contaminTabDict['%s_%s' % (label, SNRKey)]=contaminTab
@@ -1812,7 +1885,7 @@ def makeModelImage(shape, wcs, catalog, beamFileName, obsFreqGHz = None, GNFWPar
 
     # Set initial max size in degrees from beam file (used for sources; clusters adjusted for each object)
     numFWHM=5.0
-    beam=signals.BeamProfile(beamFileName = beamFileName)
+    beam=signals.loadBeamProfile(beamFileName)
     maxSizeDeg=(beam.FWHMArcmin*numFWHM)/60
 
     # Map of distance(s) from objects - this will get updated in place (fast)
@@ -1847,49 +1920,58 @@ def makeModelImage(shape, wcs, catalog, beamFileName, obsFreqGHz = None, GNFWPar
                 modelMap=convertToDeltaT(modelMap, obsFrequencyGHz = obsFreqGHz,
                                          TCMBAlpha = TCMBAlpha, z = z)
         else:
-            for row in catalog:
-                count=count+1
+            M500s=np.zeros(len(catalog))
+            zs=np.zeros(len(catalog))
+            y0sToInsert=np.zeros(len(catalog))
+            for i, row in enumerate(catalog):
                 if 'true_M500c' in catalog.keys():
                     # This case is for when we're running from nemoMock output
                     # Since the idea of this is to create noise-free model images, we must use true values here
                     # (to avoid any extra scatter/selection effects after adding model clusters to noise maps).
-                    M500=row['true_M500c']*1e14
-                    z=row['redshift']
-                    y0ToInsert=row['true_y_c']*1e-4
+                    M500s[i]=row['true_M500c']*1e14
+                    zs[i]=row['redshift']
+                    y0sToInsert[i]=row['true_y_c']*1e-4
                 else:
                     # NOTE: This case is for running from nemo output
                     # We need to adapt this for when the template names are not in this format
                     if 'template' not in catalog.keys():
                         raise Exception("No M500, z, or template column found in catalog.")
                     bits=row['template'].split("#")[0].split("_")
-                    M500=float(bits[1][1:].replace("p", "."))
-                    z=float(bits[2][1:].replace("p", "."))
-                    y0ToInsert=row['y_c']*1e-4  # or fixed_y_c...
-                theta500Arcmin=signals.calcTheta500Arcmin(z, M500, cosmoModel)
-                maxSizeDeg=5*(theta500Arcmin/60)
-                signalMap=makeClusterSignalMap(z, M500, modelMap.shape, wcs, RADeg = row['RADeg'],
-                                                decDeg = row['decDeg'], beam = beam,
-                                                GNFWParams = GNFWParams, amplitude = y0ToInsert,
-                                                maxSizeDeg = maxSizeDeg, convolveWithBeam = True,
-                                                cosmoModel = cosmoModel)
+                    M500s[i]=float(bits[1][1:].replace("p", "."))
+                    zs[i]=float(bits[2][1:].replace("p", "."))
+                    y0sToInsert[i]=row['y_c']*1e-4  # or fixed_y_c...
+            # Objects that share a profile (e.g., the same filter template) are painted together, so that the
+            # profile (and its beam convolution) is only set up once for each distinct (z, M500)
+            zM500Pairs, pairIndices=np.unique(np.array([zs, M500s]).transpose(), axis = 0, return_inverse = True)
+            pairIndices=pairIndices.flatten()
+            theta500Arcmins=signals.calcTheta500Arcmin(zM500Pairs[:, 0], zM500Pairs[:, 1], cosmoModel)
+            for j in range(len(zM500Pairs)):
+                z, M500=zM500Pairs[j]
+                pairMask=pairIndices == j
+                count=count+pairMask.sum()
+                maxSizeDeg=5*(theta500Arcmins[j]/60)
+                signalMap=makeClusterSignalMap(z, M500, modelMap.shape, wcs,
+                                                RADeg = np.asarray(catalog['RADeg'][pairMask], dtype = float),
+                                                decDeg = np.asarray(catalog['decDeg'][pairMask], dtype = float),
+                                                beam = beam, GNFWParams = GNFWParams,
+                                                amplitude = y0sToInsert[pairMask], maxSizeDeg = maxSizeDeg,
+                                                convolveWithBeam = True, cosmoModel = cosmoModel)
                 if obsFreqGHz is not None:
                     signalMap=convertToDeltaT(signalMap, obsFrequencyGHz = obsFreqGHz,
                                                 TCMBAlpha = TCMBAlpha, z = z)
                 modelMap=modelMap+signalMap
     else:
         # Sources - slower but more accurate way
-        for row in catalog:
-            if validAreaSection is not None:
-                x0, x1, y0, y1=validAreaSection
-                x, y=wcs.wcs2pix(row['RADeg'], row['decDeg'])
-                if (x >= x0 and x < x1 and y >= y0 and y < y1) == False:
-                    continue
-            degreesMap=np.ones(modelMap.shape, dtype = float)*1e6 # NOTE: never move this
+        # The catalog has already been cut to validAreaSection above. The beam profile is zero beyond
+        # maxSizeDeg, so we only evaluate and add it within the box filled by makeDegreesDistanceMap
+        # (which overwrites that whole box each time, so degreesMap can be re-used between objects)
+        pixScalesList=getLocalPixelScales(wcs, catalog['RADeg'], catalog['decDeg'])
+        for row, pixScales in zip(catalog, pixScalesList):
             degreesMap, xBounds, yBounds=makeDegreesDistanceMap(degreesMap, wcs,
                                                                 row['RADeg'], row['decDeg'],
-                                                                maxSizeDeg)
-            signalMap=signals.makeBeamModelSignalMap(degreesMap, wcs, beam)*row['deltaT_c']
-            modelMap=modelMap+signalMap
+                                                                maxSizeDeg, pixScales = pixScales)
+            box=(slice(yBounds[0], yBounds[1]), slice(xBounds[0], xBounds[1]))
+            signals.addBeamModelToMap(modelMap[box], degreesMap[box], beam, row['deltaT_c'])
 
     # Optional: apply pixel window function - generally this should be True
     # (because the source-insertion routines in signals.py interpolate onto the grid rather than average)
@@ -1975,37 +2057,25 @@ def sourceInjectionTest(config):
     if os.path.exists(catFileName) == False:
         raise Exception("Catalog file '%s' not found - needed to do source injection test." % (catFileName))
     realCatalog=atpy.Table().read(catFileName)
+    # Matched against on every iteration - astropy keeps the search tree with this, so it is only built once
+    realCoords=SkyCoord(ra = realCatalog['RADeg'].data, dec = realCatalog['decDeg'].data, unit = 'deg')
 
     # Run each scale / model and then collect everything into one table afterwards
-    # NOTE: These dictionaries contain recovered measurements from running the finder
-    RADegDict={}
-    decDegDict={}
-    SNRDict={}
-    rArcminDict={}
-    inFluxDict={}
-    outFluxDict={}
-    noiseLevelDict={}
-    tileNamesDict={}
+    # NOTE: This list collects tables of recovered measurements from running the finder (one per iteration)
+    resultsTabList=[]
     # NOTE: This list collects all the input catalogs
     allInputCatalogs=[]
+    _setUpTileCache(config)
     modelCount=0
     for sourceInjectionModel in sourceInjectionModelList:
         modelCount=modelCount+1
         print(">>> Source injection model: %d/%d" % (modelCount, len(sourceInjectionModelList)))
-        RADegDict[sourceInjectionModel['label']]=[]
-        decDegDict[sourceInjectionModel['label']]=[]
-        SNRDict[sourceInjectionModel['label']]=[]
-        rArcminDict[sourceInjectionModel['label']]=[]
-        inFluxDict[sourceInjectionModel['label']]=[]
-        outFluxDict[sourceInjectionModel['label']]=[]
-        noiseLevelDict[sourceInjectionModel['label']]=[]
-        tileNamesDict[sourceInjectionModel['label']]=[]
         for i in range(numIterations):
             print(">>> Source injection and recovery test %d/%d [rank = %d]" % (i+1, numIterations, config.rank))
 
             # NOTE: This block below should be handled when parsing the config file - fix/remove
             # Optional override of default GNFW parameters (used by Arnaud model), if used in filters given
-            if 'GNFWParams' not in list(config.parDict.keys()):
+            if 'GNFWParams' not in config.parDict.keys():
                 config.parDict['GNFWParams']='default'
             for filtDict in config.parDict['mapFilters']:
                 filtDict['params']['GNFWParams']=config.parDict['GNFWParams']
@@ -2101,7 +2171,7 @@ def sourceInjectionTest(config):
                 # Effectively this is the same as using 5' circular holes in the survey mask on real objects
                 # (but actually adding the avoidance radius parameter to the test catalogs really solved this)
                 if len(recCatalog) > 0:
-                    recCatalog=catalogs.removeCrossMatched(recCatalog, realCatalog,
+                    recCatalog=catalogs.removeCrossMatched(recCatalog, realCoords,
                                                            radiusArcmin = realExclusionRadiusArcmin)
                 if len(recCatalog) > 0:
                     try:
@@ -2114,10 +2184,9 @@ def sourceInjectionTest(config):
                     if clusterMode == False and np.logical_and(rDeg > 1.5/60, x_recCatalog['SNR'] > 10).sum() > 0:
                         mask=np.logical_and(rDeg > 1.5/60, x_recCatalog['SNR'] > 10)
                         config.parDict['mapFilters'][0]['params']['saveFilteredMaps']=True
-                        recCatalog2=pipelines.filterMapsAndMakeCatalogs(config, useCachedFilters = True,
-                                                                        writeAreaMask = False, writeFlagMask = False)
-                        recCatalog2=catalogs.removeCrossMatched(recCatalog2, realCatalog,
-                                                                radiusArcmin = realExclusionRadiusArcmin)
+                        # Re-run only to write the filtered maps - the catalog itself isn't needed
+                        pipelines.filterMapsAndMakeCatalogs(config, useCachedFilters = True,
+                                                            writeAreaMask = False, writeFlagMask = False)
                         catalogs.catalog2DS9(x_recCatalog[mask],
                                              simRootOutDir+os.path.sep+"filteredMaps"+os.path.sep+tileName+os.path.sep+"mismatch-rec.reg")
                         catalogs.catalog2DS9(x_mockCatalog[mask],
@@ -2130,67 +2199,29 @@ def sourceInjectionTest(config):
                             print("... Warning: %s ..." % (msg))
 
                     # Store everything - analyse later
-                    RADegDict[sourceInjectionModel['label']]=RADegDict[sourceInjectionModel['label']]+x_recCatalog['RADeg'].tolist()
-                    decDegDict[sourceInjectionModel['label']]=decDegDict[sourceInjectionModel['label']]+x_recCatalog['decDeg'].tolist()
-                    SNRDict[sourceInjectionModel['label']]=SNRDict[sourceInjectionModel['label']]+x_recCatalog[SNRCol].tolist()
-                    rArcminDict[sourceInjectionModel['label']]=rArcminDict[sourceInjectionModel['label']]+(rDeg*60).tolist()
-                    inFluxDict[sourceInjectionModel['label']]=inFluxDict[sourceInjectionModel['label']]+x_mockCatalog[fluxCol].tolist()
-                    outFluxDict[sourceInjectionModel['label']]=outFluxDict[sourceInjectionModel['label']]+x_recCatalog[fluxCol].tolist()
-                    noiseLevelDict[sourceInjectionModel['label']]=noiseLevelDict[sourceInjectionModel['label']]+x_recCatalog[noiseLevelCol].tolist()
-                    tileNamesDict[sourceInjectionModel['label']]=tileNamesDict[sourceInjectionModel['label']]+x_recCatalog['tileName'].tolist()
-
-        RADegDict[sourceInjectionModel['label']]=np.array(RADegDict[sourceInjectionModel['label']])
-        decDegDict[sourceInjectionModel['label']]=np.array(decDegDict[sourceInjectionModel['label']])
-        SNRDict[sourceInjectionModel['label']]=np.array(SNRDict[sourceInjectionModel['label']])
-        rArcminDict[sourceInjectionModel['label']]=np.array(rArcminDict[sourceInjectionModel['label']])
-        inFluxDict[sourceInjectionModel['label']]=np.array(inFluxDict[sourceInjectionModel['label']])
-        outFluxDict[sourceInjectionModel['label']]=np.array(outFluxDict[sourceInjectionModel['label']])
-        noiseLevelDict[sourceInjectionModel['label']]=np.array(noiseLevelDict[sourceInjectionModel['label']])
-        tileNamesDict[sourceInjectionModel['label']]=np.array(tileNamesDict[sourceInjectionModel['label']])
+                    resultsTabList.append(_makeSourceInjectionResultsTable(sourceInjectionModel,
+                                                                           x_recCatalog['RADeg'],
+                                                                           x_recCatalog['decDeg'],
+                                                                           x_recCatalog[SNRCol], SNRCol,
+                                                                           rDeg*60,
+                                                                           x_mockCatalog[fluxCol],
+                                                                           x_recCatalog[fluxCol],
+                                                                           x_recCatalog[noiseLevelCol],
+                                                                           x_recCatalog['tileName']))
 
     # Collecting all results into one giant table
-    models=[]
-    theta500s=[]
-    RAs=[]
-    decs=[]
-    SNRs=[]
-    rArcmin=[]
-    inFlux=[]
-    outFlux=[]
-    noiseLevel=[]
-    tileNames=[]
-    for sourceInjectionModel in sourceInjectionModelList:
-        label=sourceInjectionModel['label']
-        if 'theta500Arcmin' in sourceInjectionModel.keys():
-            theta500s=theta500s+[sourceInjectionModel['theta500Arcmin']]*len(SNRDict[label])
-        models=models+[label]*len(SNRDict[label])
-        RAs=RAs+RADegDict[label].tolist()
-        decs=decs+decDegDict[label].tolist()
-        SNRs=SNRs+SNRDict[label].tolist()
-        rArcmin=rArcmin+rArcminDict[label].tolist()
-        inFlux=inFlux+inFluxDict[label].tolist()
-        outFlux=outFlux+outFluxDict[label].tolist()
-        noiseLevel=noiseLevel+noiseLevelDict[label].tolist()
-        tileNames=tileNames+tileNamesDict[label].tolist()
-    resultsTable=atpy.Table()
-    resultsTable.add_column(atpy.Column(RAs, 'RADeg'))
-    resultsTable.add_column(atpy.Column(decs, 'decDeg'))
-    resultsTable.add_column(atpy.Column(models, 'sourceInjectionModel'))
-    if len(theta500s) == len(resultsTable):
-        resultsTable.add_column(atpy.Column(theta500s, 'theta500Arcmin'))
-    resultsTable.add_column(atpy.Column(SNRs, SNRCol))
-    resultsTable.add_column(atpy.Column(rArcmin, 'rArcmin'))
-    resultsTable.add_column(atpy.Column(inFlux, 'inFlux'))
-    resultsTable.add_column(atpy.Column(outFlux, 'outFlux'))
-    resultsTable.add_column(atpy.Column(noiseLevel, 'noiseLevel'))
-    resultsTable.add_column(atpy.Column(tileNames, 'tileName'))
+    if len(resultsTabList) > 0:
+        resultsTable=atpy.vstack(resultsTabList)
+    else:
+        resultsTable=_makeSourceInjectionResultsTable({'label': '', 'theta500Arcmin': 0.0}, [], [], [], SNRCol,
+                                                      [], [], [], [], [])
 
     # Store the giant combined input catalog as well, for completeness calculations
     # NOTE: Not all objects in this may have been injected (masking, avoiding overlap etc.)
     if config.rank == 0:
         allInputTab=atpy.vstack(allInputCatalogs)
         allInputTab.rename_column(fluxCol, "inFlux")
-        allInputTab=catalogs.removeCrossMatched(allInputTab, realCatalog, radiusArcmin = realExclusionRadiusArcmin)
+        allInputTab=catalogs.removeCrossMatched(allInputTab, realCoords, radiusArcmin = realExclusionRadiusArcmin)
         allInputTab.write(config.selFnDir+os.path.sep+"sourceInjectionInputCatalog.fits", overwrite = True)
 
     # Restore the original config parameters (which we overrode here)
@@ -2198,6 +2229,31 @@ def sourceInjectionTest(config):
 
     return resultsTable
 
+#------------------------------------------------------------------------------------------------------------
+def _makeSourceInjectionResultsTable(sourceInjectionModel, RADeg, decDeg, SNR, SNRCol, rArcmin, inFlux,
+                                     outFlux, noiseLevel, tileNames):
+    """Packs up the measurements from one source injection run into a table, for stacking together by
+    :meth:`sourceInjectionTest`.
+
+    """
+
+    resultsTable=atpy.Table()
+    resultsTable.add_column(atpy.Column(np.array(RADeg, dtype = float), 'RADeg'))
+    resultsTable.add_column(atpy.Column(np.array(decDeg, dtype = float), 'decDeg'))
+    resultsTable.add_column(atpy.Column(np.array([sourceInjectionModel['label']]*len(resultsTable), dtype = str),
+                                        'sourceInjectionModel'))
+    if 'theta500Arcmin' in sourceInjectionModel.keys():
+        resultsTable.add_column(atpy.Column(np.full(len(resultsTable), sourceInjectionModel['theta500Arcmin']),
+                                            'theta500Arcmin'))
+    resultsTable.add_column(atpy.Column(np.array(SNR, dtype = float), SNRCol))
+    resultsTable.add_column(atpy.Column(np.array(rArcmin, dtype = float), 'rArcmin'))
+    resultsTable.add_column(atpy.Column(np.array(inFlux, dtype = float), 'inFlux'))
+    resultsTable.add_column(atpy.Column(np.array(outFlux, dtype = float), 'outFlux'))
+    resultsTable.add_column(atpy.Column(np.array(noiseLevel, dtype = float), 'noiseLevel'))
+    resultsTable.add_column(atpy.Column(np.array(tileNames, dtype = str), 'tileName'))
+
+    return resultsTable
+
 #------------------------------------------------------------------------------------------------------------
 def positionRecoveryAnalysis(posRecTable, plotFileName, percentiles = [50, 95, 99.7],
                              sourceInjectionModel = None, plotRawData = True, rawDataAlpha = 1,
@@ -2218,7 +2274,8 @@ def positionRecoveryAnalysis(posRecTable, plotFileName, percentiles = [50, 95, 9
         pickleFileName (string, optional): Saves the percentile contours data as a pickle file if not None.
             This is saved as a dictionary with top-level keys named according to percentilesToPlot.
         selFnDir (string, optional): If given, model fit parameters will be written to a file named
-            posRecModelParameters.txt under the given selFn directory path.
+            posRecModelFits.npz under the given selFn directory path (one array of fit parameters per
+            percentile).
 
     """
 
@@ -2250,18 +2307,18 @@ def positionRecoveryAnalysis(posRecTable, plotFileName, percentiles = [50, 95, 9
     # No longer separating by input model (clusters are all shapes anyway)
     SNREdges=np.linspace(3.0, 10.0, 36)#np.linspace(0, 10, 101)
     SNRCentres=(SNREdges[1:]+SNREdges[:-1])/2.
-    grid=np.zeros([rArcminThreshold.shape[0], SNREdges.shape[0]-1])
-    totalGrid=np.zeros(grid.shape)
-    withinRGrid=np.zeros(grid.shape)
-    for i in range(SNREdges.shape[0]-1):
-        SNRMask=np.logical_and(tab[SNRCol] >= SNREdges[i], tab[SNRCol] < SNREdges[i+1])
-        for j in range(rArcminThreshold.shape[0]):
-            total=SNRMask.sum()
-            withinR=(tab['rArcmin'][SNRMask] < rArcminThreshold[j]).sum()
-            totalGrid[j, i]=total
-            withinRGrid[j, i]=withinR
-            if total > 0:
-                grid[j, i]=withinR/total
+    # Counts per SNR bin, and (cumulatively) per rArcmin threshold, are made in one pass over the table
+    # An object counts towards every threshold j with rArcmin < rArcminThreshold[j], i.e., j >= rIndex
+    numSNRBins=SNREdges.shape[0]-1
+    SNRIndices=np.digitize(np.asarray(tab[SNRCol]), SNREdges)-1
+    rIndices=np.searchsorted(rArcminThreshold, np.asarray(tab['rArcmin']), side = 'right')
+    validMask=np.logical_and(SNRIndices >= 0, SNRIndices < numSNRBins)
+    counts=np.bincount(rIndices[validMask]*numSNRBins+SNRIndices[validMask],
+                       minlength = (rArcminThreshold.shape[0]+1)*numSNRBins)
+    counts=counts.reshape(rArcminThreshold.shape[0]+1, numSNRBins)
+    withinRGrid=np.cumsum(counts, axis = 0)[:-1].astype(float)
+    totalGrid=np.tile(counts.sum(axis = 0), [rArcminThreshold.shape[0], 1]).astype(float)
+    grid=np.divide(withinRGrid, totalGrid, out = np.zeros(withinRGrid.shape), where = totalGrid > 0)
 
     # What we want are contours of constant prob - easiest to get this via matplotlib
     levelsList=np.array(percentiles)/100.
@@ -2297,8 +2354,7 @@ def positionRecoveryAnalysis(posRecTable, plotFileName, percentiles = [50, 95, 9
     # Save %-ile contours in case we want to use them in some modelling later
     if pickleFileName is not None:
         with open(pickleFileName, "wb") as pickleFile:
-            pickler=pickle.Pickler(pickleFile)
-            pickler.dump(contoursDict)
+            pickle.dump(contoursDict, pickleFile, protocol = pickle.HIGHEST_PROTOCOL)
 
     # Fit and save a position recovery model under selFn directory
     if selFnDir is not None:
@@ -2337,11 +2393,10 @@ def positionRecoveryAnalysis(posRecTable, plotFileName, percentiles = [50, 95, 9
         plt.ylabel("Recovered Position Offset (%s)" % (plotUnitsLabel))
         plt.savefig(fitPlotFileName)
         plt.close()
-        # Save the fits
-        outFileName=selFnDir+os.path.sep+"posRecModelFits.pkl"
-        with open(outFileName, "wb") as pickleFile:
-            pickler=pickle.Pickler(pickleFile)
-            pickler.dump(fitParamsDict)
+        # Save the fits - one (SNRFold, pedestal, norm) array per percentile key, so this can be read back
+        # with np.load without unpickling
+        outFileName=selFnDir+os.path.sep+"posRecModelFits.npz"
+        np.savez(outFileName, **fitParamsDict)
 
 #------------------------------------------------------------------------------------------------------------
 def noiseBiasAnalysis(sourceInjTable, plotFileName, sourceInjectionModel = None):
@@ -2411,7 +2466,36 @@ def saveFITS(outputFileName, mapData, wcs, compressionType = None):
     newImg.close()
 
 #---------------------------------------------------------------------------------------------------
-def makeDegreesDistanceMap(degreesMap, wcs, RADeg, decDeg, maxDistDegrees):
+def getLocalPixelScales(wcs, RADeg, decDeg):
+    """Returns the pixel coordinates of, and the pixel scales local to, the given positions, using two
+    WCS calls for all positions (rather than two per position). The output can be passed to
+    :meth:`makeDegreesDistanceMap` (using the `pixScales` keyword) to avoid repeating the WCS calls
+    for each object when looping over a catalog.
+
+    Args:
+        wcs (:obj:`astWCS.WCS`): WCS of the map.
+        RADeg (:obj:`np.ndarray`): RA coordinates in decimal degrees.
+        decDeg (:obj:`np.ndarray`): Declination coordinates in decimal degrees.
+
+    Returns:
+        An array with one row per position, with columns x, y (pixel coordinates), x pixel scale,
+        y pixel scale (both in degrees per pixel).
+
+    """
+
+    RADeg=np.asarray(RADeg, dtype = float)
+    decDeg=np.asarray(decDeg, dtype = float)
+    if len(RADeg) == 0:
+        return np.zeros([0, 4])
+    xyCoords=np.array(wcs.wcs2pix(RADeg, decDeg)).reshape(-1, 2)
+    coords1=np.array(wcs.pix2wcs(xyCoords[:, 0]+1, xyCoords[:, 1]+1)).reshape(-1, 2)
+    xPixScale=astCoords.calcAngSepDeg(RADeg, decDeg, coords1[:, 0], decDeg)
+    yPixScale=astCoords.calcAngSepDeg(RADeg, decDeg, RADeg, coords1[:, 1])
+
+    return np.array([xyCoords[:, 0], xyCoords[:, 1], xPixScale, yPixScale]).transpose()
+
+#---------------------------------------------------------------------------------------------------
+def makeDegreesDistanceMap(degreesMap, wcs, RADeg, decDeg, maxDistDegrees, pixScales = None):
     """Fills (in place) the 2d array degreesMap with distance in degrees from the given position,
     out to some user-specified maximum distance.
 
@@ -2425,6 +2509,9 @@ def makeDegreesDistanceMap(degreesMap, wcs, RADeg, decDeg, maxDistDegrees):
         decDeg (float): Declination in decimal degrees of position of interest (e.g., object
             location).
         maxDistDegrees: The maximum radius out to which distance will be calculated.
+        pixScales (:obj:`np.ndarray`, optional): Pixel coordinates and local pixel scales for this
+            position, i.e., the corresponding row of the output of :meth:`getLocalPixelScales`. If
+            None, these are calculated here.
 
     Returns:
         A map (2d array) of distance in degrees from the given position,
@@ -2438,11 +2525,14 @@ def makeDegreesDistanceMap(degreesMap, wcs, RADeg, decDeg, maxDistDegrees):
 
     """
 
-    x0, y0=wcs.wcs2pix(RADeg, decDeg)
-    ra0, dec0=RADeg, decDeg
-    ra1, dec1=wcs.pix2wcs(x0+1, y0+1)
-    xPixScale=astCoords.calcAngSepDeg(ra0, dec0, ra1, dec0)
-    yPixScale=astCoords.calcAngSepDeg(ra0, dec0, ra0, dec1)
+    if pixScales is not None:
+        x0, y0, xPixScale, yPixScale=pixScales
+    else:
+        x0, y0=wcs.wcs2pix(RADeg, decDeg)
+        ra0, dec0=RADeg, decDeg
+        ra1, dec1=wcs.pix2wcs(x0+1, y0+1)
+        xPixScale=astCoords.calcAngSepDeg(ra0, dec0, ra1, dec0)
+        yPixScale=astCoords.calcAngSepDeg(ra0, dec0, ra0, dec1)
 
     xDistPix=int(round((maxDistDegrees)/xPixScale))
     yDistPix=int(round((maxDistDegrees)/yPixScale))
@@ -2463,10 +2553,10 @@ def makeDegreesDistanceMap(degreesMap, wcs, RADeg, decDeg, maxDistDegrees):
     if maxY > Y:
         maxY=Y
 
-    xDeg=(np.arange(degreesMap.shape[1])-x0)*xPixScale
-    yDeg=(np.arange(degreesMap.shape[0])-y0)*yPixScale
-    for i in range(minY, maxY):
-        degreesMap[i][minX:maxX]=np.sqrt(yDeg[i]**2+xDeg[minX:maxX]**2)
+    # Pixel offsets along each axis, broadcast to fill the whole box in one step
+    xDeg=(np.arange(minX, maxX)-x0)*xPixScale
+    yDeg=(np.arange(minY, maxY)-y0)*yPixScale
+    degreesMap[minY:maxY, minX:maxX]=np.sqrt(yDeg[:, np.newaxis]**2+xDeg[np.newaxis, :]**2)
 
     return degreesMap, [minX, maxX], [minY, maxY]
 
@@ -2498,8 +2588,13 @@ def makeExtendedSourceMask(config, tileName):
         mean=0
         sigma=1e6
         vals=s.flatten()
+        lastMask=None
         for i in range(10):
             mask=np.less(abs(vals-mean), 3*sigma)
+            # Once the clipped set stops changing, further iterations change nothing
+            if lastMask is not None and np.array_equal(mask, lastMask):
+                break
+            lastMask=mask
             mean=np.mean(vals[mask])
             sigma=np.std(vals[mask])
         scaleFactor=sigma/np.median(whiteNoiseLevel[validMask])
@@ -2521,9 +2616,11 @@ def makeExtendedSourceMask(config, tileName):
     if 'minSizeArcmin2' in settings.keys() and settings['minSizeArcmin2'] > 0:
         arcmin2Map=getPixelAreaArcmin2Map(extendedMask.shape, wcs)
         segMap, numObjects=ndimage.label(extendedMask)
-        for i in range(1, numObjects+1):
-            if arcmin2Map[segMap == i].sum() < settings['minSizeArcmin2']:
-                extendedMask[segMap == i]=0
+        # One pass over the segmentation map rather than a full-map scan per object
+        objAreas=np.bincount(segMap.ravel(), weights = arcmin2Map.ravel(), minlength = numObjects+1)
+        smallObjects=objAreas < settings['minSizeArcmin2']
+        smallObjects[0]=False
+        extendedMask[smallObjects[segMap]]=0
 
     os.makedirs(config.diagnosticsDir+os.path.sep+"extendedMask", exist_ok = True)
     outFileName=config.diagnosticsDir+os.path.sep+"extendedMask"+os.path.sep+tileName+".fits"
@@ -246,13 +246,25 @@ def getSNRValues(catalog, SNMap, wcs, useInterpolator = True, invertMap = False,
     
     if len(catalog) > 0:
         catalog.add_column(atpy.Column(np.zeros(len(catalog)), prefix+'SNR'))
-    for obj in catalog:
-        x, y=wcs.wcs2pix(obj['RADeg'], obj['decDeg'])
-        if int(x) > 0 and int(x) < SNMap.shape[1] and int(y) > 0 and int(y) < SNMap.shape[0]:
-            if useInterpolator == True:
-                obj[prefix+'SNR']=mapInterpolator(y, x)[0][0]
-            else:
-                obj[prefix+'SNR']=SNMap[int(round(y)), int(round(x))] # read directly off of S/N map
+        # All positions converted to pixel coords in one WCS call
+        xs, ys=_getCatalogPixelCoords(catalog, wcs)
+        mask=np.logical_and(np.logical_and(xs.astype(int) > 0, xs.astype(int) < SNMap.shape[1]),
+                            np.logical_and(ys.astype(int) > 0, ys.astype(int) < SNMap.shape[0]))
+        if useInterpolator == True:
+            catalog[prefix+'SNR'][mask]=mapInterpolator.ev(ys[mask], xs[mask])
+        else:
+            catalog[prefix+'SNR'][mask]=SNMap[np.round(ys[mask]).astype(int), np.round(xs[mask]).astype(int)] # read directly off of S/N map
+
+#------------------------------------------------------------------------------------------------------------
+def _getCatalogPixelCoords(catalog, wcs):
+    """Returns arrays of x, y pixel coordinates in the map described by the given WCS for all objects
+    in the catalog, using a single call to the WCS library.
+    
+    """
+    
+    xyCoords=np.array(wcs.wcs2pix(np.asarray(catalog['RADeg']), np.asarray(catalog['decDeg']))).reshape(-1, 2)
+
+    return xyCoords[:, 0], xyCoords[:, 1]
            
 #------------------------------------------------------------------------------------------------------------
 def measureFluxes(catalog, filteredMapDict, diagnosticsDir, photFilteredMapDict = None,
@@ -324,31 +336,35 @@ def measureFluxes(catalog, filteredMapDict, diagnosticsDir, photFilteredMapDict
             if len(catalog) > 0:
                 catalog.add_column(atpy.Column(np.zeros(len(catalog)), prefix+k))
 
-    for obj in catalog:
-        x, y=wcs.wcs2pix(obj['RADeg'], obj['decDeg'])
-        for data, prefix, interpolator in zip(mapDataList, prefixList, interpolatorList):
-            # NOTE: We might want to avoid 2d interpolation here because that was found not to be robust elsewhere
-            # 2018: Simone seems to now be using this happily, so now optional
-            if useInterpolator == True:
-                mapValue=interpolator(y, x)[0][0]
-            else:
-                mapValue=data[int(round(y)), int(round(x))]
-            # NOTE: remember, all normalisation should be done when constructing the filtered maps, i.e., not here!
-            if mapUnits == 'yc':
-                yc=mapValue
-                obj[prefix+'y_c']=yc/1e-4                            # So that same units as H13 in output catalogs
-                obj[prefix+'err_y_c']=obj[prefix+'y_c']/obj[prefix+'SNR']
-                deltaTc=maps.convertToDeltaT(yc, obsFrequencyGHz = ycObsFreqGHz)
-                obj[prefix+'deltaT_c']=deltaTc
-                obj[prefix+'err_deltaT_c']=abs(deltaTc/obj[prefix+'SNR'])
-            elif mapUnits == 'uK':
-                # For this, we want deltaTc to be source amplitude
-                deltaTc=mapValue
-                obj[prefix+'deltaT_c']=deltaTc
-                obj[prefix+'err_deltaT_c']=deltaTc/obj[prefix+'SNR']                        
-                if reportJyFluxes == True:
-                    obj[prefix+"fluxJy"]=deltaTToJyPerSr(obj[prefix+'deltaT_c'], obsFreqGHz)*beamSolidAngle_nsr*1.e-9
-                    obj[prefix+"err_fluxJy"]=deltaTToJyPerSr(obj[prefix+'err_deltaT_c'], obsFreqGHz)*beamSolidAngle_nsr*1.e-9
+    if len(catalog) == 0:
+        return None
+
+    # Evaluate all objects at once - one WCS call, and one interpolator call per map
+    xs, ys=_getCatalogPixelCoords(catalog, wcs)
+    for data, prefix, interpolator in zip(mapDataList, prefixList, interpolatorList):
+        # NOTE: We might want to avoid 2d interpolation here because that was found not to be robust elsewhere
+        # 2018: Simone seems to now be using this happily, so now optional
+        if useInterpolator == True:
+            mapValues=interpolator.ev(ys, xs)
+        else:
+            mapValues=data[np.round(ys).astype(int), np.round(xs).astype(int)]
+        SNRs=np.asarray(catalog[prefix+'SNR'])
+        # NOTE: remember, all normalisation should be done when constructing the filtered maps, i.e., not here!
+        if mapUnits == 'yc':
+            yc=mapValues
+            catalog[prefix+'y_c']=yc/1e-4                            # So that same units as H13 in output catalogs
+            catalog[prefix+'err_y_c']=catalog[prefix+'y_c']/SNRs
+            deltaTc=maps.convertToDeltaT(yc, obsFrequencyGHz = ycObsFreqGHz)
+            catalog[prefix+'deltaT_c']=deltaTc
+            catalog[prefix+'err_deltaT_c']=abs(deltaTc/SNRs)
+        elif mapUnits == 'uK':
+            # For this, we want deltaTc to be source amplitude
+            deltaTc=mapValues
+            catalog[prefix+'deltaT_c']=deltaTc
+            catalog[prefix+'err_deltaT_c']=deltaTc/SNRs
+            if reportJyFluxes == True:
+                catalog[prefix+"fluxJy"]=deltaTToJyPerSr(catalog[prefix+'deltaT_c'], obsFreqGHz)*beamSolidAngle_nsr*1.e-9
+                catalog[prefix+"err_fluxJy"]=deltaTToJyPerSr(catalog[prefix+'err_deltaT_c'], obsFreqGHz)*beamSolidAngle_nsr*1.e-9
 
 #------------------------------------------------------------------------------------------------------------
 def makeForcedPhotometryCatalog(filteredMapDict, inputCatalog, useInterpolator = True,\
@@ -430,6 +446,9 @@ def addFreqWeightsToCatalog(imageDict, photFilter, diagnosticsDir):
         return None
     
     catalog=imageDict['optimalCatalog']
+    if len(catalog) == 0:
+        return None
+    templateTileNames=np.char.rpartition(np.asarray(catalog['template']).astype(str), "#")[:, 2]
     for tileName in imageDict['tileNames']:
         label=photFilter+"#"+tileName
         freqWeightMapFileName=diagnosticsDir+os.path.sep+"freqRelativeWeights_%s.fits" % (label)
@@ -446,15 +465,14 @@ def addFreqWeightsToCatalog(imageDict, photFilter, diagnosticsDir):
                 keyToAdd='fixed_y_c_weight_%sGHz' % (freqStr)
                 if keyToAdd not in catalog.keys():
                     catalog.add_column(atpy.Column(np.zeros(len(catalog)), keyToAdd))
-            for row in catalog:
-                if row['template'].split("#")[-1] == tileName:
-                    x, y=wcs.wcs2pix(row['RADeg'], row['decDeg'])
-                    x=int(round(x))
-                    y=int(round(y))
-                    freqWeights=freqCube[:, y, x]
-                    for i in range(len(obsFreqGHzDict.keys())):
-                        freqStr=("%.1f" % (obsFreqGHzDict[i])).replace(".", "p")    # MongoDB doesn't like '.' in key names
-                        row['fixed_y_c_weight_%sGHz' % (freqStr)]=freqWeights[i]
+            inTile=np.equal(templateTileNames, tileName)
+            if inTile.sum() == 0:
+                continue
+            xs, ys=_getCatalogPixelCoords(catalog[inTile], wcs)
+            freqWeights=freqCube[:, np.round(ys).astype(int), np.round(xs).astype(int)]
+            for i in range(len(obsFreqGHzDict.keys())):
+                freqStr=("%.1f" % (obsFreqGHzDict[i])).replace(".", "p")    # MongoDB doesn't like '.' in key names
+                catalog['fixed_y_c_weight_%sGHz' % (freqStr)][inTile]=freqWeights[i]
 
 #------------------------------------------------------------------------------------------------------------
 def deltaTToJyPerSr(temp, obsFreqGHz):
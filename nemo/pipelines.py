@@ -427,15 +427,22 @@ def makeRMSTables(config):
             else:
                 label="_"+footprint
             outFileName=config.selFnDir+os.path.sep+"RMSTab"+label+".fits"
-            tabList=[]
-            for selFnDict in selFnCollection[footprint]:
-                tileName=selFnDict['tileName']
-                tileTab=selFnDict['RMSTab']
-                tileTab['tileName']=atpy.Column(np.array([tileName]*len(tileTab),
-                                                dtype = '<U%d' % (strLen)), "tileName")
-                tabList.append(tileTab)
-            if len(tabList) > 0:
-                tab=atpy.vstack(tabList)
+            # Preallocate the combined columns and fill by slice, rather than vstacking a list of tables
+            tileTabs=[selFnDict['RMSTab'] for selFnDict in selFnCollection[footprint]]
+            if len(tileTabs) > 0:
+                numRows=sum(len(tileTab) for tileTab in tileTabs)
+                colNames=[c for c in tileTabs[0].colnames if c != 'tileName']
+                colsDict={}
+                for c in colNames:
+                    colsDict[c]=np.empty(numRows, dtype = tileTabs[0][c].dtype)
+                colsDict['tileName']=np.empty(numRows, dtype = '<U%d' % (strLen))
+                index=0
+                for selFnDict, tileTab in zip(selFnCollection[footprint], tileTabs):
+                    for c in colNames:
+                        colsDict[c][index:index+len(tileTab)]=tileTab[c]
+                    colsDict['tileName'][index:index+len(tileTab)]=selFnDict['tileName']
+                    index=index+len(tileTab)
+                tab=atpy.Table(colsDict)
                 tab.sort('y0RMS')
                 tab.meta['NEMOVER']=nemo.__version__
                 tab.write(outFileName, overwrite = True)
@@ -750,12 +757,12 @@ def extractSpec(config, tab, method = 'CAP', diskRadiusArcmin = 4.0, highPassFil
             symProf=interpolate.splev(abs(symRDeg), beam.tck)
             symRefProf=interpolate.splev(abs(symRDeg), refBeam.tck)
 
-            fSymRef=np.fft.fft(np.fft.fftshift(symRefProf))
-            fSymBeam=np.fft.fft(np.fft.fftshift(symProf))
+            # Profiles are real, so only the non-negative frequencies are needed
+            fSymRef=np.fft.rfft(np.fft.fftshift(symRefProf))
+            fSymBeam=np.fft.rfft(np.fft.fftshift(symProf))
             fSymConv=fSymRef/fSymBeam
             fSymConv[fSymBeam < 1e-1]=0 # Was 1e-2; this value avoids ringing, smaller values do not
-            symMatched=np.fft.ifft(fSymBeam*fSymConv).real
-            symConv=np.fft.ifft(fSymConv).real
+            symConv=np.fft.irfft(fSymConv, n = sizePix)
 
             # This allows normalization in same way as Gaussian smooth method
             symConv=symConv/symConv.sum()
@@ -799,7 +806,7 @@ def extractSpec(config, tab, method = 'CAP', diskRadiusArcmin = 4.0, highPassFil
             matchedBeamMap=maps.convolveMapWithBeam(beamMap*attenuationFactor, wcs, convKernel, maxDistDegrees = 1.0)
 
             # Find and apply radial fudge factor
-            yRow=np.where(refBeamMap == refBeamMap.max())[0][0]
+            yRow=np.unravel_index(np.argmax(refBeamMap), refBeamMap.shape)[0]
             rowValid=np.logical_and(degreesMap[yRow] < refBeam.rDeg.max(), matchedBeamMap[yRow] != 0)
             ratio=refBeamMap[yRow][rowValid]/matchedBeamMap[yRow][rowValid]
             zeroIndex=np.argmin(degreesMap[yRow][rowValid])
@@ -998,22 +1005,23 @@ def _extractSpecCAP(config, tab, kernelDict, method = 'CAP', diskRadiusArcmin =
 
         # Extract spectra
         pixAreaMap=maps.getPixelAreaArcmin2Map(shape, wcs)
+        # Maps in uK arcmin2 per pixel, made once per tile, so each aperture sum below is a single
+        # masked reduction (without copying out the pixels in the aperture first)
+        areaWeightedMaps=[mapDict['data']*pixAreaMap for mapDict in mapDictList]
         maxSizeDeg=(outerRadiusArcmin*1.2)/60
         tileTab=catalogs.getCatalogWithinImage(tab, shape, wcs)
         for label in freqLabels:
             tileTab['diskT_uKArcmin2_%s' % (label)]=np.zeros(len(tileTab))
             tileTab['err_diskT_uKArcmin2_%s' % (label)]=np.zeros(len(tileTab))
             tileTab['diskSNR_%s' % (label)]=np.zeros(len(tileTab))
-        for row in tileTab:
-            degreesMap=np.ones(shape, dtype = float)*1e6 # NOTE: never move this
-            degreesMap, xBounds, yBounds=maps.makeDegreesDistanceMap(degreesMap, wcs,
-                                                                     row['RADeg'], row['decDeg'],
-                                                                     maxSizeDeg)
-            innerMask=degreesMap < innerRadiusArcmin/60
-            outerMask=np.logical_and(degreesMap >= innerRadiusArcmin/60, degreesMap < outerRadiusArcmin/60)
-            for mapDict, label in zip(mapDictList, freqLabels):
-                d=mapDict['data']
-                diskFlux=(d[innerMask]*pixAreaMap[innerMask]).sum()-(d[outerMask]*pixAreaMap[outerMask]).sum()
+        # Only pixels within the box around each object are filled in degreesMap (the rest stay at 1e6,
+        # i.e., outside both apertures), so we only work within that box, and reset it after each object
+        degreesMap=np.ones(shape, dtype = float)*1e6
+        pixScalesList=maps.getLocalPixelScales(wcs, tileTab['RADeg'], tileTab['decDeg'])
+        for row, pixScales in zip(tileTab, pixScalesList):
+            diskFluxes=_measureCAPFluxes(degreesMap, wcs, row['RADeg'], row['decDeg'], maxSizeDeg, pixScales,
+                                         areaWeightedMaps, innerRadiusArcmin, outerRadiusArcmin)
+            for diskFlux, label in zip(diskFluxes, freqLabels):
                 row['diskT_uKArcmin2_%s' % (label)]=diskFlux
 
         # Estimate noise in every measurement (on average) from spatting down on random positions
@@ -1023,16 +1031,11 @@ def _extractSpecCAP(config, tab, kernelDict, method = 'CAP', diskRadiusArcmin =
             randTab=catalogs.generateRandomSourcesCatalog(mapDict['surveyMask'], wcs, 1000)
             for label in freqLabels:
                 randTab['diskT_uKArcmin2_%s' % (label)]=np.zeros(len(randTab))
-            for row in randTab:
-                degreesMap=np.ones(shape, dtype = float)*1e6 # NOTE: never move this
-                degreesMap, xBounds, yBounds=maps.makeDegreesDistanceMap(degreesMap, wcs,
-                                                                         row['RADeg'], row['decDeg'],
-                                                                         maxSizeDeg)
-                innerMask=degreesMap < innerRadiusArcmin/60
-                outerMask=np.logical_and(degreesMap >= innerRadiusArcmin/60, degreesMap < outerRadiusArcmin/60)
-                for mapDict, label in zip(mapDictList, freqLabels):
-                    d=mapDict['data']
-                    diskFlux=(d[innerMask]*pixAreaMap[innerMask]).sum()-(d[outerMask]*pixAreaMap[outerMask]).sum()
+            pixScalesList=maps.getLocalPixelScales(wcs, randTab['RADeg'], randTab['decDeg'])
+            for row, pixScales in zip(randTab, pixScalesList):
+                diskFluxes=_measureCAPFluxes(degreesMap, wcs, row['RADeg'], row['decDeg'], maxSizeDeg, pixScales,
+                                             areaWeightedMaps, innerRadiusArcmin, outerRadiusArcmin)
+                for diskFlux, label in zip(diskFluxes, freqLabels):
                     row['diskT_uKArcmin2_%s' % (label)]=diskFlux
             noiseLevels={}
             for label in freqLabels:
@@ -1049,3 +1052,26 @@ def _extractSpecCAP(config, tab, kernelDict, method = 'CAP', diskRadiusArcmin =
     catalog=atpy.vstack(catalogList)
 
     return catalog
+
+#------------------------------------------------------------------------------------------------------------
+def _measureCAPFluxes(degreesMap, wcs, RADeg, decDeg, maxSizeDeg, pixScales, areaWeightedMaps,
+                      innerRadiusArcmin, outerRadiusArcmin):
+    """Returns the compensated aperture photometry flux (in uK arcmin2) at the given position for each of
+    the given area-weighted maps. Used by _extractSpecCAP. degreesMap must be 1e6 everywhere on input -
+    it is filled within the box around the position, and then reset, so it can be re-used.
+
+    """
+
+    degreesMap, xBounds, yBounds=maps.makeDegreesDistanceMap(degreesMap, wcs, RADeg, decDeg, maxSizeDeg,
+                                                             pixScales = pixScales)
+    box=(slice(yBounds[0], yBounds[1]), slice(xBounds[0], xBounds[1]))
+    degreesBox=degreesMap[box]
+    innerMask=degreesBox < innerRadiusArcmin/60
+    outerMask=np.logical_and(degreesBox >= innerRadiusArcmin/60, degreesBox < outerRadiusArcmin/60)
+    diskFluxes=[]
+    for areaWeightedMap in areaWeightedMaps:
+        cutout=areaWeightedMap[box]
+        diskFluxes.append(np.sum(cutout, where = innerMask)-np.sum(cutout, where = outerMask))
+    degreesMap[box]=1e6
+
+    return diskFluxes
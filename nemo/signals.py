@@ -6,6 +6,7 @@ This module contains routines for modeling cluster and source signals.
 
 import os
 import sys
+import functools
 #from pixell import enmap, curvedsky, utils, pointsrcs
 #from pixell import
 enmap = None
@@ -43,6 +44,12 @@ import glob
 import shutil
 import yaml
 import warnings
+import threading
+from concurrent.futures import ThreadPoolExecutor
+try:
+    import numba
+except ImportError:
+    numba=None
 #import IPython
 np.random.seed()
 
@@ -136,6 +143,23 @@ class BeamProfile(object):
         # This is really just for sorting a list of beams by resolution
         self.FWHMArcmin=self.rDeg[np.argmin(abs(self.profile1d-0.5))]*60*2
 
+#------------------------------------------------------------------------------------------------------------
+@functools.lru_cache(maxsize = 16)
+def loadBeamProfile(beamFileName):
+    """Returns a :class:`BeamProfile` object for the given beam file. Results are cached, so that each beam
+    file is only read (and transformed between real and harmonic space) once, however many signal maps are
+    made with it (e.g., in :meth:`fitQ`, or when making filters).
+
+    Args:
+        beamFileName (:obj:`str`): Path to a text file that describes the beam (see :class:`BeamProfile`).
+
+    Returns:
+        A :class:`BeamProfile` object. This is shared between callers, so should not be modified.
+
+    """
+
+    return BeamProfile(beamFileName = beamFileName)
+
 #------------------------------------------------------------------------------------------------------------
 class QFit(object):
     """A class for managing the filter mismatch function, referred to as `Q` in the ACT papers from
@@ -379,8 +403,9 @@ def calcRDeltaMpc(z, MDelta, cosmoModel, delta = 500, wrt = 'critical'):
     """Calculate RDelta (e.g., R500c, R200m etc.) in Mpc, for a halo with the given mass and redshift.
 
     Args:
-        z (float): Redshift.
-        MDelta (float): Halo mass in units of solar masses, using the definition set by `delta` and `wrt`.
+        z (float or :obj:`np.ndarray`): Redshift.
+        MDelta (float or :obj:`np.ndarray`): Halo mass in units of solar masses, using the definition set by
+            `delta` and `wrt`.
         cosmoModel (:obj:`pyccl.Cosmology`): Cosmology object.
         delta (float, optional): Overdensity (e.g., typically 500 or 200).
         wrt (str, optional): Use 'critical' or 'mean' to set the definition of density with respect to the
@@ -389,6 +414,10 @@ def calcRDeltaMpc(z, MDelta, cosmoModel, delta = 500, wrt = 'critical'):
     Returns:
         RDelta (in Mpc)
 
+    Note:
+        Arrays of `z` and `MDelta` (of the same shape, or broadcastable) may be given, in which case an array
+        is returned. This is much faster than calling this routine once per object.
+
     """
 
     if type(MDelta) == str:
@@ -410,12 +439,13 @@ def calcR500Mpc(z, M500c, cosmoModel):
     """Calculate R500 (in Mpc), with respect to critical density.
 
     Args:
-        z (float): Redshift.
-        M500c (float): Mass within R500c (i.e., with respect to critical density) in units of solar masses.
+        z (float or :obj:`np.ndarray`): Redshift.
+        M500c (float or :obj:`np.ndarray`): Mass within R500c (i.e., with respect to critical density) in
+            units of solar masses.
         cosmoModel (`:obj:`pyccl.Cosmology`): Cosmology object.
 
     Returns:
-        R500c (in Mpc)
+        R500c (in Mpc), as a float or an array (if arrays of `z`, `M500c` were given)
 
     """
 
@@ -429,12 +459,13 @@ def calcTheta500Arcmin(z, M500, cosmoModel):
     critical density.
 
     Args:
-        z (float): Redshift.
-        M500 (float): Mass within R500c (i.e., with respect to critical density) in units of solar masses.
+        z (float or :obj:`np.ndarray`): Redshift.
+        M500 (float or :obj:`np.ndarray`): Mass within R500c (i.e., with respect to critical density) in
+            units of solar masses.
         cosmoModel (`:obj:`pyccl.Cosmology`): Cosmology object.
 
     Returns:
-        theta500c (in arcmin)
+        theta500c (in arcmin), as a float or an array (if arrays of `z`, `M500` were given)
 
     """
 
@@ -471,6 +502,34 @@ def makeArnaudModelProfile(z, M500, GNFWParams = 'default', cosmoModel = None, b
     if GNFWParams == 'default':
         GNFWParams=gnfw._default_params
 
+    # The projected profile in terms of b depends only on the GNFW shape, so this part is cached
+    bRange, cylPProfile, tckB=_makeGNFWCylProfile(tuple(sorted(GNFWParams.items())), binning)
+
+    # Calculate R500Mpc, theta500Arcmin corresponding to given mass and redshift
+    theta500Arcmin=calcTheta500Arcmin(z, M500, cosmoModel)
+
+    # Map between b and angular coordinates
+    # NOTE: c500 now taken into account in gnfw.py
+    # Scaling b -> theta scales the spline knots only, so no need to fit the spline again
+    thetaDegRange=bRange*(theta500Arcmin/60.)
+    tckP=(tckB[0]*(theta500Arcmin/60.), tckB[1], tckB[2])
+
+    return {'tckP': tckP, 'theta500Arcmin': theta500Arcmin, 'rDeg': thetaDegRange}
+
+#------------------------------------------------------------------------------------------------------------
+@functools.lru_cache(maxsize = 32)
+def _makeGNFWCylProfile(GNFWParamsItems, binning):
+    """Returns the line of sight integrated GNFW profile (normalised to 1 at the centre) as a function of 
+    impact parameter b, for use by :meth:`makeArnaudModelProfile`. GNFWParamsItems is the GNFW parameters 
+    dictionary as a tuple of (key, value) pairs, so that results can be cached.
+    
+    Returns read-only arrays bRange, cylPProfile, and the spline knots tckB for interpolating cylPProfile
+    in terms of b (since theta = b*theta500, this only needs rescaling of the knots for a given z, M500).
+    
+    """
+    
+    GNFWParams=dict(GNFWParamsItems)
+    
     # Adjust tol for speed vs. range of b covered
     if binning == 'linear': # Old
         bRange=np.linspace(0, 30, 1000)
@@ -478,28 +537,29 @@ def makeArnaudModelProfile(z, M500, GNFWParams = 'default', cosmoModel = None, b
         bRange=np.logspace(np.log10(1e-6), np.log10(100), 300)
     else:
         raise Exception("'binning' must be 'linear' or 'log' (given '%s')." % (binning))
-    cylPProfile=[]
+    # All impact parameters in one go, then cut at the first b where the profile changes by < tol
+    # (previously we integrated one b at a time until that happened)
+    cylPProfile=gnfw.integratedArray(bRange, params = GNFWParams)
     tol=1e-6
-    for i in range(len(bRange)):
-        b=bRange[i]
-        cylPProfile.append(gnfw.integrated(b, params = GNFWParams))
-        if i > 0 and abs(cylPProfile[i] - cylPProfile[i-1]) < tol:
-            break
-    cylPProfile=np.array(cylPProfile)
+    convergedMask=np.less(abs(np.diff(cylPProfile)), tol)
+    if convergedMask.sum() > 0:
+        i=np.argmax(convergedMask)+1
+    else:
+        i=len(bRange)-1
+    cylPProfile=cylPProfile[:i+1]
     bRange=bRange[:i+1]
 
     # Normalise to 1 at centre
     cylPProfile=cylPProfile/cylPProfile.max()
 
-    # Calculate R500Mpc, theta500Arcmin corresponding to given mass and redshift
-    theta500Arcmin=calcTheta500Arcmin(z, M500, cosmoModel)
+    tckB=interpolate.splrep(bRange, cylPProfile)
 
-    # Map between b and angular coordinates
-    # NOTE: c500 now taken into account in gnfw.py
-    thetaDegRange=bRange*(theta500Arcmin/60.)
-    tckP=interpolate.splrep(thetaDegRange, cylPProfile)
+    bRange.flags.writeable=False
+    cylPProfile.flags.writeable=False
+    tckB[0].flags.writeable=False
+    tckB[1].flags.writeable=False
 
-    return {'tckP': tckP, 'theta500Arcmin': theta500Arcmin, 'rDeg': thetaDegRange}
+    return bRange, cylPProfile, tckB
 
 #------------------------------------------------------------------------------------------------------------
 def makeBattagliaModelProfile(z, M500c, GNFWParams = 'default', cosmoModel = None):
@@ -556,29 +616,17 @@ def makeBattagliaModelProfile(z, M500c, GNFWParams = 'default', cosmoModel = Non
     GNFWParams['gamma']=0.3
     GNFWParams['alpha']=1.0
 
-    # Adjust tol for speed vs. range of b covered
-    # bRange=np.linspace(0, 30, 1000) # old
-    bRange=np.logspace(np.log10(1e-6), np.log10(100), 300)
-    cylPProfile=[]
-    tol=1e-6
-    for i in range(len(bRange)):
-        b=bRange[i]
-        cylPProfile.append(gnfw.integrated(b, params = GNFWParams))
-        if i > 0 and abs(cylPProfile[i] - cylPProfile[i-1]) < tol:
-            break
-    cylPProfile=np.array(cylPProfile)
-    bRange=bRange[:i+1]
-
-    # Normalise to 1 at centre
-    cylPProfile=cylPProfile/cylPProfile.max()
+    # Projected profile in terms of b (cached, as for makeArnaudModelProfile)
+    bRange, cylPProfile, tckB=_makeGNFWCylProfile(tuple(sorted(GNFWParams.items())), 'log')
 
     # Calculate R500Mpc, theta500Arcmin corresponding to given mass and redshift
     theta500Arcmin=calcTheta500Arcmin(z, M500c, cosmoModel)
 
     # Map between b and angular coordinates
     # NOTE: c500 now taken into account in gnfw.py
+    # Scaling b -> theta scales the spline knots only, so no need to fit the spline again
     thetaDegRange=bRange*(theta500Arcmin/60.)
-    tckP=interpolate.splrep(thetaDegRange, cylPProfile)
+    tckP=(tckB[0]*(theta500Arcmin/60.), tckB[1], tckB[2])
 
     return {'tckP': tckP, 'theta500Arcmin': theta500Arcmin, 'rDeg': thetaDegRange}
 
@@ -609,15 +657,67 @@ def makeBeamModelSignalMap(degreesMap, wcs, beam, amplitude = None):
         amplitude=1.0
 
     if type(beam) == str:
-        beam=BeamProfile(beamFileName = beam)
+        beam=loadBeamProfile(beam)
     profile1d=amplitude*beam.profile1d
 
     # Turn 1d profile into 2d
-    r2p=interpolate.interp1d(beam.rDeg, profile1d, bounds_error=False, fill_value=0.0)
-    signalMap=r2p(degreesMap)
+    signalMap=np.interp(degreesMap, beam.rDeg, profile1d, left = 0.0, right = 0.0)
 
     return signalMap
 
+#------------------------------------------------------------------------------------------------------------
+def addBeamModelToMap(signalMap, degreesMap, beam, amplitude):
+    """Adds the given beam, scaled by the given amplitude, to signalMap (in place). This gives the same
+    result as adding the output of :meth:`makeBeamModelSignalMap`, but if Numba is installed, the
+    interpolation and the addition are done in a single compiled pass (without making a temporary map).
+    This is used for painting many sources into a map (see :meth:`nemo.maps.makeModelImage`).
+
+    Args:
+        signalMap (:obj:`np.ndarray`): Map (2d array) to which the beam will be added.
+        degreesMap (:obj:`np.ndarray`): Map of angular distance from the object position, with the same
+            shape as signalMap.
+        beam (:obj:`BeamProfile` or str): Either a BeamProfile object, or a string that gives the path to a
+            text file that describes the beam profile.
+        amplitude (float): Specifies the amplitude of the input signal (in map units, e.g., uK).
+
+    Returns:
+        None
+
+    """
+
+    if type(beam) == str:
+        beam=loadBeamProfile(beam)
+
+    if numba is not None:
+        _addRadialProfileKernel(signalMap, degreesMap, np.asarray(beam.rDeg, dtype = np.float64),
+                                np.asarray(beam.profile1d, dtype = np.float64), float(amplitude))
+    else:
+        signalMap+=np.interp(degreesMap, beam.rDeg, amplitude*beam.profile1d, left = 0.0, right = 0.0)
+
+#------------------------------------------------------------------------------------------------------------
+def _addRadialProfileKernel(signalMap, rMap, r, profile, amplitude):
+    """Adds amplitude*profile, linearly interpolated at the radii given in rMap, to signalMap (in place).
+    Radii outside the range covered by r are skipped, i.e., the profile is taken to be zero there (as
+    :meth:`numpy.interp` with left = right = 0). If Numba is installed, this is compiled on first use.
+
+    """
+
+    numPoints=r.shape[0]
+    for i in range(rMap.shape[0]):
+        for j in range(rMap.shape[1]):
+            x=rMap[i, j]
+            if x < r[0] or x > r[numPoints-1]:
+                continue
+            k=np.searchsorted(r, x, side = 'right')-1
+            if k >= numPoints-1:
+                value=profile[numPoints-1]
+            else:
+                value=profile[k]+(x-r[k])*(profile[k+1]-profile[k])/(r[k+1]-r[k])
+            signalMap[i, j]=signalMap[i, j]+amplitude*value
+
+if numba is not None:
+    _addRadialProfileKernel=numba.njit(cache = True)(_addRadialProfileKernel)
+
 #------------------------------------------------------------------------------------------------------------
 def _paintSignalMap(shape, wcs, tckP, beam = None, RADeg = None, decDeg = None, amplitude = None,
                     maxSizeDeg = 10.0, convolveWithBeam = True, vmin = 1e-12):
@@ -638,7 +738,7 @@ def _paintSignalMap(shape, wcs, tckP, beam = None, RADeg = None, decDeg = None,
         if beam is None:
             raise Exception("No beam supplied.")
         if type(beam) == str:
-            beam=BeamProfile(beamFileName = beam)
+            beam=loadBeamProfile(beam)
         rht=utils.RadialFourierTransform()
         rprof=interpolate.splev(np.degrees(rht.r), tckP, ext = 1)
         lbeam=np.interp(rht.l, beam.ell, beam.Bell)
@@ -729,8 +829,7 @@ def makeArnaudModelSignalMap(z, M500, shape, wcs, beam = None, RADeg = None, dec
         profile1d=interpolate.splev(rDeg, tckP, ext = 1)
         if amplitude is not None:
             profile1d=profile1d*amplitude
-        r2p=interpolate.interp1d(rDeg, profile1d, bounds_error=False, fill_value=0.0)
-        signalMap=r2p(degreesMap)
+        signalMap=np.interp(degreesMap, rDeg, profile1d, left = 0.0, right = 0.0)
         if convolveWithBeam == True:
             signalMap=maps.convolveMapWithBeam(signalMap, wcs, beam, maxDistDegrees = maxSizeDeg)
     elif painter == 'pixell': # New method - using Sigurd's object painter
@@ -909,13 +1008,12 @@ def fitQ(config):
         # New - same spacing over same range, with some extra scales
         theta500Arcmin_wanted=np.power(10, np.arange(np.log10(0.1), np.log10(50), 0.05055349))
         zRange_wanted=[2.0]*10 + [1.0]*10 + [0.6]*10 + [0.3]*10 + [0.1]*10 + [0.07]*4
-        MRange_wanted=[]
-        for theta500Arcmin, z in zip(theta500Arcmin_wanted, zRange_wanted):
-            Ez=ccl.h_over_h0(cosmoModel, 1/(1+z))
-            criticalDensity=ccl.physical_constants.RHO_CRITICAL*(Ez*cosmoModel['h'])**2
-            R500Mpc=np.tan(np.radians(theta500Arcmin/60.0))*ccl.angular_diameter_distance(cosmoModel, 1/(1+z))
-            M500=(4/3.0)*np.pi*np.power(R500Mpc, 3)*500*criticalDensity
-            MRange_wanted.append(M500)
+        # All (theta500, z) pairs at once, rather than calling CCL for each one
+        zs=np.array(zRange_wanted)
+        Ez=ccl.h_over_h0(cosmoModel, 1/(1+zs))
+        criticalDensity=ccl.physical_constants.RHO_CRITICAL*(Ez*cosmoModel['h'])**2
+        R500Mpc=np.tan(np.radians(theta500Arcmin_wanted/60.0))*ccl.angular_diameter_distance(cosmoModel, 1/(1+zs))
+        MRange_wanted=((4/3.0)*np.pi*np.power(R500Mpc, 3)*500*criticalDensity).tolist()
         MRange=MRange+MRange_wanted
         zRange=zRange+zRange_wanted
         signalMapSizeDeg=15.0
@@ -951,13 +1049,11 @@ def fitQ(config):
         numPoints=24
         theta500Arcmin_wanted=np.logspace(np.log10(minTheta500Arcmin), np.log10(maxTheta500Arcmin), numPoints)
         for z in zGrid:
-            MRange_wanted=[]
-            for theta500Arcmin in theta500Arcmin_wanted:
-                Ez=ccl.h_over_h0(cosmoModel, 1/(1+z))
-                criticalDensity=ccl.physical_constants.RHO_CRITICAL*(Ez*cosmoModel['h'])**2
-                R500Mpc=np.tan(np.radians(theta500Arcmin/60.0))*ccl.angular_diameter_distance(cosmoModel, 1/(1+z))
-                M500=(4/3.0)*np.pi*np.power(R500Mpc, 3)*500*criticalDensity
-                MRange_wanted.append(M500)
+            # E(z) and D_A(z) only need to be calculated once for each z
+            Ez=ccl.h_over_h0(cosmoModel, 1/(1+z))
+            criticalDensity=ccl.physical_constants.RHO_CRITICAL*(Ez*cosmoModel['h'])**2
+            R500Mpc=np.tan(np.radians(theta500Arcmin_wanted/60.0))*ccl.angular_diameter_distance(cosmoModel, 1/(1+z))
+            MRange_wanted=((4/3.0)*np.pi*np.power(R500Mpc, 3)*500*criticalDensity).tolist()
             MRange=MRange+MRange_wanted
             zRange=zRange+([z]*len(MRange_wanted))
         signalMapSizeDeg=15.0
@@ -1025,63 +1121,71 @@ def fitQ(config):
         #simCMBDict={}
         #seed=1234
         #noiseLevel=120.0
-        #for obsFreqGHz in list(beamsDict.keys()):
+        #for obsFreqGHz in beamsDict.keys():
             #simCMBDict[obsFreqGHz]=maps.simCMBMap(shape, wcs, noiseLevel = noiseLevel, beam = beamsDict[obsFreqGHz], seed = seed)
         #print("... adding CMB and noise = %.3f in Q models" % (noiseLevel))
 
         # Input signal maps to which we will apply filter(s)
-        # We do this once and store in a dictionary for speed
-        theta500ArcminDict={}
-        signalMap=np.zeros(shape)
-        Q=[]
-        QTheta500Arcmin=[]
-        Qz=[]
-        cubeStore={} # For debugging object painting
-        for obsFreqGHz in list(beamsDict.keys()):
-            cubeStore[obsFreqGHz]=[]
-        for z, M500MSun in zip(zRange, MRange):
-            key='%.2f_%.2f' % (z, np.log10(M500MSun))
+        # Each (z, M500) model is independent, so these can optionally be spread over threads (set by the
+        # numThreads config parameter) - each thread then gets its own copy of the filter object
+        y0=2e-04
+        numThreads=config.parDict['numThreads']
+        threadLocal=threading.local()
+        def getFilterObj():
+            if numThreads <= 1:
+                return filterObj
+            if hasattr(threadLocal, 'filterObj') == False:
+                threadLocal.filterObj=filterClass(filt['label'], config.unfilteredMapsDictList, filt['params'],
+                                                  tileName = tileName, diagnosticsDir = config.diagnosticsDir)
+                threadLocal.filterObj.loadFilter()
+            return threadLocal.filterObj
+        def calcPeakFilteredSignal(zM):
+            z, M500MSun=zM
             signalMaps=[]
-            fSignalMaps=[]
-            y0=2e-04
-            for obsFreqGHz in list(beamsDict.keys()):
+            for obsFreqGHz in beamsDict.keys():
                 if mapDict['obsFreqGHz'] is not None:   # Normal case
                     amplitude=maps.convertToDeltaT(y0, obsFreqGHz)
                 else:                                   # TILe-C case
                     amplitude=y0
                 # NOTE: Q is to adjust for mismatched filter shape
                 # Yes, this should have the beam in it (certainly for TILe-C)
-                # NOTE: CCL can blow up for some of the extreme masses we try to feed in here
-                # (so we just skip those if it happens)
-                # try:
                 signalMap=makeSignalModelMap(z, M500MSun, shape, wcs, beam = beamsDict[obsFreqGHz],
                                              amplitude = amplitude, convolveWithBeam = True,
                                              GNFWParams = config.parDict['GNFWParams'])
                 signalMap=enmap.apply_window(signalMap, pow = 1.0)
-                # except:
-                #     continue
                 #signalMap=signalMap+simCMBDict[obsFreqGHz]
                 #signalMap=signalMap+np.random.normal(0, noiseLevel, signalMap.shape)
-                #cubeStore[obsFreqGHz].append(signalMap)
                 if realSpace == True:
                     signalMaps.append(signalMap)
                 else:
                     signalMaps.append(enmap.fft(signalMap))
             signalMaps=np.array(signalMaps)
             # Filter maps with ref kernel
-            if len(signalMaps) == len(list(beamsDict.keys())):
-                filteredSignal=filterObj.applyFilter(signalMaps)
-                mapInterpolator=interpolate.RectBivariateSpline(np.arange(filteredSignal.shape[0]),
-                                                                np.arange(filteredSignal.shape[1]),
-                                                                filteredSignal, kx = 3, ky = 3)
-                peakFilteredSignal=mapInterpolator(y, x)[0][0]
-                # Below is if we wanted to simulate object-finding here
-                #peakFilteredSignal=filteredSignal[int(y)-10:int(y)+10, int(x)-10:int(x)+10].max() # Avoids mess at edges
-                if peakFilteredSignal not in Q:
-                    Q.append(peakFilteredSignal)
-                    QTheta500Arcmin.append(calcTheta500Arcmin(z, M500MSun, fiducialCosmoModel))
-                    Qz.append(z)
-        Q=np.array(Q)
+            if len(signalMaps) != len(beamsDict):
+                return None
+            filteredSignal=getFilterObj().applyFilter(signalMaps)
+            mapInterpolator=interpolate.RectBivariateSpline(np.arange(filteredSignal.shape[0]),
+                                                            np.arange(filteredSignal.shape[1]),
+                                                            filteredSignal, kx = 3, ky = 3)
+            # Below is if we wanted to simulate object-finding here
+            #return filteredSignal[int(y)-10:int(y)+10, int(x)-10:int(x)+10].max() # Avoids mess at edges
+            return mapInterpolator(y, x)[0][0]
+        if numThreads > 1:
+            with ThreadPoolExecutor(max_workers = numThreads) as pool:
+                peakFilteredSignals=list(pool.map(calcPeakFilteredSignal, zip(zRange, MRange)))
+        else:
+            peakFilteredSignals=list(map(calcPeakFilteredSignal, zip(zRange, MRange)))
+        # Keep the first model giving each peak signal, in grid order (so the reference scale stays first)
+        # NOTE: we can't de-duplicate on theta500Arcmin, as for z-dependent models the same scales repeat at each z
+        valid=np.array([peakFilteredSignal is not None for peakFilteredSignal in peakFilteredSignals], dtype = bool)
+        Q=np.array([peakFilteredSignal for peakFilteredSignal in peakFilteredSignals if peakFilteredSignal is not None])
+        QM500MSun=np.array(MRange)[valid]
+        Qz=np.array(zRange)[valid]
+        firstIndices=np.sort(np.unique(Q, return_index = True)[1])
+        Q=Q[firstIndices]
+        QM500MSun=QM500MSun[firstIndices]
+        Qz=Qz[firstIndices]
+        QTheta500Arcmin=calcTheta500Arcmin(Qz, QM500MSun, fiducialCosmoModel)
         if abs(1-Q[0]/y0) > 1e-6:
             raise Exception("Q[0]/y0 outside tolerance")
         Q=Q/y0
@@ -1152,12 +1256,12 @@ def calcFRel(z, M500, Ez, obsFreqGHz = 148.0):
 
     As for H13, we return fRel = 1 + delta_SZE (see also Marriage et al. 2011)
 
+    M500 (and Ez) may be arrays.
+
     """
 
     # NOTE: we should define constants somewhere else...
-    h=6.63e-34
     kB=1.38e-23
-    sigmaT=6.6524586e-29
     me=9.11e-31
     e=1.6e-19
     c=3e8
@@ -1170,38 +1274,54 @@ def calcFRel(z, M500, Ez, obsFreqGHz = 148.0):
     TkeV=5.*np.power(((Ez*M500)/A), 1/B)
     TKelvin=TkeV*((1000*e)/kB)
 
-    # Itoh et al. (1998) eqns. 2.25 - 2.30
+    # Itoh et al. (1998) eqns. 2.25 - 2.30 - only thetae depends on the cluster, the rest is cached per frequency
     thetae=(kB*TKelvin)/(me*c**2)
-    X=(h*obsFreqGHz*1e9)/(kB*TCMB)
-    Xtw=X*(np.cosh(X/2.)/np.sinh(X/2.))
-    Stw=X/np.sinh(X/2.)
+    prefactor, Y=_calcItohCoeffs(float(obsFreqGHz))
+    deltaSZE=prefactor*thetae*(Y[0] + thetae*(Y[1] + thetae*(Y[2] + thetae*(Y[3] + thetae*Y[4]))))
 
-    Y0=-4+Xtw
+    fRel=1+deltaSZE
 
-    Y1=-10. + (47/2.)*Xtw - (42/5.)*Xtw**2 + (7/10.)*Xtw**3 + np.power(Stw, 2)*(-(21/5.) + (7/5.)*Xtw)
+    return fRel
 
-    Y2=-(15/2.) +  (1023/8.)*Xtw - (868/5.)*Xtw**2 + (329/5.)*Xtw**3 - (44/5.)*Xtw**4 + (11/30.)*Xtw**5 \
-        + np.power(Stw, 2)*(-(434/5.) + (658/5.)*Xtw - (242/5.)*Xtw**2 + (143/30.)*Xtw**3) \
-        + np.power(Stw, 4)*(-(44/5.) + (187/60.)*Xtw)
+#------------------------------------------------------------------------------------------------------------
+# Coefficients of the Itoh et al. (1998) Y_k polynomials, as [powers of Stw^2][powers of Xtw]
+_ITOH_Y_COEFFS=[[[-4., 1.]],
+                [[-10., 47/2., -42/5., 7/10.],
+                 [-21/5., 7/5.]],
+                [[-15/2., 1023/8., -868/5., 329/5., -44/5., 11/30.],
+                 [-434/5., 658/5., -242/5., 143/30.],
+                 [-44/5., 187/60.]],
+                [[15/2., 2505/8., -7098/5., 14253/10., -18594/35., 12059/140., -128/21., 16/105.],
+                 [-7098/10., 14253/5., -102267/35., 156767/140., -1216/7., 64/7.],
+                 [-18594/35., 205003/280., -1920/7., 1024/35.],
+                 [-544/21., 992/105.]],
+                [[-135/32., 30375/128., -62391/10., 614727/40., -124389/10., 355703/80., -16568/21., 7516/105.,
+                  -22/7., 11/210.],
+                 [-62391/20., 614727/20., -1368279/20., 4624139/80., -157396/7., 30064/7., -2717/7., 2761/210.],
+                 [-124389/10., 6046951/160., -248520/7., 481024/35., -15972/7., 18689/140.],
+                 [-70414/21., 465992/105., -11792/7., 19778/105.],
+                 [-682/7., 7601/210.]]]
+
+@functools.lru_cache(maxsize = 32)
+def _calcItohCoeffs(obsFreqGHz):
+    """Returns the frequency-dependent parts of the Itoh et al. (1998) relativistic correction used by
+    :meth:`calcFRel`, i.e., the prefactor and the coefficients Y0...Y4 of the series in thetae.
 
-    Y3=(15/2.) + (2505/8.)*Xtw - (7098/5.)*Xtw**2 + (14253/10.)*Xtw**3 - (18594/35.)*Xtw**4 + (12059/140.)*Xtw**5 - (128/21.)*Xtw**6 + (16/105.)*Xtw**7 \
-        + np.power(Stw, 2)*(-(7098/10.) + (14253/5.)*Xtw - (102267/35.)*Xtw**2 + (156767/140.)*Xtw**3 - (1216/7.)*Xtw**4 + (64/7.)*Xtw**5) \
-        + np.power(Stw, 4)*(-(18594/35.) + (205003/280.)*Xtw - (1920/7.)*Xtw**2 + (1024/35.)*Xtw**3) \
-        + np.power(Stw, 6)*(-(544/21.) + (992/105.)*Xtw)
+    """
 
-    Y4=-(135/32.) + (30375/128.)*Xtw - (62391/10.)*Xtw**2 + (614727/40.)*Xtw**3 - (124389/10.)*Xtw**4 \
-        + (355703/80.)*Xtw**5 - (16568/21.)*Xtw**6 + (7516/105.)*Xtw**7 - (22/7.)*Xtw**8 + (11/210.)*Xtw**9 \
-        + np.power(Stw, 2)*(-(62391/20.) + (614727/20.)*Xtw - (1368279/20.)*Xtw**2 + (4624139/80.)*Xtw**3 - (157396/7.)*Xtw**4 \
-        + (30064/7.)*Xtw**5 - (2717/7.)*Xtw**6 + (2761/210.)*Xtw**7) \
-        + np.power(Stw, 4)*(-(124389/10.) + (6046951/160.)*Xtw - (248520/7.)*Xtw**2 + (481024/35.)*Xtw**3 - (15972/7.)*Xtw**4 + (18689/140.)*Xtw**5) \
-        + np.power(Stw, 6)*(-(70414/21.) + (465992/105.)*Xtw - (11792/7.)*Xtw**2 + (19778/105.)*Xtw**3) \
-        + np.power(Stw, 8)*(-(682/7.) + (7601/210.)*Xtw)
+    h=6.63e-34
+    kB=1.38e-23
 
-    deltaSZE=((X**3)/(np.exp(X)-1)) * ((thetae*X*np.exp(X))/(np.exp(X)-1)) * (Y0 + Y1*thetae + Y2*thetae**2 + Y3*thetae**3 + Y4*thetae**4)
+    X=(h*obsFreqGHz*1e9)/(kB*TCMB)
+    Xtw=X*(np.cosh(X/2.)/np.sinh(X/2.))
+    Stw2=np.power(X/np.sinh(X/2.), 2)
 
-    fRel=1+deltaSZE
+    Y=[]
+    for coeffs in _ITOH_Y_COEFFS:
+        Y.append(np.polynomial.polynomial.polyval(Stw2, [np.polynomial.polynomial.polyval(Xtw, c) for c in coeffs]))
+    prefactor=((X**3)/(np.exp(X)-1)) * ((X*np.exp(X))/(np.exp(X)-1))
 
-    return fRel
+    return prefactor, tuple(Y)
 
 #------------------------------------------------------------------------------------------------------------
 def getM500FromP(P, log10M, calcErrors = True):
@@ -1335,6 +1455,48 @@ def calcMass(y0, y0Err, z, zErr, QFit, mockSurvey, tenToA0 = 4.95e-5, B0 = 0.08,
     return {'%s' % (label): M500, '%s_errPlus' % (label): errM500Plus, '%s_errMinus' % (label): errM500Minus,
             'Q': bestQ}
 
+#------------------------------------------------------------------------------------------------------------
+def _calcY0PredForPMass(zk, zIndex, QFit, mockSurvey, log10Ms, tenToA0 = 4.95e-5, B0 = 0.08, Mpivot = 3e14,
+                        Ez_gamma = 2, onePlusRedshift_power = 0.0, applyRelativisticCorrection = True,
+                        tileName = None, massTerm = None):
+    """Returns the predicted y0 values for the given log10Ms at redshift zk, and the corresponding Q values,
+    as used by calcPMass and calcPMassBatch. Here, zIndex is the index of the closest redshift in the
+    mockSurvey grid to zk. The redshift-independent term (M/Mpivot)^(1+B0) can be passed in as `massTerm`
+    by callers that loop over redshift, so that it is only computed once.
+
+    """
+
+    # We've generalised mockSurvey to be able to use e.g. M200m, but Q defined for theta500c
+    # So, need a mapping between M500c and whatever mass definition used in mockSurvey
+    # This only needed for extracting Q, fRel values
+    if mockSurvey.delta != 500 or mockSurvey.rhoType != "critical":
+        log10M500c_zk=np.log10(mockSurvey._transToM500c(mockSurvey.cosmoModel,
+                                                        np.power(10, log10Ms),
+                                                        1/(1+zk)))
+    else:
+        log10M500c_zk=log10Ms
+
+    theta500s=interpolate.splev(log10M500c_zk, mockSurvey.theta500Splines[zIndex], ext = 3)
+    Qs=QFit.getQ(theta500s, zk, tileName = tileName)
+    fRels=interpolate.splev(log10M500c_zk, mockSurvey.fRelSplines[zIndex], ext = 3)
+    fRels[np.less_equal(fRels, 0)]=1e-4   # For extreme masses (> 10^16 MSun) at high-z, this can dip -ve
+    if massTerm is None:
+        massTerm=np.power(np.power(10, log10Ms)/Mpivot, 1+B0)
+    if Ez_gamma == 2:
+        EzTerm=mockSurvey.Ez2[zIndex]
+    else:
+        EzTerm=np.power(mockSurvey.Ez[zIndex], Ez_gamma)
+    y0pred=tenToA0*EzTerm*massTerm*Qs
+    y0pred=y0pred*np.power(1+zk, onePlusRedshift_power)
+    if applyRelativisticCorrection == True:
+        y0pred=y0pred*fRels
+    if np.less(y0pred, 0).sum() > 0:
+        # This generally means we wandered out of where Q is defined (e.g., beyond mockSurvey log10M limits)
+        # Or fRel can dip -ve for extreme mass at high-z (can happen with large Om0)
+        raise Exception("Some predicted y0 values are negative.")
+
+    return y0pred, Qs
+
 #------------------------------------------------------------------------------------------------------------
 def calcPMass(y0, y0Err, z, zErr, QFit, mockSurvey, tenToA0 = 4.95e-5, B0 = 0.08, Mpivot = 3e14,
               sigma_int = 0.2, Ez_gamma = 2, onePlusRedshift_power = 0.0, applyMFDebiasCorrection = True,
@@ -1379,34 +1541,18 @@ def calcPMass(y0, y0Err, z, zErr, QFit, mockSurvey, tenToA0 = 4.95e-5, B0 = 0.08
     #log10MStep=mockSurvey.log10M[1]-mockSurvey.log10M[0]
     #log10Ms=np.arange(-100.0, 100.0, log10MStep)
 
+    massTerm=np.power(np.power(10, log10Ms)/Mpivot, 1+B0)
     PArr=[]
     for k in range(len(zRange)):
 
         zk=zRange[k]
 
-        # We've generalised mockSurvey to be able to use e.g. M200m, but Q defined for theta500c
-        # So, need a mapping between M500c and whatever mass definition used in mockSurvey
-        # This only needed for extracting Q, fRel values
-        if mockSurvey.delta != 500 or mockSurvey.rhoType != "critical":
-            log10M500c_zk=np.log10(mockSurvey._transToM500c(mockSurvey.cosmoModel,
-                                                            np.power(10, log10Ms),
-                                                            1/(1+zk)))
-        else:
-            log10M500c_zk=log10Ms
-
         mockSurvey_zIndex=np.argmin(abs(mockSurvey.z-zk))
-        theta500s=interpolate.splev(log10M500c_zk, mockSurvey.theta500Splines[mockSurvey_zIndex], ext = 3)
-        Qs=QFit.getQ(theta500s, zk, tileName = tileName)
-        fRels=interpolate.splev(log10M500c_zk, mockSurvey.fRelSplines[mockSurvey_zIndex], ext = 3)
-        fRels[np.less_equal(fRels, 0)]=1e-4   # For extreme masses (> 10^16 MSun) at high-z, this can dip -ve
-        y0pred=tenToA0*np.power(mockSurvey.Ez[mockSurvey_zIndex], Ez_gamma)*np.power(np.power(10, log10Ms)/Mpivot, 1+B0)*Qs
-        y0pred=y0pred*np.power(1+zk, onePlusRedshift_power)
-        if applyRelativisticCorrection == True:
-            y0pred=y0pred*fRels
-        if np.less(y0pred, 0).sum() > 0:
-            # This generally means we wandered out of where Q is defined (e.g., beyond mockSurvey log10M limits)
-            # Or fRel can dip -ve for extreme mass at high-z (can happen with large Om0)
-            raise Exception("Some predicted y0 values are negative.")
+        y0pred, Qs=_calcY0PredForPMass(zk, mockSurvey_zIndex, QFit, mockSurvey, log10Ms, tenToA0 = tenToA0,
+                                       B0 = B0, Mpivot = Mpivot, Ez_gamma = Ez_gamma,
+                                       onePlusRedshift_power = onePlusRedshift_power,
+                                       applyRelativisticCorrection = applyRelativisticCorrection,
+                                       tileName = tileName, massTerm = massTerm)
         log_y0pred=np.log(y0pred)
 
         Py0GivenM=np.exp(-np.power(log_y0-log_y0pred, 2)/(2*(np.power(log_y0Err, 2)+np.power(sigma_int, 2))))
@@ -1451,6 +1597,89 @@ def calcPMass(y0, y0Err, z, zErr, QFit, mockSurvey, tenToA0 = 4.95e-5, B0 = 0.08
     else:
         return P
 
+#------------------------------------------------------------------------------------------------------------
+def calcPMassBatch(y0, y0Err, z, zErr, QFit, mockSurvey, tenToA0 = 4.95e-5, B0 = 0.08, Mpivot = 3e14,
+                   sigma_int = 0.2, Ez_gamma = 2, onePlusRedshift_power = 0.0, applyMFDebiasCorrection = True,
+                   applyRelativisticCorrection = True, tileName = None):
+    """Batched version of calcPMass (with return2D = True), for many clusters that share the same tile
+    (i.e., the same Q function). The predicted y0 and mass function for each distinct redshift are
+    evaluated only once, and shared between all of the clusters that need them.
+
+    Args:
+        y0 (:obj:`np.ndarray`): Array of y0~ values.
+        y0Err (:obj:`np.ndarray`): Array of uncertainties on y0~.
+        z (:obj:`np.ndarray`): Array of redshifts.
+        zErr (:obj:`np.ndarray`): Array of redshift uncertainties.
+        QFit (:obj:`nemo.signals.QFit`): Object containing the filter mismatch function.
+        mockSurvey (:obj:`nemo.MockSurvey.MockSurvey`): Sets the (log10 mass, z) grid and cosmology.
+        tileName (:obj:`str`, optional): Tile name, used to pick the Q function.
+
+    Returns:
+        An array of shape (number of clusters, number of redshift bins, number of mass bins), where each
+        2d slice is on the same grid as mockSurvey.clusterCount, normalised such that its sum is 1.
+
+    Note:
+        See calcPMass for the meaning of the other parameters.
+
+    """
+
+    y0, y0Err, z, zErr=np.atleast_1d(y0), np.atleast_1d(y0Err), np.atleast_1d(z), np.atleast_1d(zErr)
+    log10Ms=mockSurvey.log10M
+
+    # Each cluster contributes to one or more (redshift, grid z index) pairs, weighted by P(z)
+    clusterIndices=[]
+    zks=[]
+    zIndices=[]
+    Pzs=[]
+    for i in range(len(z)):
+        if zErr[i] > 0:
+            zMask=np.logical_and(np.greater_equal(mockSurvey.z, z[i]-zErr[i]*5), np.less(mockSurvey.z, z[i]+zErr[i]*5))
+            zRange=mockSurvey.z[zMask]
+            Pz=np.exp(-np.power(z[i]-zRange, 2)/(2*(np.power(zErr[i], 2))))
+            zIndex=np.flatnonzero(zMask)
+        else:
+            zRange=np.array([z[i]])
+            Pz=np.ones(1)
+            zIndex=np.array([np.argmin(abs(mockSurvey.z-z[i]))])
+        clusterIndices.append(np.full(len(zRange), i))
+        zks.append(zRange)
+        zIndices.append(zIndex)
+        Pzs.append(Pz)
+    clusterIndices=np.concatenate(clusterIndices)
+    zks=np.concatenate(zks).astype(float)
+    zIndices=np.concatenate(zIndices)
+    Pzs=np.concatenate(Pzs)
+
+    # Redshift-dependent quantities, evaluated once per distinct redshift
+    uniqueZks, zkInverse=np.unique(zks, return_inverse = True)
+    log_y0preds=np.zeros([len(uniqueZks), len(log10Ms)])
+    PLog10Ms=np.ones([len(uniqueZks), len(log10Ms)])
+    massTerm=np.power(np.power(10, log10Ms)/Mpivot, 1+B0)
+    for k in range(len(uniqueZks)):
+        zk=float(uniqueZks[k])
+        y0pred, Qs=_calcY0PredForPMass(zk, np.argmin(abs(mockSurvey.z-zk)), QFit, mockSurvey, log10Ms,
+                                       tenToA0 = tenToA0, B0 = B0, Mpivot = Mpivot, Ez_gamma = Ez_gamma,
+                                       onePlusRedshift_power = onePlusRedshift_power,
+                                       applyRelativisticCorrection = applyRelativisticCorrection,
+                                       tileName = tileName, massTerm = massTerm)
+        log_y0preds[k]=np.log(y0pred)
+        if applyMFDebiasCorrection == True:
+            PLog10M=mockSurvey.getPLog10M(zk)
+            PLog10Ms[k]=PLog10M/np.trapz(PLog10M, log10Ms)
+
+    # All (cluster, redshift) pairs at once
+    log_y0=np.log(y0)[clusterIndices, np.newaxis]
+    log_y0Err=(y0Err/y0)[clusterIndices, np.newaxis]
+    Py0GivenM=np.exp(-np.power(log_y0-log_y0preds[zkInverse], 2)/(2*(np.power(log_y0Err, 2)+np.power(sigma_int, 2))))
+    Py0GivenM=Py0GivenM/np.trapz(Py0GivenM, log10Ms, axis = 1)[:, np.newaxis]
+    PArr=Py0GivenM*PLog10Ms[zkInverse]*Pzs[:, np.newaxis]
+
+    P2D=np.zeros((len(z),)+mockSurvey.clusterCount.shape)
+    P2D[clusterIndices, zIndices]=PArr
+    P2D=P2D/P2D.sum(axis = (1, 2))[:, np.newaxis, np.newaxis]
+
+    return P2D
+
 #------------------------------------------------------------------------------------------------------------
 # Mass conversion routines
 
@@ -133,7 +133,7 @@ def parseConfigFile(parDictFileName, verbose = False):
             else:
                 parDict['selFnOptions']['QSource']='injection'
         # Check of tile definitions
-        if 'useTiling' not in list(parDict.keys()):
+        if 'useTiling' not in parDict.keys():
             parDict['useTiling']=False
         if 'tileDefinitions' in parDict.keys() and type(parDict['tileDefinitions']) == list:
             checkList=[]
@@ -141,13 +141,13 @@ def parseConfigFile(parDictFileName, verbose = False):
                 if entry['tileName'] in checkList:
                     raise Exception("Duplicate tileName '%s' in tileDefinitions - fix in config file" % (entry['tileName']))
                 checkList.append(entry['tileName'])
-        if 'stitchTiles' not in list(parDict.keys()):
+        if 'stitchTiles' not in parDict.keys():
             if parDict['useTiling'] == True:
                 parDict['stitchTiles']=True
             else:
                 parDict['stitchTiles']=False
         # Optional override of default GNFW parameters (used by Arnaud model), if used in filters given
-        if 'GNFWParams' not in list(parDict.keys()):
+        if 'GNFWParams' not in parDict.keys():
             parDict['GNFWParams']='default'
         for filtDict in parDict['mapFilters']:
             filtDict['params']['GNFWParams']=parDict['GNFWParams']
@@ -162,6 +162,15 @@ def parseConfigFile(parDictFileName, verbose = False):
         # Applies to source injection recover sims only (whether print message or trigger exception)
         if 'haltOnPositionRecoveryProblem' not in parDict.keys():
             parDict['haltOnPositionRecoveryProblem']=False
+        # Number of threads used by each process for some steps that can be done in parallel (e.g., fitQ)
+        if 'numThreads' not in parDict.keys():
+            parDict['numThreads']=1
+        # Memory budget (GB) for keeping input map tiles in memory between repeated source injection / sky sim runs
+        if 'simTileCacheGB' not in parDict.keys():
+            parDict['simTileCacheGB']=4.0
+        # Write filtered maps, plots and DS9 region files for each sky sim (set False to skip, for speed)
+        if 'saveSkySimOutput' not in parDict.keys():
+            parDict['saveSkySimOutput']=True
         # Mass/scaling relation/cosmology options - set fiducial values here if not chosen in config
         # NOTE: We SHOULD use M200c not M500c here (to avoid CCL Tinker08 problem)
         # But we don't, currently, as old runs/tests used M500c and Arnaud-like scaling relation
@@ -183,11 +192,11 @@ def parseConfigFile(parDictFileName, verbose = False):
     oldKeyMap={'makeTileDir': 'useTiling', 'tileDefLabel': None, 'twoPass': None,
                'clusterInjectionModels': 'sourceInjectionModels'}
     for k in oldKeyMap.keys():
-        if k in list(parDict.keys()) and oldKeyMap[k] is None:
+        if k in parDict.keys() and oldKeyMap[k] is None:
             del parDict[k]
             if verbose:
                 print("... WARNING: config parameter '%s' is no longer used by Nemo and will be ignored." % (k))
-        if k in list(parDict.keys()) and type(oldKeyMap[k]) == str:
+        if k in parDict.keys() and type(oldKeyMap[k]) == str:
             if verbose:
                 print("... WARNING: config parameter '%s' (old usage) has been renamed to '%s' (current usage) - you may wish to update your config file." % (k, oldKeyMap[k]))
             parDict[oldKeyMap[k]]=parDict[k]
@@ -330,7 +339,7 @@ class NemoConfig(object):
         self._origParDict=copy.deepcopy(self.parDict)
                                 
         # Output dirs
-        if 'outputDir' in list(self.parDict.keys()):
+        if 'outputDir' in self.parDict.keys():
             self.rootOutDir=os.path.abspath(self.parDict['outputDir'])
         else:
             if self.configFileName.find(".yml") == -1 and makeOutputDirs == True:
@@ -359,12 +368,11 @@ class NemoConfig(object):
             if os.path.exists(pickleFileName) == False:
                 raise Exception("You can only use setUpMaps = False if a previous run has created the file %s" % (pickleFileName))
             with open(pickleFileName, "rb") as pickleFile:
-                unpickler=pickle.Unpickler(pickleFile)
-                self.tileCoordsDict=unpickler.load()
+                self.tileCoordsDict=pickle.load(pickleFile)
                 self.tileNames=self.tileCoordsDict.keys()
 
         # For when we want to test on only a subset of tiles
-        if 'tileNameList' in list(self.parDict.keys()):
+        if 'tileNameList' in self.parDict.keys():
             newList=[]
             for name in self.tileNames:
                 if name in self.parDict['tileNameList']:
@@ -376,8 +384,7 @@ class NemoConfig(object):
             # If we don't have / didn't set-up maps, we would still want the list of tile names
             if os.path.exists(self.selFnDir+os.path.sep+"tileCoordsDict.pkl") == True:
                 with open(self.selFnDir+os.path.sep+"tileCoordsDict.pkl", "rb") as pickleFile:
-                    unpickler=pickle.Unpickler(pickleFile)
-                    tileCoordsDict=unpickler.load()
+                    tileCoordsDict=pickle.load(pickleFile)
                 assert(tileCoordsDict != {})
                 self.tileCoordsDict=tileCoordsDict
                 self.tileNames=list(tileCoordsDict.keys())
@@ -628,8 +635,7 @@ class NemoConfig(object):
             bcastTileCoordsDict=self.tileCoordsDict
             if writeTileInfo == True:
                 with open(self.selFnDir+os.path.sep+"tileCoordsDict.pkl", "wb") as pickleFile:
-                    pickler=pickle.Pickler(pickleFile)
-                    pickler.dump(self.tileCoordsDict)
+                    pickle.dump(self.tileCoordsDict, pickleFile, protocol = pickle.HIGHEST_PROTOCOL)
         else:
             bcastParDict=None
             bcastTileCoordsDict=None
@@ -9,11 +9,12 @@ import sys
 import subprocess
 import shutil
 import numpy as np
-from nemo import catalogs, maps, plotSettings
+from nemo import catalogs, maps, completeness, gnfw, signals, plotSettings
 from astLib import *
 import astropy.io.fits as pyfits
 import astropy.table as atpy
 from astropy.coordinates import SkyCoord, match_coordinates_sky
+from scipy import interpolate, integrate
 import pylab as plt
 
 plotSettings.update_rcParams()
@@ -386,6 +387,104 @@ class NemoTests(object):
             self._status="SUCCESS"
     
             
+    def check_completeness_kernel(self, tol = 1e-5):
+        """Checks that the compiled completeness kernel (used by the 'fast' method if Numba is installed)
+        agrees with the numpy version, on a random grid of signals and noise levels. This includes some
+        zero and -ve signals, which should have zero completeness.
+
+        """
+        rng=np.random.default_rng(1234)
+        y0Grid=np.power(10, rng.uniform(-6, -3, (60, 50)))
+        y0Grid[0, :5]=0
+        y0Grid[1, :5]=-1e-5
+        y0RMS=np.power(10, rng.uniform(-5.5, -4.5, 200))
+        areaWeights=rng.uniform(size = 200)
+        areaWeights=areaWeights/areaWeights.sum()
+        kernelCompMz=completeness._completenessKernel(y0Grid, y0RMS, areaWeights, 4.5, 0.2)
+        numpyCompMz=completeness._completenessNumpy(y0Grid, y0RMS, areaWeights, 4.5, 0.2)
+        maxDiff=abs(kernelCompMz-numpyCompMz).max()
+        print("... max difference between completeness kernel and numpy version = %.3e" % (maxDiff))
+        if maxDiff > float(tol):
+            self._status="FAILED"
+        else:
+            self._status="SUCCESS"
+
+
+    def check_gnfw_integrated_array(self, tol = 1e-6):
+        """Checks that gnfw.integratedArray agrees with gnfw.integrated (evaluated one impact parameter at
+        a time), over the 'log' and 'linear' impact parameter ranges used by signals.makeArnaudModelProfile,
+        for the default (A10) GNFW parameters and a few Battaglia et al. (2012)-like (z, M) cases. The
+        difference is measured relative to the peak of the profile.
+
+        """
+        paramsList=[gnfw._default_params]
+        for M200c, z in [[1.4e14, 0.1], [7e14, 0.5], [2.8e15, 1.5]]:
+            params=dict(gnfw._default_params)
+            params['P0']=18.1*np.power(M200c/1e14, 0.154)*np.power(1+z, -0.758)
+            params['beta']=4.35*np.power(M200c/1e14, 0.0393)*np.power(1+z, 0.415)+0.3
+            params['c500']=1/(0.497*np.power(M200c/1e14, -0.00865)*np.power(1+z, 0.731))
+            params['gamma']=0.3
+            params['alpha']=1.0
+            paramsList.append(params)
+        maxDiff=0
+        for bRange in [np.logspace(np.log10(1e-6), np.log10(100), 300), np.linspace(0, 30, 1000)]:
+            for params in paramsList:
+                arrayProfile=gnfw.integratedArray(bRange, params = params)
+                loopProfile=np.array([gnfw.integrated(b, params = params) for b in bRange])
+                maxDiff=max(maxDiff, abs(arrayProfile-loopProfile).max()/abs(loopProfile).max())
+        print("... max fractional difference between gnfw.integratedArray and gnfw.integrated = %.3e" % (maxDiff))
+        if maxDiff > float(tol):
+            self._status="FAILED"
+        else:
+            self._status="SUCCESS"
+
+
+    def check_arnaud_model_profile(self, tol = 1e-6):
+        """Checks that signals.makeArnaudModelProfile (which caches the GNFW profile in terms of b and
+        rescales the spline knots for each z, M500) gives the same profile and Y500-like normalisation
+        (the profile integrated within theta500) as fitting the spline from scratch with gnfw.integrated,
+        as was done before caching. Both are checked for a few (z, M500) values and both binning schemes.
+
+        """
+        maxProfileDiff=0
+        maxYDiff=0
+        for binning in ['log', 'linear']:
+            if binning == 'log':
+                bRange=np.logspace(np.log10(1e-6), np.log10(100), 300)
+            else:
+                bRange=np.linspace(0, 30, 1000)
+            cylPProfile=[]
+            for i in range(len(bRange)):
+                cylPProfile.append(gnfw.integrated(bRange[i]))
+                if i > 0 and abs(cylPProfile[i] - cylPProfile[i-1]) < 1e-6:
+                    break
+            cylPProfile=np.array(cylPProfile)
+            bRange=bRange[:i+1]
+            cylPProfile=cylPProfile/cylPProfile.max()
+            for z, M500 in [[0.1, 1e14], [0.5, 3e14], [1.5, 1e15]]:
+                signalDict=signals.makeArnaudModelProfile(z, M500, binning = binning)
+                theta500Deg=signals.calcTheta500Arcmin(z, M500, signals.fiducialCosmoModel)/60.
+                if len(signalDict['rDeg']) != len(bRange):
+                    print("... rDeg has %d elements (expected %d)" % (len(signalDict['rDeg']), len(bRange)))
+                    self._status="FAILED"
+                    return None
+                tckP=interpolate.splrep(bRange*theta500Deg, cylPProfile)
+                rDeg=np.linspace(0, bRange.max()*theta500Deg, 20000)
+                refProfile=interpolate.splev(rDeg, tckP, ext = 1)
+                profile=interpolate.splev(rDeg, signalDict['tckP'], ext = 1)
+                maxProfileDiff=max(maxProfileDiff, abs(profile-refProfile).max())
+                mask=rDeg <= theta500Deg
+                refY=integrate.trapezoid(refProfile[mask]*2*np.pi*rDeg[mask], rDeg[mask])
+                Y=integrate.trapezoid(profile[mask]*2*np.pi*rDeg[mask], rDeg[mask])
+                maxYDiff=max(maxYDiff, abs(Y/refY-1))
+        print("... max difference in profile = %.3e; max fractional difference in Y within theta500 = %.3e"
+              % (maxProfileDiff, maxYDiff))
+        if maxProfileDiff > float(tol) or maxYDiff > float(tol):
+            self._status="FAILED"
+        else:
+            self._status="SUCCESS"
+
+
     def status_should_be(self, expected_status):
         if expected_status != self._status:
             raise AssertionError("Expected status to be '%s' but was '%s'."